@@ -1,46 +1,128 @@
 import os
+import asyncio
 import requests
-from pymongo import MongoClient
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from pymongo import MongoClient, UpdateOne
 from datetime import datetime, timezone
 
-def fetch_all_markets():
-    """Recupera tutti i mercati attivi con paginazione"""
-    all_markets = []
-    offset = 0
-    limit = 100  # Numero massimo di risultati per chiamata
-    
-    print(f"Inizio fetch mercati attivi da Polymarket...")
-    
-    while True:
-        page_num = offset // limit + 1
-        url = f"https://gamma-api.polymarket.com/markets?active=true&archived=false&closed=false&limit={limit}&offset={offset}"
-        
-        print(f"Fetching pagina {page_num} (offset {offset})...")
-        
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            markets = response.json()  # La risposta è direttamente un array
-            
-            if not markets:
-                print(f"Nessun mercato trovato alla pagina {page_num}. Fine paginazione.")
-                break  # Nessun mercato trovato, fine paginazione
-            
-            all_markets.extend(markets)
-            print(f"Recuperati {len(markets)} mercati dalla pagina {page_num}. Totale: {len(all_markets)}")
-            
+GAMMA_MARKETS_URL = "https://gamma-api.polymarket.com/markets"
+PAGE_LIMIT = 100  # Numero massimo di risultati per chiamata
+CONCURRENCY = int(os.environ.get("GAMMA_CONCURRENCY", "8"))  # Pagine scaricate in parallelo
+
+def create_session(pool_size):
+    """Sessione HTTP con connessioni keep-alive condivise e retry sugli errori temporanei"""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET"])
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    return session
+
+def fetch_page(session, offset):
+    """Recupera una pagina di mercati attivi"""
+    page_num = offset // PAGE_LIMIT + 1
+    params = {"active": "true", "archived": "false", "closed": "false", "limit": PAGE_LIMIT, "offset": offset}
+
+    try:
+        response = session.get(GAMMA_MARKETS_URL, params=params, timeout=30)
+        response.raise_for_status()
+        return response.json()  # La risposta è direttamente un array
+    except Exception as e:
+        raise Exception(f"Errore nel recupero mercati alla pagina {page_num}: {str(e)}")
+
+def write_page(collection, markets):
+    """Upsert di una pagina di mercati con un'unica bulk write, ritorna (inseriti, aggiornati)"""
+    # Timestamp di inserimento/aggiornamento
+    now = datetime.now(timezone.utc)
+    operations = []
+
+    for market in markets:
+        market_id = market.get('id')
+        if not market_id:
+            print(f"Mercato senza id trovato, saltato: {market}")
+            continue
+
+        market["lastUpdateAt"] = now
+
+        # Upsert con $set per aggiornare solo i campi presenti, preservando quelli esistenti
+        operations.append(UpdateOne({"id": market_id}, {"$set": market}, upsert=True))
+
+    if not operations:
+        return 0, 0
+
+    result = collection.bulk_write(operations, ordered=False)
+    return result.upserted_count, result.matched_count
+
+async def sync_markets(collection, concurrency=CONCURRENCY):
+    """Scarica le pagine in parallelo e le scrive su MongoDB man mano che arrivano"""
+    loop = asyncio.get_running_loop()
+    session = create_session(concurrency)
+    fetch_executor = ThreadPoolExecutor(max_workers=concurrency)
+    write_executor = ThreadPoolExecutor(max_workers=1)
+
+    # Coda limitata: se MongoDB rallenta si fermano anche i fetch, la memoria resta costante
+    pages = asyncio.Queue(maxsize=concurrency)
+    state = {"next_offset": 0, "last_offset": None}
+    stats = {"markets": 0, "inserted": 0, "updated": 0, "pages": 0}
+
+    print(f"Inizio sync mercati attivi da Polymarket ({concurrency} richieste in parallelo)...")
+
+    async def fetcher():
+        while True:
+            offset = state["next_offset"]
+            # Nessuna richiesta oltre l'ultima pagina
+            if state["last_offset"] is not None and offset > state["last_offset"]:
+                return
+            state["next_offset"] += PAGE_LIMIT
+
+            markets = await loop.run_in_executor(fetch_executor, fetch_page, session, offset)
+
             # Se il numero di mercati è minore del limite, siamo all'ultima pagina
-            if len(markets) < limit:
-                print(f"Ultima pagina raggiunta (meno di {limit} mercati).")
-                break
-                
-            offset += limit
-            
-        except Exception as e:
-            raise Exception(f"Errore nel recupero mercati alla pagina {page_num}: {str(e)}")
-    
-    print(f"Fetch completato! Totale mercati recuperati: {len(all_markets)}")
-    return all_markets
+            if len(markets) < PAGE_LIMIT:
+                if state["last_offset"] is None or offset < state["last_offset"]:
+                    state["last_offset"] = offset
+
+            if markets:
+                await pages.put(markets)
+
+    async def writer():
+        while True:
+            markets = await pages.get()
+            if markets is None:
+                return
+            inserted, updated = await loop.run_in_executor(write_executor, write_page, collection, markets)
+            stats["pages"] += 1
+            stats["markets"] += len(markets)
+            stats["inserted"] += inserted
+            stats["updated"] += updated
+            print(f"Scritta pagina di {len(markets)} mercati. Totale: {stats['markets']}")
+
+    fetchers = asyncio.gather(*(fetcher() for _ in range(concurrency)))
+    writer_task = asyncio.create_task(writer())
+
+    try:
+        await asyncio.wait([fetchers, writer_task], return_when=asyncio.FIRST_COMPLETED)
+        if writer_task.done():
+            # Il writer termina prima dei fetch solo in caso di errore
+            fetchers.cancel()
+            writer_task.result()
+        fetchers.result()
+
+        await pages.put(None)
+        await writer_task
+
+    except BaseException:
+        fetchers.cancel()
+        writer_task.cancel()
+        raise
+    finally:
+        fetch_executor.shutdown(wait=False)
+        write_executor.shutdown(wait=False)
+        session.close()
+
+    print(f"Sync completato! Totale mercati recuperati: {stats['markets']} in {stats['pages']} pagine")
+    return stats
 
 def main(args):
     mongo_uri = os.environ.get("MONGO_URI")
@@ -51,58 +133,26 @@ def main(args):
     db = client[mongo_db]
     collection = db[mongo_collection]
 
-    # Fetch tutti i mercati attivi da Polymarket con paginazione
+    # Indice per gli upsert per id
+    collection.create_index("id")
+
+    # I mercati scritti in questo run hanno lastUpdateAt >= sync_started_at
+    sync_started_at = datetime.now(timezone.utc)
+
+    # Fetch dei mercati attivi con paginazione concorrente, salvati su MongoDB pagina per pagina
     try:
-        markets = fetch_all_markets()
+        stats = asyncio.run(sync_markets(collection))
     except Exception as e:
         return {"body": f"Errore nel recupero mercati: {str(e)}"}
 
-    # Salva i mercati su MongoDB usando upsert basato su id
-    if markets:
-        # Estrai tutti gli ID dai mercati dell'API
-        api_market_ids = []
-        for market in markets:
-            market_id = market.get('id')
-            if market_id:
-                api_market_ids.append(market_id)
-        
-        print(f"Mercati dall'API: {len(api_market_ids)} ID validi")
-        
-        # Elimina i mercati che non sono più presenti nell'API (non attivi)
-        if api_market_ids:
-            delete_result = collection.delete_many({
-                "id": {"$nin": api_market_ids}  # Elimina documenti con id non contenuto nella lista
-            })
-            deleted_count = delete_result.deleted_count
-            print(f"Eliminati {deleted_count} mercati non più attivi")
-        else:
-            deleted_count = 0
-        
-        # Processa i mercati dall'API
-        updated_count = 0
-        inserted_count = 0
-        
-        for market in markets:
-            market_id = market.get('id')
-            if not market_id:
-                print(f"Mercato senza id trovato, saltato: {market}")
-                continue
-            
-            # Aggiungi timestamp di inserimento/aggiornamento
-            market["lastUpdateAt"] = datetime.now(timezone.utc)
-            
-            # Usa upsert con $set per aggiornare solo i campi presenti, preservando quelli esistenti
-            result = collection.update_one(
-                {"id": market_id},  # Filter by id
-                {"$set": market},  # Update only the fields present in market data
-                upsert=True  # Create if doesn't exist
-            )
-            
-            if result.upserted_id:
-                inserted_count += 1
-            else:
-                updated_count += 1
-        
-        return {"body": f"Processati {len(markets)} mercati: {inserted_count} inseriti, {updated_count} aggiornati, {deleted_count} eliminati"}
-    else:
+    if not stats["markets"]:
         return {"body": "Nessun mercato attivo trovato"}
+
+    # Elimina i mercati che non sono più presenti nell'API (non aggiornati in questo run)
+    delete_result = collection.delete_many({
+        "lastUpdateAt": {"$not": {"$gte": sync_started_at}}
+    })
+    deleted_count = delete_result.deleted_count
+    print(f"Eliminati {deleted_count} mercati non più attivi")
+
+    return {"body": f"Processati {stats['markets']} mercati: {stats['inserted']} inseriti, {stats['updated']} aggiornati, {deleted_count} eliminati"}
@@ -5,14 +5,24 @@ import logging
 import signal
 import sys
 import os
-from typing import Dict, Any, List, Optional
+import time
+from typing import Dict, Any, List, Optional, Set
 from datetime import datetime, timezone
 
 from src.config import config
-from src.database import db_client
+from src.database import async_db_client
 from src.market_monitor import market_monitor
+from src.clob_scheduler import clob_scheduler
 from src.websocket_client import websocket_client
 from src.rabbitmq_client import rabbitmq_client
+from src.order_book import order_book_manager
+from src.book_writer import book_writer
+from src.book_history import book_history
+from src.book_bootstrap import book_bootstrapper
+from src.market_publisher import market_publisher
+from src.market_registry import market_registry
+from src.market_watcher import market_watcher
+from src.events import MarketEvent, BookEvent, PriceChangeEvent, TickSizeChangeEvent, LastTradePriceEvent
 
 # Configure logging
 handlers = [logging.StreamHandler(sys.stdout)]
@@ -38,6 +48,19 @@ class PolymarketMarketMaker:
         self.tasks = []
         self.last_heartbeat = None
         self.websocket_active = False
+        self.started_at = time.monotonic()
+        self.manual_assets: Set[str] = set()  # Subscribed via command on top of the monitored markets
+        self.excluded_assets: Set[str] = set()  # Unsubscribed via command although monitored
+        self.last_stats: Optional[tuple] = None  # (monotonic time, total messages) of the previous stats command
+        self._subscription_lock: Optional[asyncio.Lock] = None  # Serializes subscription syncs and resyncs
+        
+        # Market event handlers keyed by event_type
+        self.event_handlers = {
+            BookEvent.event_type: self.book_message_handler,
+            PriceChangeEvent.event_type: self.price_change_message_handler,
+            TickSizeChangeEvent.event_type: self.tick_size_change_message_handler,
+            LastTradePriceEvent.event_type: self.last_trade_price_message_handler,
+        }
         
     async def handle_restart_command(self, command_data: Dict[str, Any]):
         """Handle restart command from RabbitMQ"""
@@ -51,7 +74,7 @@ class PolymarketMarketMaker:
             await asyncio.sleep(2)
             
             # Get current asset IDs
-            asset_ids = await self.get_all_monitored_asset_ids()
+            asset_ids = await self.get_all_monitored_asset_ids(refresh=True)
             
             if asset_ids:
                 # Restart WebSocket with current assets
@@ -76,6 +99,83 @@ class PolymarketMarketMaker:
         except Exception as e:
             logger.error(f"Error handling restart command: {e}")
     
+    async def handle_snapshot_command(self, command_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle snapshot request - republish book snapshots so a consumer can resync without a restart"""
+        count = market_publisher.submit_snapshots(self.command_asset_ids(command_data) or None)
+        logger.info(f"Queued {count} book snapshots on request")
+        return {'queued': count}
+    
+    @staticmethod
+    def command_asset_ids(command_data: Dict[str, Any]) -> List[str]:
+        """asset_ids list or single asset_id from a command"""
+        asset_ids = command_data.get("asset_ids")
+        if asset_ids is None and command_data.get("asset_id"):
+            asset_ids = [command_data["asset_id"]]
+        return [str(asset_id) for asset_id in asset_ids or []]
+    
+    async def handle_subscribe_command(self, command_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle subscribe command - add assets without reconnecting the others"""
+        asset_ids = self.command_asset_ids(command_data)
+        if not asset_ids:
+            raise ValueError("asset_ids required")
+        
+        for asset_id in asset_ids:
+            self.excluded_assets.discard(asset_id)
+            if market_registry.get_market_for_asset(asset_id) is None:
+                self.manual_assets.add(asset_id)
+        
+        await self.sync_subscriptions()
+        return {'subscribed': asset_ids, 'total_assets': len(self.target_asset_ids())}
+    
+    async def handle_unsubscribe_command(self, command_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle unsubscribe command - drop assets, monitored ones stay excluded until subscribed again"""
+        asset_ids = self.command_asset_ids(command_data)
+        if not asset_ids:
+            raise ValueError("asset_ids required")
+        
+        for asset_id in asset_ids:
+            self.manual_assets.discard(asset_id)
+            if market_registry.get_market_for_asset(asset_id) is not None:
+                self.excluded_assets.add(asset_id)
+        
+        await self.sync_subscriptions()
+        return {'unsubscribed': asset_ids, 'total_assets': len(self.target_asset_ids())}
+    
+    async def handle_stats_command(self, command_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle stats command - live counters and message throughput since the previous request"""
+        stats = self.get_stats()
+        now = time.monotonic()
+        total = sum(websocket_client.get_message_counts().values())
+        since, previous_total = self.last_stats or (self.started_at, 0)
+        elapsed = max(now - since, 1e-9)
+        
+        stats['uptime_seconds'] = round(now - self.started_at, 1)
+        stats['messages_total'] = total
+        stats['messages_per_second'] = round((total - previous_total) / elapsed, 2)
+        self.last_stats = (now, total)
+        
+        if command_data.get("per_asset"):
+            stats['message_counts'] = websocket_client.get_message_counts()
+        return stats
+    
+    async def handle_resync_command(self, command_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle resync command - drop local books and have the server resend them"""
+        async with self.subscription_lock():
+            asset_ids = self.command_asset_ids(command_data) or list(getattr(websocket_client, 'subscriptions', {}).get('market', []))
+            
+            for asset_id in asset_ids:
+                order_book_manager.remove(asset_id, keep_tick_size=True)
+                book_writer.forget(asset_id)
+                book_bootstrapper.forget(asset_id)
+            
+            success = await websocket_client.resubscribe(asset_ids)
+        return {'resynced': len(asset_ids), 'resubscribed': success}
+    
+    async def resync_stale_books(self, asset_ids: List[str]):
+        """WebSocket resync callback for assets whose updates were dropped before being applied"""
+        if asset_ids:
+            await self.handle_resync_command({'asset_ids': asset_ids})
+    
     async def handle_stop_command(self, command_data: Dict[str, Any]):
         """Handle stop command from RabbitMQ - stops WebSocket until restart"""
         try:
@@ -109,6 +209,23 @@ class PolymarketMarketMaker:
         except Exception as e:
             logger.error(f"Error handling stop command: {e}")
     
+    def get_stats(self) -> Dict[str, Any]:
+        """Service counters shared by heartbeats and the stats command"""
+        return {
+            'websocket_active': websocket_client.is_connected(),
+            'monitored_assets': market_registry.asset_count(),
+            'subscribed_assets': len(getattr(websocket_client, 'subscriptions', {}).get('market', [])),
+            'manual_assets': len(self.manual_assets),
+            'excluded_assets': len(self.excluded_assets),
+            'ingest_queue': websocket_client.get_ingest_stats(),
+            'order_books': order_book_manager.get_stats(),
+            'book_writer': book_writer.get_stats(),
+            'book_history': book_history.get_stats(),
+            'bootstrap': book_bootstrapper.get_stats(),
+            'clob': clob_scheduler.get_stats(),
+            'publisher': market_publisher.get_stats()
+        }
+    
     async def heartbeat_loop(self):
         """Send periodic heartbeat messages to RabbitMQ for health monitoring"""
         while self.running:
@@ -117,20 +234,17 @@ class PolymarketMarketMaker:
                 self.last_heartbeat = datetime.now(timezone.utc).isoformat()
                 
                 # Check if WebSocket is currently active
-                self.websocket_active = (
-                    hasattr(websocket_client, 'websocket') and 
-                    websocket_client.websocket and 
-                    not websocket_client.websocket.closed
-                )
+                self.websocket_active = websocket_client.is_connected()
                 
                 # Send heartbeat via RabbitMQ
-                await rabbitmq_client.publish_heartbeat({
+                heartbeat = self.get_stats()
+                heartbeat.update({
                     'timestamp': self.last_heartbeat,
                     'status': 'running',
                     'websocket_active': self.websocket_active,
-                    'monitored_assets': len(await self.get_all_monitored_asset_ids()),
                     'service': 'polymarket-mm'
                 })
+                await rabbitmq_client.publish_heartbeat(heartbeat)
                 
                 # Wait 10 seconds before next heartbeat
                 await asyncio.sleep(10)
@@ -148,55 +262,41 @@ class PolymarketMarketMaker:
             self.last_heartbeat = datetime.now(timezone.utc).isoformat()
             
             # Check if WebSocket is currently active
-            self.websocket_active = (
-                hasattr(websocket_client, 'websocket') and 
-                websocket_client.websocket and 
-                not websocket_client.websocket.closed
-            )
+            self.websocket_active = websocket_client.is_connected()
             
             # Send immediate heartbeat via RabbitMQ
-            await rabbitmq_client.publish_heartbeat({
+            heartbeat = self.get_stats()
+            heartbeat.update({
                 'timestamp': self.last_heartbeat,
                 'status': 'running',
                 'websocket_active': self.websocket_active,
-                'monitored_assets': len(await self.get_all_monitored_asset_ids()),
                 'service': 'polymarket-mm'
             })
+            await rabbitmq_client.publish_heartbeat(heartbeat)
             
             logger.info(f"Sent immediate heartbeat - WebSocket active: {self.websocket_active}")
             
         except Exception as e:
             logger.error(f"Error sending immediate heartbeat: {e}")
         
-    async def main_message_handler(self, message: Dict[str, Any]):
+    async def main_message_handler(self, event: MarketEvent):
         """Main message handler that routes to specific handlers based on event_type"""
         try:
-            event_type = message.get('event_type')
-            
-            if not event_type:
-                logger.warning("No event_type in message")
-                return
+            handler = self.event_handlers.get(event.event_type)
             
-            # Route to appropriate handler based on event_type
-            if event_type == 'book':
-                await self.book_message_handler(message)
-            elif event_type == 'price_change':
-                await self.price_change_message_handler(message)
-            elif event_type == 'tick_size_change':
-                await self.tick_size_change_message_handler(message)
-            elif event_type == 'last_trade_price':
-                await self.last_trade_price_message_handler(message)
+            if handler:
+                await handler(event)
             else:
-                logger.warning(f"Unknown event_type: {event_type}")
+                logger.warning(f"Unknown event_type: {event.event_type}")
                 
         except Exception as e:
             logger.error(f"Error in main message handler: {e}")
     
-    async def book_message_handler(self, message: Dict[str, Any]):
+    async def book_message_handler(self, event: BookEvent):
         """Handle book event - full orderbook snapshot"""
         try:
-            asset_id = message.get('asset_id')
-            condition_id = message.get('market')  # The conditionId is in the 'market' field
+            asset_id = event.asset_id
+            condition_id = event.market  # The conditionId is in the 'market' field
             
             if not asset_id:
                 logger.warning("No asset_id in book message")
@@ -209,82 +309,110 @@ class PolymarketMarketMaker:
             # Use conditionId as market identifier
             market_id = condition_id
             
+            book_bootstrapper.reconcile(asset_id, event.hash)
+            
+            # Books are resent unchanged after reconnects and resubscriptions
+            if order_book_manager.is_unchanged(asset_id, event.hash):
+                logger.debug(f"Skipping unchanged book snapshot for asset {asset_id}")
+                return
+            
+            # New books start from the market's tick size unless the snapshot carries one
+            order_book_manager.seed_tick_size(asset_id, market_registry.get_tick_size(asset_id))
+            
+            # Load snapshot into the in-memory order book
+            book = order_book_manager.apply_snapshot(
+                asset_id,
+                market_id,
+                event.bids,
+                event.asks,
+                hash_value=event.hash,
+                timestamp=event.timestamp,
+                tick_size=event.tick_size
+            )
+            
+            logger.info(f"Book snapshot - Asset: {asset_id}, Bids: {len(event.bids)}, Asks: {len(event.asks)}")
+            
             # Extract book data
             book_data = {
-                'bids': message.get('bids', []),
-                'asks': message.get('asks', []),
-                'spread': message.get('spread'),
-                'mid_price': self.calculate_mid_price(message.get('bids', []), message.get('asks', [])),
-                'timestamp': message.get('timestamp', datetime.now(timezone.utc).isoformat()),
-                'sequence': message.get('sequence'),
-                'last_update_id': message.get('last_update_id'),
-                'hash': message.get('hash')
+                'bids': event.bids,
+                'asks': event.asks,
+                'spread': book.spread(),
+                'mid_price': book.mid_price(),
+                'timestamp': event.timestamp or datetime.now(timezone.utc).isoformat(),
+                'sequence': None,
+                'last_update_id': event.hash,
+                'hash': event.hash
             }
             
-            # Store book data
-            success = db_client.store_book_data(market_id, asset_id, book_data)
+            book_history.record_snapshot(book, event.timestamp)
             
-            if success:
-                logger.info(f"Stored book snapshot for market {market_id}, asset {asset_id}")
-            else:
-                logger.error(f"Failed to store book data for market {market_id}, asset {asset_id}")
+            # Consumers replace their book with the new snapshot
+            market_publisher.submit_snapshot(book)
+            
+            # Queue for write-behind persistence (coalesced per asset, flushed in bulk, duplicates skipped)
+            if book_writer.submit(market_id, asset_id, book_data):
+                logger.debug(f"Queued book snapshot for market {market_id}, asset {asset_id}")
                 
         except Exception as e:
             logger.error(f"Error in book message handler: {e}")
     
-    async def price_change_message_handler(self, message: Dict[str, Any]):
+    async def price_change_message_handler(self, event: PriceChangeEvent):
         """Handle price_change event - order book updates"""
         try:
-            asset_id = message.get('asset_id')
-            condition_id = message.get('market')
-            changes = message.get('changes', [])
+            asset_id = event.asset_id
+            changes = event.changes
             
             logger.info(f"Price change event for asset {asset_id}, changes: {len(changes)}")
             
-            # Send RabbitMQ notification for price change
+            # Apply deltas to the in-memory order book
+            book = order_book_manager.apply_price_change(
+                asset_id,
+                changes,
+                hash_value=event.hash,
+                timestamp=event.timestamp
+            )
+            if book:
+                book_history.record_changes(book, changes, event.timestamp)
+            
+            # Queue RabbitMQ notification for price change (published in batches)
             try:
-                await rabbitmq_client.publish_market_notification(
+                market_publisher.submit(
                     asset_id=asset_id,
                     event_type="price_change",
                     data={
-                        "market": condition_id,
+                        "market": event.market,
                         "changes": changes,
-                        "timestamp": message.get('timestamp')
-                    }
+                        "timestamp": event.timestamp
+                    },
+                    tick_size=book.tick_size if book else None
                 )
-                logger.debug(f"Sent price change notification for asset {asset_id}")
+                logger.debug(f"Queued price change notification for asset {asset_id}")
             except Exception as e:
-                logger.error(f"Error sending price change notification: {e}")
+                logger.error(f"Error queueing price change notification: {e}")
             
         except Exception as e:
             logger.error(f"Error in price change message handler: {e}")
     
-    async def tick_size_change_message_handler(self, message: Dict[str, Any]):
+    async def tick_size_change_message_handler(self, event: TickSizeChangeEvent):
         """Handle tick_size_change event"""
         try:
-            asset_id = message.get('asset_id')
-            condition_id = message.get('market')
-            old_tick_size = message.get('old_tick_size')
-            new_tick_size = message.get('new_tick_size')
-            
-            logger.info(f"Tick size change for asset {asset_id}: {old_tick_size} -> {new_tick_size}")
+            logger.info(f"Tick size change for asset {event.asset_id}: {event.old_tick_size} -> {event.new_tick_size}")
             
-            # TODO: Implement tick size change handling logic
-            # For now, just log the event
+            # Rescale the in-memory book to the new tick grid
+            if event.asset_id and event.new_tick_size:
+                order_book_manager.set_tick_size(event.asset_id, event.new_tick_size)
+                book = order_book_manager.get_book(event.asset_id)
+                if book:
+                    # Deltas after this point are on the new tick grid
+                    book_history.record_snapshot(book, event.timestamp)
             
         except Exception as e:
             logger.error(f"Error in tick size change message handler: {e}")
     
-    async def last_trade_price_message_handler(self, message: Dict[str, Any]):
+    async def last_trade_price_message_handler(self, event: LastTradePriceEvent):
         """Handle last_trade_price event - trade execution"""
         try:
-            asset_id = message.get('asset_id')
-            condition_id = message.get('market')
-            price = message.get('price')
-            side = message.get('side')
-            size = message.get('size')
-            
-            logger.info(f"Trade executed for asset {asset_id}: {side} {size} at {price}")
+            logger.info(f"Trade executed for asset {event.asset_id}: {event.side} {event.size} at {event.price}")
             
             # TODO: Implement trade handling logic
             # For now, just log the event
@@ -292,178 +420,146 @@ class PolymarketMarketMaker:
         except Exception as e:
             logger.error(f"Error in last trade price message handler: {e}")
    
-    def calculate_mid_price(self, bids: List, asks: List) -> float:
-        """Calculate mid price from bids and asks"""
-        try:
-            if not bids or not asks:
-                return 0.0
-            
-            best_bid = float(bids[0]['price']) if bids else 0.0
-            best_ask = float(asks[0]['price']) if asks else 0.0
-            
-            if best_bid > 0 and best_ask > 0:
-                return (best_bid + best_ask) / 2.0
-            
-            return best_bid or best_ask
-            
-        except (ValueError, IndexError, KeyError):
-            return 0.0
-    
     async def find_market_for_asset(self, asset_id: str, condition_id: str = None) -> Optional[str]:
-        """Find market conditionId for given asset ID by searching MongoDB"""
-        try:
-            if condition_id:
-                # If we already have the conditionId from the message, use it
-                return condition_id
-            
-            # Search in monitored markets for this asset_id
-            markets = db_client.get_monitored_markets()
-            
-            for market in markets:
-                # Check if this market contains the asset_id in its clobTokenIds
-                clob_token_ids_str = market.get('clobTokenIds')
-                if clob_token_ids_str:
-                    try:
-                        import json
-                        clob_token_ids = json.loads(clob_token_ids_str)
-                        
-                        if isinstance(clob_token_ids, list) and asset_id in [str(token_id) for token_id in clob_token_ids]:
-                            # Return the conditionId for this market
-                            return market.get('conditionId')
-                    except json.JSONDecodeError:
-                        continue
-            
+        """Find market conditionId for given asset ID using the market registry"""
+        if condition_id:
+            # If we already have the conditionId from the message, use it
+            return condition_id
+        
+        market_id = market_registry.get_market_for_asset(asset_id)
+        if not market_id:
             logger.warning(f"No market found for asset_id {asset_id}")
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error finding market for asset {asset_id}: {e}")
-            return None
+        return market_id
     
-    async def get_all_monitored_asset_ids(self) -> List[str]:
-        """Get all asset IDs from monitored markets"""
+    async def get_all_monitored_asset_ids(self, refresh: bool = False) -> List[str]:
+        """Get all asset IDs from monitored markets, reloading the registry from MongoDB if requested"""
         try:
-            markets = db_client.get_monitored_markets()
-            asset_ids = []
-            
-            for market in markets:
-                # Extract token IDs from clobTokenIds field
-                clob_token_ids_str = market.get('clobTokenIds')
-                if clob_token_ids_str:
-                    try:
-                        # Parse the JSON string array
-                        import json
-                        clob_token_ids = json.loads(clob_token_ids_str)
-                        
-                        # Each market has 2 token IDs for Yes and No outcomes
-                        if isinstance(clob_token_ids, list):
-                            for token_id in clob_token_ids:
-                                if token_id:  # Make sure token ID is not empty
-                                    asset_ids.append(str(token_id))
-                            
-                            logger.debug(f"Market {market.get('id', 'unknown')} has {len(clob_token_ids)} token IDs: {clob_token_ids}")
-                        else:
-                            logger.warning(f"clobTokenIds is not a list for market {market.get('id', 'unknown')}: {clob_token_ids}")
-                    
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Failed to parse clobTokenIds for market {market.get('id', 'unknown')}: {e}")
-                    except Exception as e:
-                        logger.error(f"Error processing clobTokenIds for market {market.get('id', 'unknown')}: {e}")
-                else:
-                    logger.warning(f"No clobTokenIds found for market {market.get('id', 'unknown')}")
+            if refresh or not market_registry.loaded:
+                await market_registry.refresh()
             
-            unique_asset_ids = list(set(asset_ids))  # Remove duplicates
-            logger.info(f"Found {len(unique_asset_ids)} unique token IDs from {len(markets)} monitored markets")
-            return unique_asset_ids
+            asset_ids = self.target_asset_ids()
+            logger.debug(f"Found {len(asset_ids)} unique token IDs from {len(market_registry)} monitored markets")
+            return asset_ids
             
         except Exception as e:
             logger.error(f"Error getting monitored asset IDs: {e}")
             return []
     
-    async def periodic_cleanup(self):
-        """Periodic cleanup of old data"""
-        while self.running:
+    async def bootstrap_books(self, asset_ids: List[str]):
+        """WebSocket connect callback seeding books from REST while the snapshots are on their way"""
+        try:
+            await book_bootstrapper.bootstrap(asset_ids, self.main_message_handler)
+        except Exception as e:
+            logger.error(f"Error bootstrapping books: {e}")
+    
+    def target_asset_ids(self) -> List[str]:
+        """Monitored assets plus the ones subscribed by command, minus the ones unsubscribed by command"""
+        asset_ids = [asset_id for asset_id in market_registry.asset_ids() if asset_id not in self.excluded_assets]
+        asset_ids.extend(asset_id for asset_id in self.manual_assets
+                         if asset_id not in self.excluded_assets and market_registry.get_market_for_asset(asset_id) is None)
+        return asset_ids
+    
+    def start_websocket(self, asset_ids: List[str], api_creds=None):
+        """Start the WebSocket reconnect loop for the given assets"""
+        # Record the subscriptions right away so syncs arriving before the first connect
+        # update the pending list instead of starting a second loop
+        websocket_client.subscriptions["market"] = asset_ids.copy()
+        websocket_task = asyncio.create_task(
+            websocket_client.reconnect_loop(
+                asset_ids, 
+                self.main_message_handler,
+                api_creds=api_creds,
+                max_retries=10
+            )
+        )
+        self.tasks.append(websocket_task)
+    
+    def subscription_lock(self) -> asyncio.Lock:
+        """Lock held while subscriptions change, created on the running loop"""
+        if self._subscription_lock is None:
+            self._subscription_lock = asyncio.Lock()
+        return self._subscription_lock
+    
+    async def sync_subscriptions(self):
+        """Bring WebSocket subscriptions in line with the monitored asset set in the market registry"""
+        # Watcher, periodic check and commands can all trigger a sync
+        async with self.subscription_lock():
+            await self.apply_subscriptions()
+    
+    async def apply_subscriptions(self):
+        """Diff the target asset set against the current subscriptions and apply the changes"""
+        new_asset_ids = self.target_asset_ids()
+        
+        if not new_asset_ids:
+            logger.debug("No monitored asset IDs found - staying in idle mode")
+            return
+        
+        # Check if we have WebSocket client and if asset IDs have changed
+        current_subscriptions = getattr(websocket_client, 'subscriptions', {}).get('market', [])
+        
+        # If no current subscriptions but we have new assets, start WebSocket
+        if not current_subscriptions:
+            logger.info(f"Found {len(new_asset_ids)} assets to monitor - starting WebSocket from idle mode")
             try:
-                # Wait 1 hour
-                await asyncio.sleep(3600)
-                
-                # Cleanup old book data (keep last 7 days)
-                deleted_count = db_client.cleanup_old_book_data(days_to_keep=7)
-                logger.info(f"Cleaned up {deleted_count} old book data records")
+                # Get API credentials from market monitor's CLOB client
+                api_creds = None
+                if market_monitor.clob_client:
+                    try:
+                        logger.info("Using CLOB client API credentials for WebSocket")
+                    except Exception as e:
+                        logger.warning(f"Could not get API credentials: {e}")
                 
-            except asyncio.CancelledError:
-                break
+                # Start WebSocket client with reconnection loop
+                self.start_websocket(new_asset_ids, api_creds)
+                logger.info(f"WebSocket started from idle mode with {len(new_asset_ids)} assets")
             except Exception as e:
-                logger.error(f"Error in periodic cleanup: {e}")
+                logger.error(f"Failed to start WebSocket from idle mode: {e}")
+            return
+        
+        # Compare current subscriptions with new asset IDs
+        if set(new_asset_ids) != set(current_subscriptions):
+            added_assets = set(new_asset_ids) - set(current_subscriptions)
+            removed_assets = set(current_subscriptions) - set(new_asset_ids)
+            
+            logger.info(f"Market changes detected - Added: {len(added_assets)}, Removed: {len(removed_assets)}")
+            
+            if added_assets:
+                logger.info(f"New assets to monitor: {list(added_assets)[:5]}...")
+            if removed_assets:
+                logger.info(f"Assets no longer monitored: {list(removed_assets)[:5]}...")
+            
+            # Update WebSocket subscriptions incrementally (only added/removed assets)
+            try:
+                success = await websocket_client.update_market_subscriptions(new_asset_ids)
+                if success:
+                    logger.info(f"Successfully updated WebSocket subscriptions to {len(new_asset_ids)} assets")
+                    for asset_id in removed_assets:
+                        order_book_manager.remove(asset_id)
+                        book_history.close(asset_id)
+                        book_writer.forget(asset_id)
+                        book_bootstrapper.forget(asset_id)
+                else:
+                    logger.error("Failed to update WebSocket subscriptions with new assets")
+            except Exception as e:
+                logger.error(f"Failed to update WebSocket subscriptions: {e}")
+        else:
+            logger.debug(f"No changes in monitored markets ({len(new_asset_ids)} assets)")
     
     async def periodic_market_check(self):
-        """Periodic check for new markets to monitor and update WebSocket subscriptions"""
+        """Periodic check for new markets to monitor, fallback when the change stream is unavailable"""
         while self.running:
             try:
                 # Wait configured interval between checks
                 await asyncio.sleep(config.MARKET_CHECK_INTERVAL)
                 
-                # Get current monitored asset IDs
-                new_asset_ids = await self.get_all_monitored_asset_ids()
-                
-                if not new_asset_ids:
-                    logger.debug("No monitored asset IDs found during periodic check - staying in idle mode")
+                # The change stream already pushes every market set change
+                if market_watcher.active:
+                    logger.debug("Market change stream active - skipping periodic market check")
                     continue
                 
-                # Check if we have WebSocket client and if asset IDs have changed
-                current_subscriptions = getattr(websocket_client, 'subscriptions', {}).get('market', [])
-                
-                # If no current subscriptions but we have new assets, start WebSocket
-                if not current_subscriptions and new_asset_ids:
-                    logger.info(f"Found {len(new_asset_ids)} assets to monitor - starting WebSocket from idle mode")
-                    try:
-                        # Get API credentials from market monitor's CLOB client
-                        api_creds = None
-                        if market_monitor.clob_client:
-                            try:
-                                logger.info("Using CLOB client API credentials for WebSocket")
-                            except Exception as e:
-                                logger.warning(f"Could not get API credentials: {e}")
-                        
-                        # Start WebSocket client with reconnection loop
-                        websocket_task = asyncio.create_task(
-                            websocket_client.reconnect_loop(
-                                new_asset_ids, 
-                                self.main_message_handler,
-                                api_creds=api_creds,
-                                max_retries=10
-                            )
-                        )
-                        self.tasks.append(websocket_task)
-                        logger.info(f"WebSocket started from idle mode with {len(new_asset_ids)} assets")
-                        continue
-                    except Exception as e:
-                        logger.error(f"Failed to start WebSocket from idle mode: {e}")
-                        continue
-                
-                # Compare current subscriptions with new asset IDs
-                if set(new_asset_ids) != set(current_subscriptions):
-                    added_assets = set(new_asset_ids) - set(current_subscriptions)
-                    removed_assets = set(current_subscriptions) - set(new_asset_ids)
-                    
-                    logger.info(f"Market changes detected - Added: {len(added_assets)}, Removed: {len(removed_assets)}")
-                    
-                    if added_assets:
-                        logger.info(f"New assets to monitor: {list(added_assets)[:5]}...")
-                    if removed_assets:
-                        logger.info(f"Assets no longer monitored: {list(removed_assets)[:5]}...")
-                    
-                    # Update WebSocket subscriptions with new asset list by reconnecting
-                    try:
-                        success = await websocket_client.update_market_subscriptions(new_asset_ids)
-                        if success:
-                            logger.info(f"Successfully reinitialized WebSocket with {len(new_asset_ids)} assets")
-                        else:
-                            logger.error("Failed to reinitialize WebSocket with new assets")
-                    except Exception as e:
-                        logger.error(f"Failed to update WebSocket subscriptions: {e}")
-                else:
-                    logger.debug(f"No changes in monitored markets ({len(new_asset_ids)} assets)")
+                # Reload monitored markets and apply any changes
+                await market_registry.refresh()
+                await self.sync_subscriptions()
                 
             except asyncio.CancelledError:
                 break
@@ -476,31 +572,57 @@ class PolymarketMarketMaker:
             logger.info("Starting Polymarket Market Maker...")
             self.running = True
             
-            # Connect to database
-            if not db_client.connect():
+            # Connect to MongoDB and RabbitMQ and set up the CLOB client concurrently
+            private_key = os.getenv('WALLET_PRIVATE_KEY')
+            db_connected, rabbitmq_connected, _ = await asyncio.gather(
+                async_db_client.connect(),
+                rabbitmq_client.connect(),
+                market_monitor.initialize_clob(private_key)
+            )
+            
+            if not db_connected:
                 logger.error("Failed to connect to database")
                 return False
             
-            # Connect to RabbitMQ
-            if not await rabbitmq_client.connect():
+            if not rabbitmq_connected:
                 logger.error("Failed to connect to RabbitMQ")
                 return False
             
             # Setup command handlers
             rabbitmq_client.add_command_handler("restart", self.handle_restart_command)
             rabbitmq_client.add_command_handler("stop", self.handle_stop_command)
+            rabbitmq_client.add_command_handler("snapshot", self.handle_snapshot_command)
+            rabbitmq_client.add_command_handler("subscribe", self.handle_subscribe_command)
+            rabbitmq_client.add_command_handler("unsubscribe", self.handle_unsubscribe_command)
+            rabbitmq_client.add_command_handler("stats", self.handle_stats_command)
+            rabbitmq_client.add_command_handler("resync", self.handle_resync_command)
             
             # Start RabbitMQ command listener
             rabbitmq_task = asyncio.create_task(rabbitmq_client.start_command_listener())
             self.tasks.append(rabbitmq_task)
             
+            # Start batched market notification publisher on its own channels
+            publisher_task = asyncio.create_task(market_publisher.run())
+            self.tasks.append(publisher_task)
+            
+            # Periodic book snapshots for consumers tracking sequence numbers
+            snapshot_task = asyncio.create_task(market_publisher.snapshot_loop())
+            self.tasks.append(snapshot_task)
+            
             # Start heartbeat task
             heartbeat_task = asyncio.create_task(self.heartbeat_loop())
             self.tasks.append(heartbeat_task)
             
-            # Initialize market monitor with proper CLOB client
-            private_key = os.getenv('WALLET_PRIVATE_KEY')
-            if not await market_monitor.initialize(private_key):
+            # Start write-behind book persistence
+            book_writer_task = asyncio.create_task(book_writer.run())
+            self.tasks.append(book_writer_task)
+            
+            # Start book history segment rotation and persistence
+            book_history_task = asyncio.create_task(book_history.run())
+            self.tasks.append(book_history_task)
+            
+            # Initialize market monitor (database and CLOB client are already set up)
+            if not await market_monitor.initialize(private_key, connect_db=False):
                 logger.error("Failed to initialize market monitor")
                 return False
             
@@ -511,15 +633,25 @@ class PolymarketMarketMaker:
                 logger.warning("No asset IDs found to monitor at startup - service will run in idle mode and check periodically")
             else:
                 logger.info(f"Monitoring {len(asset_ids)} assets")
+                
+                # Warm the books from REST so they are ready before the WebSocket snapshot burst
+                await book_bootstrapper.bootstrap(asset_ids, self.main_message_handler)
+            
+            # Re-seed books after every reconnect (assets seeded recently are skipped)
+            websocket_client.add_connect_callback(self.bootstrap_books)
             
-            # Start periodic cleanup task
-            cleanup_task = asyncio.create_task(self.periodic_cleanup())
-            self.tasks.append(cleanup_task)
+            # Rebuild books that missed updates dropped by the ingest backpressure policy
+            websocket_client.add_resync_callback(self.resync_stale_books)
             
             # Start periodic market check task
             market_check_task = asyncio.create_task(self.periodic_market_check())
             self.tasks.append(market_check_task)
             
+            # Push market set changes immediately when the deployment supports change streams
+            if config.MARKET_CHANGE_STREAMS:
+                market_watch_task = asyncio.create_task(market_watcher.run(self.sync_subscriptions))
+                self.tasks.append(market_watch_task)
+            
             # Get API credentials from market monitor's CLOB client
             api_creds = None
             if market_monitor.clob_client:
@@ -531,15 +663,7 @@ class PolymarketMarketMaker:
             
             # Start WebSocket client only if we have assets to monitor
             if asset_ids:
-                websocket_task = asyncio.create_task(
-                    websocket_client.reconnect_loop(
-                        asset_ids, 
-                        self.main_message_handler,
-                        api_creds=api_creds,
-                        max_retries=10
-                    )
-                )
-                self.tasks.append(websocket_task)
+                self.start_websocket(asset_ids, api_creds)
             else:
                 logger.info("No WebSocket connection started - waiting for markets to be added")
             
@@ -571,14 +695,22 @@ class PolymarketMarketMaker:
             if self.tasks:
                 await asyncio.gather(*self.tasks, return_exceptions=True)
             
+            await market_watcher.stop()
+            await clob_scheduler.stop()
+            
             # Close WebSocket connection
             await websocket_client.close()
             
-            # Disconnect from RabbitMQ
+            # Flush buffered book snapshots before the database goes away
+            await book_writer.stop()
+            await book_history.stop()
+            
+            # Publish queued notifications, then disconnect from RabbitMQ
+            await market_publisher.stop()
             await rabbitmq_client.disconnect()
             
             # Disconnect from database
-            db_client.disconnect()
+            await async_db_client.disconnect()
             
             logger.info("Polymarket Market Maker stopped")
             
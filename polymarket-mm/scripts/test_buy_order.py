@@ -19,6 +19,10 @@ import time
 # Add parent directory to path to import from src
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Same rate limits, priority classes and 429 retries as the service
+from src.clob_scheduler import clob_scheduler
+from src.credential_cache import credential_cache
+
 # Polygon Network Configuration
 POLYGON_CHAIN_ID = 137
 
@@ -39,13 +43,17 @@ class PolymarketTestTrader:
         print(f"✅ Connected to Polymarket CLOB")
         print(f"🔐 Wallet address: {self.client.get_address()}")
         
-        # Generate and set API credentials for Level 2 auth
-        print("🔑 Generating API credentials...")
+        # Set API credentials for Level 2 auth, cached on disk between runs
+        # and re-derived only if the CLOB rejects them
+        clob_scheduler.reauthenticate = lambda: credential_cache.derive(self.client, private_key, funder_address)
         try:
-            api_creds = self.client.create_or_derive_api_creds()
-            self.client.set_api_creds(api_creds)
-            print("✅ API credentials set successfully!")
-            print(f"📋 API Key: {api_creds.api_key}")
+            if credential_cache.apply(self.client, private_key, funder_address):
+                print("✅ Using cached API credentials")
+            else:
+                print("🔑 Generating API credentials...")
+                clob_scheduler.call_sync("metadata", clob_scheduler.reauthenticate)
+                print("✅ API credentials set successfully!")
+            print(f"📋 API Key: {self.client.creds.api_key}")
         except Exception as e:
             print(f"⚠️  Warning: Failed to set API credentials: {e}")
             print("Some features may be limited")
@@ -63,16 +71,16 @@ class PolymarketTestTrader:
         """Get comprehensive token information using direct client methods"""
         try:
             # Get midpoint price
-            midpoint = self.client.get_midpoint(token_id)
+            midpoint = clob_scheduler.call_sync("book", self.client.get_midpoint, token_id)
             
             # Get current buy price
-            buy_price = self.client.get_price(token_id, side="BUY")
+            buy_price = clob_scheduler.call_sync("book", self.client.get_price, token_id, side="BUY")
             
             # Get orderbook
-            orderbook = self.client.get_order_book(token_id)
+            orderbook = clob_scheduler.call_sync("book", self.client.get_order_book, token_id)
             
             # Get detailed orderbook using BookParams
-            detailed_books = self.client.get_order_books([BookParams(token_id=token_id)])
+            detailed_books = clob_scheduler.call_sync("book", self.client.get_order_books, [BookParams(token_id=token_id)])
             
             return {
                 'token_id': token_id,
@@ -105,12 +113,12 @@ class PolymarketTestTrader:
             print("\n🔄 Creating signed order...")
             
             # Create the signed order
-            signed_order = self.client.create_order(order_args)
+            signed_order = clob_scheduler.call_sync("order", self.client.create_order, order_args)
             
             print("🔄 Submitting order to Polymarket...")
             
             # Submit the order
-            resp = self.client.post_order(signed_order, OrderType.GTC)
+            resp = clob_scheduler.call_sync("order", self.client.post_order, signed_order, OrderType.GTC)
 
             if resp.get('success'):
                 order_id = resp.get('orderID')
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Any, Optional
+from src.config import config
+from src.events import BookEvent
+from src.market_monitor import market_monitor
+from src.order_book import order_book_manager
+
+logger = logging.getLogger(__name__)
+
+def _newer_or_equal(current: Optional[str], candidate: Optional[str]) -> bool:
+    """True if the live book timestamp is at least as recent as the REST snapshot"""
+    try:
+        return current is not None and candidate is not None and int(current) >= int(candidate)
+    except (TypeError, ValueError):
+        return False
+
+class BookBootstrapper:
+    """Seeds order books from batched CLOB REST snapshots at startup and after reconnects"""
+
+    def __init__(self):
+        self.enabled = config.BOOK_BOOTSTRAP_ENABLED
+        self.timeout = config.BOOK_BOOTSTRAP_TIMEOUT
+        self.min_interval = config.BOOK_BOOTSTRAP_MIN_INTERVAL
+        self.last_seeded: Dict[str, float] = {}  # asset_id -> monotonic time of the last REST seed
+        self.seeded_hashes: Dict[str, str] = {}  # asset_id -> hash seeded, until the WebSocket snapshot arrives
+
+        # Metrics
+        self.runs = 0
+        self.seeded = 0
+        self.skipped_newer = 0
+        self.matched = 0
+        self.replaced = 0
+        self.last_duration: Optional[float] = None
+
+    async def bootstrap(self, asset_ids: List[str], handler: Callable[[BookEvent], Awaitable[Any]]) -> int:
+        """Fetch books for the assets and feed them to the book handler, returns how many were seeded"""
+        if not self.enabled or not asset_ids:
+            return 0
+
+        now = time.monotonic()
+        asset_ids = [asset_id for asset_id in asset_ids
+                     if now - self.last_seeded.get(asset_id, float('-inf')) >= self.min_interval]
+        if not asset_ids:
+            return 0
+
+        started = time.perf_counter()
+        try:
+            books = await asyncio.wait_for(market_monitor.get_order_books(asset_ids), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Book bootstrap for {len(asset_ids)} assets timed out after {self.timeout}s")
+            return 0
+        except Exception as e:
+            logger.error(f"Book bootstrap failed: {e}")
+            return 0
+
+        seeded = 0
+        for asset_id, summary in books.items():
+            book = order_book_manager.get_book(asset_id)
+            if book is not None and _newer_or_equal(book.timestamp, summary.timestamp):
+                # The WebSocket snapshot won the race
+                self.skipped_newer += 1
+                continue
+
+            event = BookEvent(
+                asset_id,
+                summary.market,
+                summary.timestamp,
+                summary.hash,
+                [{'price': level.price, 'size': level.size} for level in (summary.bids or [])],
+                [{'price': level.price, 'size': level.size} for level in (summary.asks or [])],
+                summary.tick_size
+            )
+            # Our own snapshot goes through the book handler too, it must not count as a WebSocket one
+            self.seeded_hashes.pop(asset_id, None)
+            await handler(event)
+
+            self.last_seeded[asset_id] = now
+            if summary.hash:
+                self.seeded_hashes[asset_id] = summary.hash
+            seeded += 1
+
+        self.runs += 1
+        self.seeded += seeded
+        self.last_duration = time.perf_counter() - started
+        logger.info(f"Bootstrapped {seeded}/{len(asset_ids)} books from REST in {self.last_duration:.2f}s")
+        return seeded
+
+    def reconcile(self, asset_id: str, hash_value: Optional[str]):
+        """Compare a WebSocket snapshot with the REST seed of the same asset"""
+        seeded = self.seeded_hashes.pop(asset_id, None)
+        if seeded is None:
+            return
+        if seeded == hash_value:
+            self.matched += 1
+        else:
+            self.replaced += 1
+
+    def forget(self, asset_id: str):
+        self.last_seeded.pop(asset_id, None)
+        self.seeded_hashes.pop(asset_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'runs': self.runs,
+            'seeded': self.seeded,
+            'skipped_newer': self.skipped_newer,
+            'matched': self.matched,
+            'replaced': self.replaced,
+            'last_duration': self.last_duration
+        }
+
+# Global book bootstrapper instance
+book_bootstrapper = BookBootstrapper()
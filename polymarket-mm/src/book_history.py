@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional, Union
+from src import codec
+from src.config import config
+from src.database import async_db_client
+from src.order_book import OrderBook, BID_SIDES, ASK_SIDES, SIZE_DECIMALS, parse_scaled
+
+logger = logging.getLogger(__name__)
+
+BID, ASK = 0, 1
+
+def to_ms(timestamp: Union[None, int, float, str, datetime]) -> int:
+    """Event timestamps (epoch ms strings) and datetimes to epoch ms, now when missing"""
+    if timestamp is None or timestamp == '':
+        return int(time.time() * 1000)
+    if isinstance(timestamp, datetime):
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return int(timestamp.timestamp() * 1000)
+    try:
+        return int(timestamp)
+    except (TypeError, ValueError):
+        return int(datetime.fromisoformat(str(timestamp).replace('Z', '+00:00')).timestamp() * 1000)
+
+def from_ms(ms: int) -> datetime:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+class HistorySegment:
+    """Full snapshot of one asset plus the deltas applied after it"""
+    __slots__ = ('asset_id', 'start', 'end', 'tick_size', 'bids', 'asks', 'deltas')
+
+    def __init__(self, book: OrderBook, start: int):
+        self.asset_id = book.asset_id
+        self.start = start
+        self.end = start
+        self.tick_size = str(book.tick_size)
+        self.bids = book.bids.ladder()
+        self.asks = book.asks.ladder()
+        self.deltas: List[List[int]] = []  # [ts_ms, side, ticks, size units]
+
+    def to_document(self) -> Dict[str, Any]:
+        """Compressed time-series document"""
+        payload = codec.dumps({'bids': self.bids, 'asks': self.asks, 'deltas': self.deltas})
+        return {
+            't': from_ms(self.start),
+            'asset_id': self.asset_id,
+            'end': from_ms(self.end),
+            'tick_size': self.tick_size,
+            'delta_count': len(self.deltas),
+            'data': zlib.compress(payload)
+        }
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> 'HistorySegment':
+        payload = codec.loads(zlib.decompress(document['data']))
+        segment = cls.__new__(cls)
+        segment.asset_id = document['asset_id']
+        segment.start = to_ms(document['t'])
+        segment.end = to_ms(document.get('end') or document['t'])
+        segment.tick_size = document['tick_size']
+        segment.bids = payload['bids']
+        segment.asks = payload['asks']
+        segment.deltas = payload['deltas']
+        return segment
+
+    def replay(self, at: int) -> OrderBook:
+        """Rebuild the book as of `at` (epoch ms) from the snapshot and deltas up to it (at most the segment end)"""
+        at = min(at, self.end)
+        book = OrderBook(self.asset_id, tick_size=self.tick_size)
+        book.bids.load([tuple(level) for level in self.bids])
+        book.asks.load([tuple(level) for level in self.asks])
+        sides = (book.bids, book.asks)
+        for ts, side, price, size in self.deltas:
+            if ts > at:
+                break
+            sides[side].update(price, size)
+        return book
+
+class BookHistoryStore:
+    """Records periodic full snapshots and the price_change deltas between them for point-in-time lookups"""
+
+    def __init__(self, segment_seconds: int = None, max_deltas: int = None):
+        self.enabled = config.BOOK_HISTORY_ENABLED
+        self.segment_ms = (segment_seconds or config.BOOK_HISTORY_SEGMENT_SECONDS) * 1000
+        self.max_deltas = max_deltas or config.BOOK_HISTORY_SEGMENT_MAX_DELTAS
+        self.open: Dict[str, HistorySegment] = {}  # asset_id -> segment being recorded
+        self.books: Dict[str, OrderBook] = {}  # asset_id -> live book, for rotating quiet segments
+        self.closed: List[HistorySegment] = []  # Waiting for the next flush
+        self.flushing: List[HistorySegment] = []
+        self.running = False
+
+        # Metrics
+        self.deltas_recorded = 0
+        self.segments_written = 0
+        self.failed_flushes = 0
+
+    def _open(self, book: OrderBook, start: int):
+        self.open[book.asset_id] = HistorySegment(book, start)
+        self.books[book.asset_id] = book
+
+    def _close(self, asset_id: str):
+        segment = self.open.pop(asset_id, None)
+        if segment:
+            self.closed.append(segment)
+
+    def record_snapshot(self, book: OrderBook, timestamp=None):
+        """Start a new segment from the book's current state (after a snapshot or tick size change)"""
+        if not self.enabled:
+            return
+        self._close(book.asset_id)
+        self._open(book, to_ms(timestamp))
+
+    def record_changes(self, book: OrderBook, changes: List[Dict[str, Any]], timestamp=None):
+        """Append price_change deltas already applied to the book"""
+        if not self.enabled:
+            return
+        ts = to_ms(timestamp)
+        segment = self.open.get(book.asset_id)
+        if segment is None:
+            # The book already includes these changes
+            self._open(book, ts)
+            return
+
+        # A refined tick changes the meaning of the recorded ticks, the book already includes these changes
+        if (ts - segment.start >= self.segment_ms or len(segment.deltas) >= self.max_deltas
+                or segment.tick_size != str(book.tick_size)):
+            self.record_snapshot(book, ts)
+            return
+
+        to_ticks = book.tick_size.to_ticks
+        for change in changes:
+            side = (change.get('side') or '').lower()
+            price = change.get('price')
+            size = change.get('size')
+            if price is None or size is None:
+                continue
+            if side in BID_SIDES:
+                side_index = BID
+            elif side in ASK_SIDES:
+                side_index = ASK
+            else:
+                continue
+            segment.deltas.append([ts, side_index, to_ticks(price), parse_scaled(size, SIZE_DECIMALS)])
+            self.deltas_recorded += 1
+        segment.end = max(segment.end, ts)
+
+    def close(self, asset_id: str):
+        """Stop recording an asset that is no longer subscribed"""
+        self._close(asset_id)
+        self.books.pop(asset_id, None)
+
+    def rotate(self, now: Optional[int] = None):
+        """Close segments older than the segment length so quiet assets still get persisted"""
+        now = now or to_ms(None)
+        for asset_id, segment in list(self.open.items()):
+            if now - segment.start >= self.segment_ms:
+                self._close(asset_id)
+                self._open(self.books[asset_id], now)
+
+    async def flush(self) -> bool:
+        """Write closed segments to the history collection"""
+        if not self.closed:
+            return True
+
+        self.flushing, self.closed = self.closed, []
+        documents = [segment.to_document() for segment in self.flushing]
+        success = await async_db_client.store_book_history(documents)
+
+        if success:
+            self.segments_written += len(documents)
+        else:
+            self.failed_flushes += 1
+            self.closed = self.flushing + self.closed
+            logger.error(f"Failed to write {len(documents)} book history segments, will retry")
+        self.flushing = []
+        return success
+
+    async def run(self):
+        """Rotate and flush segments until stopped"""
+        if not self.enabled:
+            return
+        self.running = True
+        interval = min(5.0, self.segment_ms / 1000)
+
+        while self.running:
+            try:
+                await asyncio.sleep(interval)
+                self.rotate()
+                await self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in book history loop: {e}")
+
+    async def stop(self):
+        """Close all open segments and flush them"""
+        self.running = False
+        for asset_id in list(self.open):
+            self._close(asset_id)
+        await self.flush()
+
+    def _find_local(self, asset_id: str, at: int) -> Optional[HistorySegment]:
+        """Latest in-memory segment starting at or before `at`"""
+        segment = self.open.get(asset_id)
+        if segment and segment.start <= at:
+            return segment
+        # flushing holds older segments than closed, newest last
+        for segment in reversed(self.flushing + self.closed):
+            if segment.asset_id == asset_id and segment.start <= at:
+                return segment
+        return None
+
+    async def book_at(self, asset_id: str, at: Union[int, str, datetime]) -> Optional[Dict[str, Any]]:
+        """Ladder of an asset at a point in time, None if no history covers it"""
+        try:
+            at_ms = to_ms(at)
+            segment = self._find_local(asset_id, at_ms)
+            if segment is None:
+                document = await async_db_client.get_book_history_segment(asset_id, from_ms(at_ms))
+                if document is None:
+                    return None
+                segment = HistorySegment.from_document(document)
+
+            book = segment.replay(at_ms)
+            ladder = book.ladder()
+            return {
+                'asset_id': asset_id,
+                'timestamp': at_ms,
+                'tick_size': str(book.tick_size),
+                'bids': ladder['bids'],
+                'asks': ladder['asks']
+            }
+
+        except Exception as e:
+            logger.error(f"Error reconstructing book for asset {asset_id}: {e}")
+            return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'open_segments': len(self.open),
+            'pending_segments': len(self.closed),
+            'deltas_recorded': self.deltas_recorded,
+            'segments_written': self.segments_written,
+            'failed_flushes': self.failed_flushes
+        }
+
+# Global book history instance
+book_history = BookHistoryStore()
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Any, Optional, Tuple
+from src.config import config
+from src.database import async_db_client
+
+logger = logging.getLogger(__name__)
+
+class BookWriteBehind:
+    """Write-behind buffer for book snapshots, coalesced per asset and flushed with bulk writes"""
+
+    def __init__(self, max_batch: int = None, flush_interval: float = None):
+        self.max_batch = max_batch or config.BOOK_WRITE_BATCH_SIZE
+        self.flush_interval = flush_interval or config.BOOK_WRITE_FLUSH_INTERVAL
+        self.pending: Dict[str, Tuple[str, Dict[str, Any]]] = {}  # asset_id -> (market_id, book_data)
+        self.last_hashes: Dict[str, Tuple[str, float]] = {}  # asset_id -> (hash, monotonic time) of the last submitted snapshot
+        self.dedup_max_age = config.BOOK_DEDUP_MAX_AGE
+        self.running = False
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+        # Metrics
+        self.submitted = 0
+        self.duplicates_skipped = 0
+        self.coalesced = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    def is_duplicate(self, asset_id: str, hash_value: Optional[str]) -> bool:
+        """Same hash as the last submitted snapshot, re-written once it is older than dedup_max_age"""
+        if not hash_value:
+            return False
+        last = self.last_hashes.get(asset_id)
+        return last is not None and last[0] == hash_value and time.monotonic() - last[1] < self.dedup_max_age
+
+    def forget(self, asset_id: str):
+        """Drop the last hash of an asset that is no longer subscribed"""
+        self.last_hashes.pop(asset_id, None)
+
+    def submit(self, market_id: str, asset_id: str, book_data: Dict[str, Any]) -> bool:
+        """Buffer a book snapshot, replacing any unflushed snapshot of the same asset, False if skipped as a duplicate"""
+        hash_value = book_data.get('hash')
+        if self.is_duplicate(asset_id, hash_value):
+            self.duplicates_skipped += 1
+            return False
+        if hash_value:
+            self.last_hashes[asset_id] = (hash_value, time.monotonic())
+
+        if asset_id in self.pending:
+            self.coalesced += 1
+        self.pending[asset_id] = (market_id, book_data)
+        self.submitted += 1
+
+        if len(self.pending) >= self.max_batch and self._flush_requested:
+            self._flush_requested.set()
+        return True
+
+    async def flush(self) -> bool:
+        """Write all buffered snapshots"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            if not self.pending:
+                return True
+
+            batch = self.pending
+            self.pending = {}
+            entries = [(market_id, asset_id, book_data) for asset_id, (market_id, book_data) in batch.items()]
+
+            success = await async_db_client.store_book_data_bulk(entries)
+            self.flushes += 1
+
+            if success:
+                self.written += len(entries)
+                logger.debug(f"Flushed {len(entries)} book snapshots")
+            else:
+                self.failed_flushes += 1
+                # Put the batch back unless newer snapshots arrived meanwhile
+                for asset_id, value in batch.items():
+                    self.pending.setdefault(asset_id, value)
+                logger.error(f"Failed to flush {len(entries)} book snapshots, will retry")
+
+            return success
+
+    async def run(self):
+        """Flush on size or time trigger until stopped"""
+        self.running = True
+        self._flush_requested = asyncio.Event()
+
+        while self.running:
+            try:
+                try:
+                    await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._flush_requested.clear()
+                await self.flush()
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in book write-behind loop: {e}")
+
+    async def stop(self):
+        """Stop the loop and flush what is left"""
+        self.running = False
+        if self._flush_requested:
+            self._flush_requested.set()
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'pending': len(self.pending),
+            'submitted': self.submitted,
+            'duplicates_skipped': self.duplicates_skipped,
+            'coalesced': self.coalesced,
+            'written': self.written,
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes
+        }
+
+# Global book writer instance
+book_writer = BookWriteBehind()
@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Deque, Dict, List, Any, Optional
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes, lower runs first
+ORDER_LANE, BOOK_LANE, METADATA_LANE = 0, 1, 2
+LANE_NAMES = ("order", "book", "metadata")
+
+# Endpoint class -> lane, each class has its own token bucket
+ENDPOINT_LANES = {
+    "order": ORDER_LANE,  # create/post order
+    "cancel": ORDER_LANE,  # cancel, cancel_orders, cancel_all
+    "book": BOOK_LANE,  # get_order_book(s), midpoint, price
+    "metadata": METADATA_LANE  # markets, api keys, everything else
+}
+
+def is_rate_limited(error: Exception) -> bool:
+    """True for HTTP 429 errors (PolyApiException carries status_code, requests errors a response)"""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status == 429
+
+def is_auth_error(error: Exception) -> bool:
+    """True for HTTP 401 errors, the L2 credentials were rejected"""
+    return getattr(error, 'status_code', None) == 401
+
+class TokenBucket:
+    """Token bucket shared by the event loop and blocking callers, rate <= 0 means unlimited"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = max(burst, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> float:
+        """Take a token, returns 0 on success or the seconds until one is available"""
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def drain(self):
+        """Empty the bucket after the server pushed back"""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, 0.0)
+
+class ClobRequest:
+    """Blocking CLOB call waiting for its lane, bucket and a worker"""
+    __slots__ = ('endpoint', 'lane', 'func', 'future', 'attempts', 'reauthenticated')
+
+    def __init__(self, endpoint: str, func: Callable[[], Any], future: asyncio.Future):
+        self.endpoint = endpoint
+        self.lane = ENDPOINT_LANES[endpoint]
+        self.func = func
+        self.future = future
+        self.attempts = 0
+        self.reauthenticated = False
+
+class ClobScheduler:
+    """Runs CLOB REST calls by priority lane under per-endpoint-class rate limits, retrying 429s with jitter
+
+    Order and cancel calls always go first and have workers reserved for them, so they never
+    wait behind bulk book or metadata requests.
+    """
+
+    def __init__(self, max_workers: int = None, reserved_workers: int = None):
+        self.max_workers = max_workers or config.CLOB_MAX_WORKERS
+        self.reserved_workers = min(
+            config.CLOB_ORDER_RESERVED_WORKERS if reserved_workers is None else reserved_workers,
+            self.max_workers - 1
+        )
+        self.max_retries = config.CLOB_MAX_RETRIES
+        self.retry_base_delay = config.CLOB_RETRY_BASE_DELAY
+        burst = config.CLOB_RATE_BURST_SECONDS
+        rates = {
+            "order": config.CLOB_ORDER_RATE,
+            "cancel": config.CLOB_CANCEL_RATE,
+            "book": config.CLOB_BOOK_RATE,
+            "metadata": config.CLOB_METADATA_RATE
+        }
+        self.buckets = {endpoint: TokenBucket(rate, rate * burst) for endpoint, rate in rates.items()}
+        self.lanes: List[Deque[ClobRequest]] = [deque() for _ in LANE_NAMES]
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="clob")
+        self.active = 0
+        self.reauthenticate: Optional[Callable[[], Any]] = None  # Blocking credential re-derivation, retried once per call on 401
+        self._reauth: Optional[asyncio.Future] = None  # Re-derivation in flight, shared by concurrent 401s
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.completed = [0] * len(LANE_NAMES)
+        self.rate_limited = 0
+        self.retried = 0
+        self.reauthentications = 0
+        self.failed = 0
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def call(self, endpoint: str, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking ClobClient method in its lane and return its result"""
+        request = ClobRequest(endpoint, partial(func, *args, **kwargs), asyncio.get_running_loop().create_future())
+        return await self._enqueue(request)
+
+    def _enqueue(self, request: ClobRequest) -> asyncio.Future:
+        self._ensure_dispatcher()
+        self.lanes[request.lane].append(request)
+        self._wakeup.set()
+        return request.future
+
+    def call_sync(self, endpoint: str, func: Callable, *args, **kwargs) -> Any:
+        """Blocking variant for scripts without an event loop, same buckets and 429 retries"""
+        bucket = self.buckets[endpoint]
+        attempts = 0
+        reauthenticated = False
+        while True:
+            delay = bucket.try_acquire()
+            if delay:
+                time.sleep(delay)
+                continue
+            try:
+                result = func(*args, **kwargs)
+                self.completed[ENDPOINT_LANES[endpoint]] += 1
+                return result
+            except Exception as e:
+                if is_auth_error(e) and self.reauthenticate and not reauthenticated:
+                    reauthenticated = True
+                    self.reauthentications += 1
+                    self.reauthenticate()
+                    continue
+                if not is_rate_limited(e) or attempts >= self.max_retries:
+                    self.failed += 1
+                    raise
+                attempts += 1
+                self._throttled(bucket)
+                time.sleep(self.backoff(attempts))
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter exponential backoff"""
+        return random.uniform(0, self.retry_base_delay * (2 ** attempt))
+
+    def _throttled(self, bucket: TokenBucket):
+        self.rate_limited += 1
+        self.retried += 1
+        bucket.drain()
+
+    def _worker_limit(self, lane: int) -> int:
+        return self.max_workers if lane == ORDER_LANE else self.max_workers - self.reserved_workers
+
+    def _dispatch_ready(self) -> Optional[float]:
+        """Start every request that can run now, returns the wait until the next token (None if idle)"""
+        wait = None
+        for lane, queue in enumerate(self.lanes):
+            while queue:
+                request = queue[0]
+                if request.future.done():
+                    # Caller gave up (timeout or cancellation)
+                    queue.popleft()
+                    continue
+                if self.active >= self._worker_limit(lane):
+                    break
+                delay = self.buckets[request.endpoint].try_acquire()
+                if delay:
+                    wait = delay if wait is None else min(wait, delay)
+                    break
+                queue.popleft()
+                self.active += 1
+                asyncio.create_task(self._execute(request))
+        return wait
+
+    async def _dispatch_loop(self):
+        while True:
+            try:
+                self._wakeup.clear()
+                wait = self._dispatch_ready()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in CLOB scheduler loop: {e}")
+
+    async def _execute(self, request: ClobRequest):
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self.executor, request.func)
+            self.completed[request.lane] += 1
+            if not request.future.done():
+                request.future.set_result(result)
+        except Exception as e:
+            if is_rate_limited(e) and request.attempts < self.max_retries and not request.future.done():
+                request.attempts += 1
+                self._throttled(self.buckets[request.endpoint])
+                delay = self.backoff(request.attempts)
+                logger.warning(f"CLOB {request.endpoint} call rate limited, retry {request.attempts} in {delay:.2f}s")
+                loop.call_later(delay, self._requeue, request)
+            elif is_auth_error(e) and self.reauthenticate and not request.reauthenticated and not request.future.done():
+                request.reauthenticated = True
+                asyncio.create_task(self._reauthenticate_and_retry(request))
+            else:
+                self.failed += 1
+                if not request.future.done():
+                    request.future.set_exception(e)
+        finally:
+            self.active -= 1
+            self._wakeup.set()
+
+    async def _reauthenticate_and_retry(self, request: ClobRequest):
+        """Re-derive the credentials once for all calls rejected meanwhile, then retry the call"""
+        try:
+            if self._reauth is None or self._reauth.done():
+                logger.warning("CLOB rejected the API credentials, deriving new ones")
+                self.reauthentications += 1
+                derive = ClobRequest("metadata", self.reauthenticate, asyncio.get_running_loop().create_future())
+                derive.reauthenticated = True
+                self._reauth = self._enqueue(derive)
+            await asyncio.shield(self._reauth)
+            self._requeue(request)
+        except Exception as e:
+            self.failed += 1
+            if not request.future.done():
+                request.future.set_exception(e)
+
+    def _requeue(self, request: ClobRequest):
+        # Retries go ahead of newer requests in the same lane
+        self.lanes[request.lane].appendleft(request)
+        self._wakeup.set()
+
+    async def stop(self):
+        """Stop dispatching and fail the requests still queued"""
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for queue in self.lanes:
+            while queue:
+                request = queue.popleft()
+                if not request.future.done():
+                    request.future.set_exception(RuntimeError("CLOB scheduler stopped"))
+        self.executor.shutdown(wait=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'active': self.active,
+            'queued': {name: len(queue) for name, queue in zip(LANE_NAMES, self.lanes)},
+            'completed': dict(zip(LANE_NAMES, self.completed)),
+            'rate_limited': self.rate_limited,
+            'retried': self.retried,
+            'reauthentications': self.reauthentications,
+            'failed': self.failed
+        }
+
+# Global CLOB scheduler instance
+clob_scheduler = ClobScheduler()
@@ -0,0 +1,85 @@
+import json
+import logging
+from datetime import datetime
+from typing import Any, Union
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+def _default(value: Any):
+    """Serialize types the stdlib encoder can't handle, matching orjson/msgspec output"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _select_backend(preferred: str) -> str:
+    """Pick the JSON backend, falling back to stdlib when the preferred one isn't installed"""
+    available = {
+        "orjson": orjson is not None,
+        "msgspec": msgspec is not None,
+        "json": True
+    }
+
+    if preferred != "auto":
+        if available.get(preferred):
+            return preferred
+        logger.warning(f"JSON codec '{preferred}' not available, selecting automatically")
+
+    for name in ("orjson", "msgspec", "json"):
+        if available[name]:
+            return name
+
+BACKEND = _select_backend(config.JSON_CODEC.lower())
+
+if BACKEND == "orjson":
+    DecodeError = (ValueError,)
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """Decode JSON from bytes or str"""
+        return orjson.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        """Encode an object to JSON bytes"""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+elif BACKEND == "msgspec":
+    DecodeError = (ValueError, msgspec.DecodeError)
+    _encoder = msgspec.json.Encoder()
+    _decoder = msgspec.json.Decoder()
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """Decode JSON from bytes or str"""
+        return _decoder.decode(data)
+
+    def dumps(obj: Any) -> bytes:
+        """Encode an object to JSON bytes"""
+        return _encoder.encode(obj)
+
+else:
+    DecodeError = (ValueError,)
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """Decode JSON from bytes or str"""
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        """Encode an object to JSON bytes"""
+        return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+
+def dumps_str(obj: Any) -> str:
+    """Encode an object to a JSON str (for text WebSocket frames)"""
+    return dumps(obj).decode()
+
+logger.debug(f"Using JSON codec backend: {BACKEND}")
@@ -9,23 +9,70 @@ class Config:
     MONGO_DB = os.getenv("MONGO_DB", "polymarket_bot")
     MONGO_COLLECTION = os.getenv("MONGO_COLLECTION", "markets")
     BOOK_DATA_COLLECTION = os.getenv("BOOK_DATA_COLLECTION", "book_data")
+    MONGO_MAX_WORKERS = int(os.getenv("MONGO_MAX_WORKERS", "4"))  # Max concurrent MongoDB calls off the event loop
+    MONGO_BATCH_SIZE = int(os.getenv("MONGO_BATCH_SIZE", "500"))  # Cursor batch size for streamed reads
+    BOOK_DATA_TTL_DAYS = int(os.getenv("BOOK_DATA_TTL_DAYS", "7"))  # book_data TTL index, 0 disables expiry
+    BOOK_HISTORY_ENABLED = os.getenv("BOOK_HISTORY_ENABLED", "true").lower() == "true"  # Snapshot + delta history for book_at()
+    BOOK_HISTORY_COLLECTION = os.getenv("BOOK_HISTORY_COLLECTION", "book_history")
+    BOOK_HISTORY_SEGMENT_SECONDS = int(os.getenv("BOOK_HISTORY_SEGMENT_SECONDS", "60"))  # Full snapshot at least this often
+    BOOK_HISTORY_SEGMENT_MAX_DELTAS = int(os.getenv("BOOK_HISTORY_SEGMENT_MAX_DELTAS", "5000"))  # Bounds replay per lookup
+    BOOK_HISTORY_RETENTION_DAYS = int(os.getenv("BOOK_HISTORY_RETENTION_DAYS", "30"))  # Time-series expiry, 0 keeps forever
     
     # Polymarket API Configuration
     POLYMARKET_API_KEY = os.getenv("POLYMARKET_API_KEY", "")
+    CLOB_BOOKS_BATCH_SIZE = int(os.getenv("CLOB_BOOKS_BATCH_SIZE", "100"))  # Tokens per get_order_books request
+    CLOB_MAX_WORKERS = int(os.getenv("CLOB_MAX_WORKERS", "8"))  # Max concurrent CLOB REST calls
+    CLOB_ORDER_RESERVED_WORKERS = int(os.getenv("CLOB_ORDER_RESERVED_WORKERS", "2"))  # Workers only order/cancel calls may use
+    CLOB_ORDER_RATE = float(os.getenv("CLOB_ORDER_RATE", "50"))  # Requests/s per endpoint class, 0 = unlimited
+    CLOB_CANCEL_RATE = float(os.getenv("CLOB_CANCEL_RATE", "50"))
+    CLOB_BOOK_RATE = float(os.getenv("CLOB_BOOK_RATE", "5"))
+    CLOB_METADATA_RATE = float(os.getenv("CLOB_METADATA_RATE", "10"))
+    CLOB_RATE_BURST_SECONDS = float(os.getenv("CLOB_RATE_BURST_SECONDS", "1"))  # Bucket size in seconds of rate
+    CLOB_MAX_RETRIES = int(os.getenv("CLOB_MAX_RETRIES", "5"))  # Retries of 429 responses
+    CLOB_RETRY_BASE_DELAY = float(os.getenv("CLOB_RETRY_BASE_DELAY", "0.5"))  # Seconds, doubled per retry with full jitter
+    CREDENTIAL_CACHE_DIR = os.getenv("CREDENTIAL_CACHE_DIR", os.path.expanduser("~/.polymarket-mm/credentials"))  # Encrypted L2 creds, empty disables
+    BOOK_BOOTSTRAP_ENABLED = os.getenv("BOOK_BOOTSTRAP_ENABLED", "true").lower() == "true"  # Seed books from REST on start/reconnect
+    BOOK_BOOTSTRAP_TIMEOUT = float(os.getenv("BOOK_BOOTSTRAP_TIMEOUT", "10"))  # Seconds before leaving it to the WebSocket
+    BOOK_BOOTSTRAP_MIN_INTERVAL = float(os.getenv("BOOK_BOOTSTRAP_MIN_INTERVAL", "30"))  # Seconds before an asset is seeded again
     
     # WebSocket Configuration
     POLYMARKET_WSS_URL = os.getenv("POLYMARKET_WSS_URL", "wss://ws-subscriptions-clob.polymarket.com/ws/")
+    WS_INCREMENTAL_SUBSCRIPTIONS = os.getenv("WS_INCREMENTAL_SUBSCRIPTIONS", "true").lower() == "true"  # false = make-before-break swap
+    WS_POOL_SIZE = int(os.getenv("WS_POOL_SIZE", "1"))  # Number of WebSocket connections, 1 disables pooling
+    WS_POOL_STRATEGY = os.getenv("WS_POOL_STRATEGY", "hash")  # hash | rate
+    WS_POOL_REBALANCE_INTERVAL = int(os.getenv("WS_POOL_REBALANCE_INTERVAL", "600"))  # Only used by the rate strategy
+    DEFAULT_TICK_SIZE = os.getenv("DEFAULT_TICK_SIZE", "0.01")  # Without a market/CLOB tick, refined by finer prices
+    INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))  # Max queued market updates per connection
+    INGEST_BACKPRESSURE_POLICY = os.getenv("INGEST_BACKPRESSURE_POLICY", "block")  # block | drop_oldest | drop_newest, dropped book updates trigger a resync
     
     # Application Configuration
+    JSON_CODEC = os.getenv("JSON_CODEC", "auto")  # auto | orjson | msgspec | json
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     LOG_TO_FILE = os.getenv("LOG_TO_FILE", "false").lower() == "true"
     LOG_FILE_PATH = os.getenv("LOG_FILE_PATH", "polymarket_mm.log")
     UPDATE_INTERVAL = int(os.getenv("UPDATE_INTERVAL", "1"))
     MARKET_CHECK_INTERVAL = int(os.getenv("MARKET_CHECK_INTERVAL", "300"))  # Default 5 minutes
+    MARKET_CHANGE_STREAMS = os.getenv("MARKET_CHANGE_STREAMS", "true").lower() == "true"  # Requires a replica set, polling otherwise
+    BOOK_WRITE_BATCH_SIZE = int(os.getenv("BOOK_WRITE_BATCH_SIZE", "500"))  # Flush when this many assets are buffered
+    BOOK_WRITE_FLUSH_INTERVAL = float(os.getenv("BOOK_WRITE_FLUSH_INTERVAL", "1.0"))  # Seconds between flushes
+    BOOK_DEDUP_MAX_AGE = int(os.getenv("BOOK_DEDUP_MAX_AGE", "3600"))  # Seconds an unchanged snapshot is skipped before being re-written
     
     # RabbitMQ Configuration
     RABBITMQ_URL = os.getenv("RABBITMQ_URL", "amqp://localhost:5672")
     RABBITMQ_NOTIFICATION_QUEUE = os.getenv("RABBITMQ_NOTIFICATION_QUEUE", "notification")
     RABBITMQ_MARKETS_TOPIC = os.getenv("RABBITMQ_MARKETS_TOPIC", "markets")
+    RABBITMQ_COMMAND_PREFETCH = int(os.getenv("RABBITMQ_COMMAND_PREFETCH", "10"))  # Commands processed concurrently
+    MARKET_NOTIFICATION_FORMATS = os.getenv("MARKET_NOTIFICATION_FORMATS", "json")  # Comma list of json | msgpack | binary
+    RABBITMQ_PUBLISH_CHANNELS = int(os.getenv("RABBITMQ_PUBLISH_CHANNELS", "2"))  # Publishing channels, separate from the command consumer
+    RABBITMQ_PUBLISH_BATCH_SIZE = int(os.getenv("RABBITMQ_PUBLISH_BATCH_SIZE", "1000"))  # Flush when this many notifications are queued
+    RABBITMQ_PUBLISH_FLUSH_INTERVAL = float(os.getenv("RABBITMQ_PUBLISH_FLUSH_INTERVAL", "0.05"))  # Seconds between flushes
+    RABBITMQ_CONFIRM_WINDOW = int(os.getenv("RABBITMQ_CONFIRM_WINDOW", "256"))  # Max unconfirmed publishes in flight
+    RABBITMQ_CONFLATE_DELTAS = os.getenv("RABBITMQ_CONFLATE_DELTAS", "false").lower() == "true"  # Merge an asset's deltas within a batch
+    MARKET_SNAPSHOT_INTERVAL = int(os.getenv("MARKET_SNAPSHOT_INTERVAL", "60"))  # Seconds between published book snapshots, 0 disables
+    RABBITMQ_PUBLISH_TIMEOUT = float(os.getenv("RABBITMQ_PUBLISH_TIMEOUT", "5"))  # Seconds to wait for a confirm before using the outbox
+    OUTBOX_SIZE = int(os.getenv("OUTBOX_SIZE", "100000"))  # Notifications buffered in memory while the broker is unavailable
+    OUTBOX_POLICY = os.getenv("OUTBOX_POLICY", "drop_oldest")  # drop_oldest | keep_latest (per asset)
+    OUTBOX_SPILL_PATH = os.getenv("OUTBOX_SPILL_PATH", "")  # Append-only spill file once memory is full, empty disables
+    OUTBOX_SPILL_MAX_BYTES = int(os.getenv("OUTBOX_SPILL_MAX_BYTES", str(512 * 1024 * 1024)))  # 0 = unbounded
 
 config = Config()
\ No newline at end of file
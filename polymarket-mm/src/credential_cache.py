@@ -0,0 +1,128 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+from typing import Optional
+from py_clob_client.clob_types import ApiCreds
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+try:
+    # Installed with py-clob-client (eth-account -> eth-keyfile)
+    from Crypto.Cipher import AES
+except ImportError:
+    AES = None
+
+CACHE_VERSION = 1
+
+def _normalize_key(private_key: str) -> bytes:
+    return bytes.fromhex(private_key[2:] if private_key.startswith("0x") else private_key)
+
+class CredentialCache:
+    """L2 API credentials cached on disk per wallet and funder, AES-GCM encrypted with a key derived from the wallet key
+
+    Cached credentials are used without a validation round trip; they are only re-derived after
+    the CLOB rejects them (HTTP 401).
+    """
+
+    def __init__(self, directory: str = None):
+        self.directory = directory if directory is not None else config.CREDENTIAL_CACHE_DIR
+        self.enabled = bool(self.directory) and AES is not None
+        self._lock = threading.Lock()
+        if self.directory and AES is None:
+            logger.warning("pycryptodome not installed, API credentials won't be cached")
+
+    def path(self, address: str, funder: Optional[str]) -> str:
+        name = hashlib.sha256(f"{address.lower()}:{(funder or '').lower()}".encode()).hexdigest()[:32]
+        return os.path.join(self.directory, f"{name}.json")
+
+    @staticmethod
+    def _cipher_key(private_key: str, salt: bytes) -> bytes:
+        return hmac.new(_normalize_key(private_key), b"polymarket-api-creds" + salt, hashlib.sha256).digest()
+
+    def load(self, private_key: str, address: str, funder: Optional[str]) -> Optional[ApiCreds]:
+        """Cached credentials, None if missing or unreadable"""
+        if not self.enabled:
+            return None
+        path = self.path(address, funder)
+        try:
+            with open(path) as cache_file:
+                document = json.load(cache_file)
+            if document.get('version') != CACHE_VERSION:
+                return None
+            salt, nonce, tag, ciphertext = (base64.b64decode(document[field]) for field in ('salt', 'nonce', 'tag', 'data'))
+            cipher = AES.new(self._cipher_key(private_key, salt), AES.MODE_GCM, nonce=nonce)
+            creds = json.loads(cipher.decrypt_and_verify(ciphertext, tag))
+            return ApiCreds(api_key=creds['api_key'], api_secret=creds['api_secret'], api_passphrase=creds['api_passphrase'])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable credential cache {path}: {e}")
+            return None
+
+    def save(self, private_key: str, address: str, funder: Optional[str], creds: ApiCreds) -> bool:
+        """Encrypt and write the credentials (owner read/write only)"""
+        if not self.enabled:
+            return False
+        path = self.path(address, funder)
+        try:
+            salt = os.urandom(16)
+            cipher = AES.new(self._cipher_key(private_key, salt), AES.MODE_GCM)
+            ciphertext, tag = cipher.encrypt_and_digest(json.dumps({
+                'api_key': creds.api_key,
+                'api_secret': creds.api_secret,
+                'api_passphrase': creds.api_passphrase
+            }).encode())
+            document = {
+                'version': CACHE_VERSION,
+                'salt': base64.b64encode(salt).decode(),
+                'nonce': base64.b64encode(cipher.nonce).decode(),
+                'tag': base64.b64encode(tag).decode(),
+                'data': base64.b64encode(ciphertext).decode()
+            }
+
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            temp_path = f"{path}.tmp"
+            descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(descriptor, "w") as cache_file:
+                json.dump(document, cache_file)
+            os.replace(temp_path, path)
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to cache API credentials: {e}")
+            return False
+
+    def invalidate(self, address: str, funder: Optional[str]):
+        try:
+            os.remove(self.path(address, funder))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove cached API credentials: {e}")
+
+    def apply(self, client, private_key: str, funder: Optional[str]) -> bool:
+        """Set cached credentials on a ClobClient without contacting the server, False on a cache miss"""
+        creds = self.load(private_key, client.get_address(), funder)
+        if creds is None:
+            return False
+        client.set_api_creds(creds)
+        logger.info(f"Using cached API credentials - API Key: {creds.api_key}")
+        return True
+
+    def derive(self, client, private_key: str, funder: Optional[str]) -> ApiCreds:
+        """Create or derive credentials (signed round trip), set them on the client and cache them"""
+        with self._lock:
+            address = client.get_address()
+            self.invalidate(address, funder)
+            creds = client.create_or_derive_api_creds()
+            client.set_api_creds(creds)
+            self.save(private_key, address, funder, creds)
+            logger.info(f"Derived API credentials - API Key: {creds.api_key}")
+            return creds
+
+# Global credential cache instance
+credential_cache = CredentialCache()
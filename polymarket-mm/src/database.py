@@ -1,19 +1,57 @@
+import asyncio
 import logging
-from pymongo import MongoClient
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from pymongo import MongoClient, ReplaceOne, UpdateOne, ASCENDING, DESCENDING
 from pymongo.collection import Collection
+from pymongo.cursor import Cursor
 from pymongo.database import Database
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timezone
+from pymongo.errors import OperationFailure
+from pymongo.operations import IndexModel
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+from datetime import datetime, timedelta, timezone
 from src.config import config
 
 logger = logging.getLogger(__name__)
 
+MONITORED_MARKETS_QUERY = {
+    "monitored": True,
+    "clobRewards": {"$exists": True, "$ne": []}
+}
+
+# Only the fields needed to build subscriptions, market documents also carry the books array and Gamma metadata
+MONITORED_MARKET_PROJECTION = {
+    "_id": 1,
+    "id": 1,
+    "conditionId": 1,
+    "clobTokenIds": 1,
+    "orderPriceMinTickSize": 1,
+    "clobRewards": 1,
+    "question": 1,
+    "slug": 1
+}
+
+# Expected indexes per collection, created at connect
+MARKET_INDEXES = [
+    IndexModel([("monitored", ASCENDING), ("conditionId", ASCENDING)], name="monitored_conditionId"),
+    IndexModel([("conditionId", ASCENDING)], name="conditionId"),
+]
+
+BOOK_DATA_INDEXES = [
+    # One document per asset, the key of every book upsert
+    IndexModel([("asset_id", ASCENDING)], name="asset_id_unique", unique=True),
+]
+
+BOOK_DATA_TTL_INDEX = "timestamp_ttl"
+
 class MongoDBClient:
     def __init__(self):
         self.client: Optional[MongoClient] = None
         self.db: Optional[Database] = None
         self.markets_collection: Optional[Collection] = None
         self.book_data_collection: Optional[Collection] = None
+        self.book_history_collection: Optional[Collection] = None
         
     def connect(self) -> bool:
         """Connect to MongoDB"""
@@ -22,10 +60,14 @@ class MongoDBClient:
             self.db = self.client[config.MONGO_DB]
             self.markets_collection = self.db[config.MONGO_COLLECTION]
             self.book_data_collection = self.db[config.BOOK_DATA_COLLECTION]
+            self.book_history_collection = self.db[config.BOOK_HISTORY_COLLECTION]
             
             # Test connection
             self.client.admin.command('ping')
             logger.info(f"Connected to MongoDB: {config.MONGO_URI}")
+            
+            self.ensure_indexes()
+            self.log_index_report()
             return True
             
         except Exception as e:
@@ -38,15 +80,140 @@ class MongoDBClient:
             self.client.close()
             logger.info("Disconnected from MongoDB")
     
+    def ensure_indexes(self):
+        """Create the expected indexes and the book_data TTL index, existing ones are left as they are"""
+        for collection, indexes in ((self.markets_collection, MARKET_INDEXES),
+                                    (self.book_data_collection, BOOK_DATA_INDEXES)):
+            try:
+                collection.create_indexes(indexes)
+            except Exception as e:
+                logger.warning(f"Failed to create indexes on {collection.name}: {e}")
+        
+        self.ensure_book_data_ttl(config.BOOK_DATA_TTL_DAYS)
+        
+        if config.BOOK_HISTORY_ENABLED:
+            self.ensure_book_history_collection()
+    
+    def ensure_book_history_collection(self):
+        """Create the book history time-series collection (plain collection on servers before 5.0)"""
+        try:
+            if config.BOOK_HISTORY_COLLECTION not in self.db.list_collection_names():
+                options = {}
+                if config.BOOK_HISTORY_RETENTION_DAYS > 0:
+                    options["expireAfterSeconds"] = int(timedelta(days=config.BOOK_HISTORY_RETENTION_DAYS).total_seconds())
+                try:
+                    self.db.create_collection(
+                        config.BOOK_HISTORY_COLLECTION,
+                        timeseries={"timeField": "t", "metaField": "asset_id", "granularity": "seconds"},
+                        **options
+                    )
+                    logger.info(f"Created time-series collection {config.BOOK_HISTORY_COLLECTION}")
+                except OperationFailure as e:
+                    logger.warning(f"Time-series collections not supported, using a plain collection: {e}")
+                    self.db.create_collection(config.BOOK_HISTORY_COLLECTION)
+            
+            # Seek to the latest segment at or before a timestamp
+            self.book_history_collection.create_index(
+                [("asset_id", ASCENDING), ("t", DESCENDING)], name="asset_id_t"
+            )
+        except Exception as e:
+            logger.warning(f"Failed to ensure book history collection: {e}")
+    
+    def ensure_book_data_ttl(self, days: int):
+        """Expire book_data documents not updated for the given number of days, 0 keeps them forever"""
+        try:
+            expire_after = int(timedelta(days=days).total_seconds())
+            existing = None
+            for name, info in self.book_data_collection.index_information().items():
+                if info.get("key") == [("timestamp", ASCENDING)]:
+                    existing = (name, info)
+                    break
+            
+            if existing is None:
+                if expire_after > 0:
+                    self.book_data_collection.create_index(
+                        [("timestamp", ASCENDING)], name=BOOK_DATA_TTL_INDEX, expireAfterSeconds=expire_after
+                    )
+                    logger.info(f"Created book_data TTL index ({days} days)")
+                return
+            
+            name, info = existing
+            if "expireAfterSeconds" not in info:
+                logger.warning(f"Index {name} on book_data.timestamp has no TTL, drop it to enable expiry")
+            elif expire_after <= 0:
+                self.book_data_collection.drop_index(name)
+                logger.info("Dropped book_data TTL index")
+            elif info["expireAfterSeconds"] != expire_after:
+                self.db.command({
+                    "collMod": self.book_data_collection.name,
+                    "index": {"name": name, "expireAfterSeconds": expire_after}
+                })
+                logger.info(f"Updated book_data TTL to {days} days")
+        
+        except Exception as e:
+            logger.warning(f"Failed to ensure book_data TTL index: {e}")
+    
+    def get_collection_scans(self, collection: Collection) -> Optional[int]:
+        """Collection scans run against a collection since server start, None if not reported"""
+        try:
+            stats = next(collection.aggregate([{"$collStats": {"queryExecStats": {}}}]), {})
+            return stats.get("queryExecStats", {}).get("collectionScans", {}).get("total")
+        except Exception as e:
+            logger.debug(f"$collStats not available for {collection.name}: {e}")
+            return None
+    
+    def get_index_report(self) -> Dict[str, Dict[str, Any]]:
+        """Missing expected indexes and collection scan counts per collection"""
+        report = {}
+        for collection, indexes in ((self.markets_collection, MARKET_INDEXES),
+                                    (self.book_data_collection, BOOK_DATA_INDEXES)):
+            existing = set(collection.index_information())
+            expected = [index.document["name"] for index in indexes]
+            if collection is self.book_data_collection and config.BOOK_DATA_TTL_DAYS > 0:
+                expected.append(BOOK_DATA_TTL_INDEX)
+            report[collection.name] = {
+                'missing_indexes': [name for name in expected if name not in existing],
+                'collection_scans': self.get_collection_scans(collection)
+            }
+        
+        try:
+            status = self.db.command("serverStatus")
+            report['server'] = {
+                'collection_scans': status.get("metrics", {}).get("queryExecutor", {}).get("collectionScans", {}).get("total")
+            }
+        except Exception as e:
+            logger.debug(f"serverStatus not available: {e}")
+        
+        return report
+    
+    def log_index_report(self):
+        """Log the startup index report"""
+        try:
+            for name, entry in self.get_index_report().items():
+                missing = entry.get('missing_indexes')
+                if missing:
+                    logger.warning(f"Missing indexes on {name}: {', '.join(missing)}")
+                logger.info(f"Collection scans on {name}: {entry.get('collection_scans', 'n/a')}")
+        except Exception as e:
+            logger.warning(f"Failed to build index report: {e}")
+    
+    def find_monitored_markets(self, batch_size: int = None) -> Cursor:
+        """Cursor over monitored markets with the lean projection"""
+        return self.markets_collection.find(
+            MONITORED_MARKETS_QUERY,
+            MONITORED_MARKET_PROJECTION,
+            batch_size=batch_size or config.MONGO_BATCH_SIZE
+        )
+    
+    @staticmethod
+    def next_batch(cursor: Cursor, size: int) -> List[Dict[str, Any]]:
+        """Read up to size documents from a cursor"""
+        return list(islice(cursor, size))
+    
     def get_monitored_markets(self) -> List[Dict[str, Any]]:
         """Get all markets that are marked as monitored"""
         try:
-            query = {
-                "monitored": True,
-                "clobRewards": {"$exists": True, "$ne": []}
-            }
-            
-            markets = list(self.markets_collection.find(query))
+            markets = list(self.find_monitored_markets())
             logger.info(f"Found {len(markets)} monitored markets")
             return markets
             
@@ -56,67 +223,99 @@ class MongoDBClient:
   
     def store_book_data(self, market_id: str, asset_id: str, book_data: Dict[str, Any]) -> bool:
         """Store book data for a specific market - overwrites existing data for the same asset_id"""
+        return self.store_book_data_bulk([(market_id, asset_id, book_data)])
+    
+    def store_book_data_bulk(self, entries: List[Tuple[str, str, Dict[str, Any]]]) -> bool:
+        """Store many (market_id, asset_id, book_data) entries with one unordered bulk write per collection"""
         try:
-            current_time = datetime.now(timezone.utc)
+            if not entries:
+                return True
             
-            # Document for book_data collection
-            document = {
-                "market_id": market_id,
-                "asset_id": asset_id,
-                "timestamp": current_time,
-                "book_data": book_data,
-                "updated_at": current_time
-            }
+            current_time = datetime.now(timezone.utc)
+            book_ops = []
+            market_books: Dict[str, Dict[str, Dict[str, Any]]] = {}
             
-            # Upsert in book_data collection: update if exists, insert if not
-            result = self.book_data_collection.replace_one(
-                {"asset_id": asset_id},  # Filter by asset_id
-                document,  # Replace with new document
-                upsert=True  # Create if doesn't exist
-            )
+            for market_id, asset_id, book_data in entries:
+                # Upsert in book_data collection: update if exists, insert if not
+                book_ops.append(ReplaceOne(
+                    {"asset_id": asset_id},
+                    {
+                        "market_id": market_id,
+                        "asset_id": asset_id,
+                        "timestamp": current_time,
+                        "book_data": book_data,
+                        "updated_at": current_time
+                    },
+                    upsert=True
+                ))
+                
+                # Last write wins per asset within a market
+                market_books.setdefault(market_id, {})[asset_id] = {
+                    "asset_id": asset_id,
+                    "timestamp": current_time,
+                    "book_data": book_data,
+                    "updated_at": current_time
+                }
             
-            if result.upserted_id:
-                logger.debug(f"Inserted new book data for asset {asset_id}")
-            else:
-                logger.debug(f"Updated book data for asset {asset_id}")
-            
-            # Also update the markets collection with this book data
-            book_entry = {
-                "asset_id": asset_id,
-                "timestamp": current_time,
-                "book_data": book_data,
-                "updated_at": current_time
-            }
+            result = self.book_data_collection.bulk_write(book_ops, ordered=False)
+            logger.debug(f"Book data bulk write: {result.upserted_count} inserted, {result.modified_count} updated")
             
-            # Update markets collection: remove existing entry with same asset_id and add new one
-            markets_result = self.markets_collection.update_one(
-                {"conditionId": market_id},  # Find market by conditionId
-                {
-                    "$pull": {"books": {"asset_id": asset_id}},  # Remove existing book with same asset_id
-                },
-                upsert=False
-            )
+            # One update per market: drop the old entries of the written assets and append the new ones
+            market_ops = []
+            for market_id, books in market_books.items():
+                asset_ids = list(books.keys())
+                market_ops.append(UpdateOne(
+                    {"conditionId": market_id},
+                    [{
+                        "$set": {
+                            "books": {
+                                "$concatArrays": [
+                                    {
+                                        "$filter": {
+                                            "input": {"$ifNull": ["$books", []]},
+                                            "cond": {"$not": [{"$in": ["$$this.asset_id", {"$literal": asset_ids}]}]}
+                                        }
+                                    },
+                                    {"$literal": list(books.values())}
+                                ]
+                            }
+                        }
+                    }],
+                    upsert=False
+                ))
             
-            # Add the new book entry
-            markets_result = self.markets_collection.update_one(
-                {"conditionId": market_id},  # Find market by conditionId
-                {
-                    "$push": {"books": book_entry}  # Add new book entry
-                },
-                upsert=False
-            )
+            markets_result = self.markets_collection.bulk_write(market_ops, ordered=False)
             
-            if markets_result.modified_count > 0:
-                logger.debug(f"Updated books array in markets collection for conditionId {market_id}")
-            else:
-                logger.warning(f"No market found with conditionId {market_id} to update books array")
+            if markets_result.matched_count < len(market_ops):
+                logger.warning(f"{len(market_ops) - markets_result.matched_count} of {len(market_ops)} markets not found to update books array")
             
             return True
             
         except Exception as e:
-            logger.error(f"Error storing book data for market {market_id}: {e}")
+            logger.error(f"Error storing book data for {len(entries)} assets: {e}")
+            return False
+    
+    def store_book_history(self, segments: List[Dict[str, Any]]) -> bool:
+        """Insert closed book history segments"""
+        try:
+            if segments:
+                self.book_history_collection.insert_many(segments, ordered=False)
+            return True
+        except Exception as e:
+            logger.error(f"Error storing {len(segments)} book history segments: {e}")
             return False
     
+    def get_book_history_segment(self, asset_id: str, at: datetime) -> Optional[Dict[str, Any]]:
+        """Latest history segment of an asset starting at or before a timestamp"""
+        try:
+            return self.book_history_collection.find_one(
+                {"asset_id": asset_id, "t": {"$lte": at}},
+                sort=[("t", DESCENDING)]
+            )
+        except Exception as e:
+            logger.error(f"Error fetching book history for asset {asset_id}: {e}")
+            return None
+    
     def get_latest_book_data(self, market_id: str, asset_id: str) -> Optional[Dict[str, Any]]:
         """Get the latest book data for a specific market and asset"""
         try:
@@ -135,26 +334,64 @@ class MongoDBClient:
         except Exception as e:
             logger.error(f"Error fetching latest book data for market {market_id}: {e}")
             return None
+
+class AsyncMongoDBClient:
+    """Async facade over MongoDBClient running every call on a bounded thread pool"""
     
-    def cleanup_old_book_data(self, days_to_keep: int = 7) -> int:
-        """Clean up book data older than specified days"""
+    def __init__(self, client: MongoDBClient, max_workers: int = None):
+        self.client = client
+        self.max_workers = max_workers or config.MONGO_MAX_WORKERS
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="mongo")
+    
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+    
+    async def connect(self) -> bool:
+        """Connect to MongoDB"""
+        return await self._run(self.client.connect)
+    
+    async def disconnect(self):
+        """Disconnect from MongoDB"""
+        await self._run(self.client.disconnect)
+    
+    async def get_monitored_markets(self) -> List[Dict[str, Any]]:
+        """Get all markets that are marked as monitored"""
+        return await self._run(self.client.get_monitored_markets)
+    
+    async def iter_monitored_markets(self, batch_size: int = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream monitored markets in batches, errors are raised to the caller"""
+        batch_size = batch_size or config.MONGO_BATCH_SIZE
+        cursor = await self._run(self.client.find_monitored_markets, batch_size)
         try:
-            cutoff_date = datetime.now(timezone.utc).replace(
-                hour=0, minute=0, second=0, microsecond=0
-            )
-            cutoff_date = cutoff_date.replace(day=cutoff_date.day - days_to_keep)
-            
-            result = self.book_data_collection.delete_many({
-                "timestamp": {"$lt": cutoff_date}
-            })
-            
-            deleted_count = result.deleted_count
-            logger.info(f"Cleaned up {deleted_count} old book data records")
-            return deleted_count
-            
-        except Exception as e:
-            logger.error(f"Error cleaning up old book data: {e}")
-            return 0
+            while True:
+                batch = await self._run(self.client.next_batch, cursor, batch_size)
+                if not batch:
+                    break
+                yield batch
+        finally:
+            await self._run(cursor.close)
+    
+    async def store_book_data(self, market_id: str, asset_id: str, book_data: Dict[str, Any]) -> bool:
+        """Store book data for a specific market"""
+        return await self._run(self.client.store_book_data, market_id, asset_id, book_data)
+    
+    async def store_book_data_bulk(self, entries: List[Tuple[str, str, Dict[str, Any]]]) -> bool:
+        """Store many book data entries with bulk writes"""
+        return await self._run(self.client.store_book_data_bulk, entries)
+    
+    async def store_book_history(self, segments: List[Dict[str, Any]]) -> bool:
+        """Insert closed book history segments"""
+        return await self._run(self.client.store_book_history, segments)
+    
+    async def get_book_history_segment(self, asset_id: str, at: datetime) -> Optional[Dict[str, Any]]:
+        """Latest history segment of an asset starting at or before a timestamp"""
+        return await self._run(self.client.get_book_history_segment, asset_id, at)
+    
+    async def get_latest_book_data(self, market_id: str, asset_id: str) -> Optional[Dict[str, Any]]:
+        """Get the latest book data for a specific market and asset"""
+        return await self._run(self.client.get_latest_book_data, market_id, asset_id)
 
-# Global database instance
-db_client = MongoDBClient()
\ No newline at end of file
+# Global database instances
+db_client = MongoDBClient()
+async_db_client = AsyncMongoDBClient(db_client)
\ No newline at end of file
@@ -0,0 +1,92 @@
+from typing import Dict, List, Any, Optional
+
+class MarketEvent:
+    """Base class for market channel events"""
+    __slots__ = ('asset_id', 'market', 'timestamp', 'hash')
+    event_type = ''
+
+    def __init__(self, asset_id: Optional[str], market: Optional[str],
+                 timestamp: Optional[str], hash_value: Optional[str] = None):
+        self.asset_id = asset_id
+        self.market = market
+        self.timestamp = timestamp
+        self.hash = hash_value
+
+    def __repr__(self):
+        return f"{type(self).__name__}(asset_id={self.asset_id!r}, market={self.market!r}, timestamp={self.timestamp!r})"
+
+class BookEvent(MarketEvent):
+    """Full order book snapshot"""
+    __slots__ = ('bids', 'asks', 'tick_size')
+    event_type = 'book'
+
+    def __init__(self, asset_id, market, timestamp, hash_value, bids: List[Dict[str, Any]], asks: List[Dict[str, Any]],
+                 tick_size: Optional[str] = None):
+        MarketEvent.__init__(self, asset_id, market, timestamp, hash_value)
+        self.bids = bids
+        self.asks = asks
+        self.tick_size = tick_size
+
+    @classmethod
+    def from_dict(cls, item: Dict[str, Any]) -> 'BookEvent':
+        get = item.get
+        return cls(get('asset_id'), get('market'), get('timestamp'), get('hash'),
+                   get('bids') or [], get('asks') or [], get('tick_size'))
+
+class PriceChangeEvent(MarketEvent):
+    """Order book level changes"""
+    __slots__ = ('changes',)
+    event_type = 'price_change'
+
+    def __init__(self, asset_id, market, timestamp, hash_value, changes: List[Dict[str, Any]]):
+        MarketEvent.__init__(self, asset_id, market, timestamp, hash_value)
+        self.changes = changes
+
+    @classmethod
+    def from_dict(cls, item: Dict[str, Any]) -> 'PriceChangeEvent':
+        get = item.get
+        return cls(get('asset_id'), get('market'), get('timestamp'), get('hash'), get('changes') or [])
+
+class TickSizeChangeEvent(MarketEvent):
+    """Minimum tick size change"""
+    __slots__ = ('old_tick_size', 'new_tick_size')
+    event_type = 'tick_size_change'
+
+    def __init__(self, asset_id, market, timestamp, old_tick_size, new_tick_size):
+        MarketEvent.__init__(self, asset_id, market, timestamp)
+        self.old_tick_size = old_tick_size
+        self.new_tick_size = new_tick_size
+
+    @classmethod
+    def from_dict(cls, item: Dict[str, Any]) -> 'TickSizeChangeEvent':
+        get = item.get
+        return cls(get('asset_id'), get('market'), get('timestamp'), get('old_tick_size'), get('new_tick_size'))
+
+class LastTradePriceEvent(MarketEvent):
+    """Trade execution"""
+    __slots__ = ('price', 'side', 'size')
+    event_type = 'last_trade_price'
+
+    def __init__(self, asset_id, market, timestamp, price, side, size):
+        MarketEvent.__init__(self, asset_id, market, timestamp)
+        self.price = price
+        self.side = side
+        self.size = size
+
+    @classmethod
+    def from_dict(cls, item: Dict[str, Any]) -> 'LastTradePriceEvent':
+        get = item.get
+        return cls(get('asset_id'), get('market'), get('timestamp'), get('price'), get('side'), get('size'))
+
+# Event decoders keyed by the frame's event_type
+EVENT_TYPES = {
+    BookEvent.event_type: BookEvent.from_dict,
+    PriceChangeEvent.event_type: PriceChangeEvent.from_dict,
+    TickSizeChangeEvent.event_type: TickSizeChangeEvent.from_dict,
+    LastTradePriceEvent.event_type: LastTradePriceEvent.from_dict,
+}
+
+def decode_event(item: Dict[str, Any]) -> Optional[MarketEvent]:
+    """Build a typed event from a decoded frame item, None for unknown event types"""
+    decoder = EVENT_TYPES.get(item.get('event_type') or item.get('type'))
+    return decoder(item) if decoder else None
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+BACKPRESSURE_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+class _Entry:
+    """Queued item, marked dead when superseded by a newer conflated item"""
+    __slots__ = ('item', 'key', 'live')
+
+    def __init__(self, item: Any, key: Optional[Hashable]):
+        self.item = item
+        self.key = key
+        self.live = True
+
+class ConflatingIngestQueue:
+    """Bounded FIFO between the socket reader and the handlers with per-key conflation
+
+    Items put with a conflation key replace any still-queued item with the same key:
+    the older entry is dropped and the newer one is appended at the tail, so relative
+    ordering with the non-conflated items in between is preserved.
+    """
+
+    def __init__(self, maxsize: int = 10000, policy: str = "block", on_drop: Optional[Callable[[Any], None]] = None):
+        if policy not in BACKPRESSURE_POLICIES:
+            logger.warning(f"Unknown backpressure policy '{policy}', using block")
+            policy = "block"
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.on_drop = on_drop  # Called with every item dropped by the backpressure policy
+        self._entries: Deque[_Entry] = deque()
+        self._pending: Dict[Hashable, _Entry] = {}
+        self._size = 0  # Live entries only
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+
+        # Metrics
+        self.enqueued = 0
+        self.processed = 0
+        self.conflated = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def qsize(self) -> int:
+        return self._size
+
+    def full(self) -> bool:
+        return self.maxsize > 0 and self._size >= self.maxsize
+
+    def _dropped(self, item: Any):
+        self.dropped += 1
+        if self.on_drop:
+            self.on_drop(item)
+
+    def _drop_oldest(self):
+        while self._entries:
+            entry = self._entries.popleft()
+            if entry.live:
+                self._discard(entry)
+                self._dropped(entry.item)
+                return
+
+    def _compact(self):
+        """Drop dead entries once they outnumber the live ones, so the deque stays within 2x maxsize"""
+        if len(self._entries) > 2 * self._size:
+            self._entries = deque(entry for entry in self._entries if entry.live)
+
+    def _discard(self, entry: _Entry):
+        entry.live = False
+        self._size -= 1
+        if entry.key is not None and self._pending.get(entry.key) is entry:
+            del self._pending[entry.key]
+
+    async def put(self, item: Any, key: Optional[Hashable] = None) -> bool:
+        """Queue an item, returns False if it was dropped by the backpressure policy"""
+        if key is not None:
+            previous = self._pending.get(key)
+            if previous is not None:
+                # Superseded by the newer item, frees a slot
+                self._discard(previous)
+                self.conflated += 1
+                self._compact()
+
+        if self.full():
+            if self.policy == "drop_newest":
+                self._dropped(item)
+                return False
+            if self.policy == "drop_oldest":
+                self._drop_oldest()
+            else:
+                while self.full():
+                    self._not_full.clear()
+                    await self._not_full.wait()
+
+                # A conflatable item may have been queued while we were waiting
+                if key is not None and key in self._pending:
+                    self._discard(self._pending[key])
+                    self.conflated += 1
+                    self._compact()
+
+        entry = _Entry(item, key)
+        self._entries.append(entry)
+        if key is not None:
+            self._pending[key] = entry
+
+        self._size += 1
+        self.enqueued += 1
+        if self._size > self.max_depth:
+            self.max_depth = self._size
+        self._not_empty.set()
+        return True
+
+    async def get(self) -> Any:
+        """Wait for and return the oldest live item"""
+        while True:
+            while self._entries:
+                entry = self._entries.popleft()
+                if not entry.live:
+                    continue
+                self._discard(entry)
+                self.processed += 1
+                if not self.full():
+                    self._not_full.set()
+                return entry.item
+
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+    def clear(self):
+        """Drop all queued items"""
+        self._entries.clear()
+        self._pending.clear()
+        self._size = 0
+        self._not_full.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth and throughput counters"""
+        return {
+            'depth': self._size,
+            'max_depth': self.max_depth,
+            'maxsize': self.maxsize,
+            'policy': self.policy,
+            'enqueued': self.enqueued,
+            'processed': self.processed,
+            'conflated': self.conflated,
+            'dropped': self.dropped
+        }
@@ -1,13 +1,18 @@
 import asyncio
 import logging
-import json
 import os
+from functools import partial
 from typing import Dict, List, Set, Any, Optional
 from datetime import datetime, timezone
 from py_clob_client.client import ClobClient
 from py_clob_client.constants import POLYGON
 from py_clob_client.clob_types import BookParams
-from src.database import db_client
+from src.clob_scheduler import clob_scheduler
+from src.credential_cache import credential_cache
+from src.database import async_db_client
+from src.market_registry import market_registry
+from src.market_watcher import market_watcher
+from src.order_book import OrderBook, format_scaled
 from src.config import config
 
 logger = logging.getLogger(__name__)
@@ -19,13 +24,30 @@ class MarketMonitor:
         self.clob_client: Optional[ClobClient] = None
         self.running = False
         
-    async def initialize(self, private_key: str = None):
+    async def initialize(self, private_key: str = None, connect_db: bool = True):
         """Initialize the market monitor"""
         try:
-            # Connect to database
-            if not db_client.connect():
-                raise Exception("Failed to connect to database")
+            # Connect to database and set up the CLOB client concurrently
+            if connect_db:
+                connected, _ = await asyncio.gather(async_db_client.connect(), self.initialize_clob(private_key))
+                if not connected:
+                    raise Exception("Failed to connect to database")
+            elif not self.clob_client:
+                await self.initialize_clob(private_key)
             
+            # Load monitored markets
+            await self.refresh_monitored_markets()
+            
+            logger.info(f"MarketMonitor initialized with {len(self.monitored_markets)} markets")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to initialize MarketMonitor: {e}")
+            return False
+    
+    async def initialize_clob(self, private_key: str = None) -> bool:
+        """Create the CLOB client, using cached L2 credentials when available"""
+        try:
             # Initialize CLOB Client using the correct pattern from test_buy_order.py
             private_key = private_key or os.getenv('WALLET_PRIVATE_KEY')
             funder_address = os.getenv('POLYMARKET_FUNDER')
@@ -40,11 +62,14 @@ class MarketMonitor:
                     funder=funder_address
                 )
                 
-                # Generate and set API credentials for Level 2 auth
+                # Re-derived only when the CLOB rejects the cached credentials
+                clob_scheduler.reauthenticate = partial(credential_cache.derive, self.clob_client, private_key, funder_address)
+                
+                # Set API credentials for Level 2 auth, from the cache or a signed round trip
                 try:
-                    api_creds = self.clob_client.create_or_derive_api_creds()
-                    self.clob_client.set_api_creds(api_creds)
-                    logger.info(f"Initialized CLOB Client with Level 2 auth - API Key: {api_creds.api_key}")
+                    if not credential_cache.apply(self.clob_client, private_key, funder_address):
+                        await clob_scheduler.call("metadata", clob_scheduler.reauthenticate)
+                    logger.info("Initialized CLOB Client with Level 2 auth")
                 except Exception as e:
                     logger.warning(f"Failed to set API credentials: {e}")
                     logger.info("CLOB Client initialized with Level 1 auth only")
@@ -52,31 +77,24 @@ class MarketMonitor:
                 # Initialize without authentication for read-only access
                 self.clob_client = ClobClient(host="https://clob.polymarket.com")
                 logger.info("Initialized CLOB Client in read-only mode")
-                
-            # Load monitored markets
-            await self.refresh_monitored_markets()
-            
-            logger.info(f"MarketMonitor initialized with {len(self.monitored_markets)} markets")
             return True
             
         except Exception as e:
-            logger.error(f"Failed to initialize MarketMonitor: {e}")
+            logger.error(f"Failed to initialize CLOB client: {e}")
             return False
     
-    async def refresh_monitored_markets(self):
-        """Refresh the list of monitored markets from database"""
+    async def refresh_monitored_markets(self, reload: bool = True):
+        """Refresh the list of monitored markets from the shared market registry"""
         try:
-            markets = db_client.get_monitored_markets()
+            if reload or not market_registry.loaded:
+                await market_registry.refresh()
             new_monitored = {}
             
-            for market in markets:
-                market_id = market.get('id') or str(market.get('_id'))
+            for key, market in market_registry.markets.items():
+                market_id = market.get('id') or key
                 new_monitored[market_id] = {
                     'question': market.get('question', 'Unknown'),
-                    'outcomes': market.get('outcomes', []),
-                    'outcomePrices': market.get('outcomePrices', []),
                     'slug': market.get('slug', ''),
-                    'active': market.get('active', False),
                     'clob_rewards': market.get('clobRewards', [])
                 }
             
@@ -87,38 +105,83 @@ class MarketMonitor:
         except Exception as e:
             logger.error(f"Error refreshing monitored markets: {e}")
     
+    async def get_order_books(self, token_ids: List[str]) -> Dict[str, Any]:
+        """Fetch order book summaries with batched get_order_books calls run concurrently, keyed by token id"""
+        if not self.clob_client:
+            logger.error("CLOB client not initialized")
+            return {}
+        
+        batch_size = config.CLOB_BOOKS_BATCH_SIZE
+        batches = [token_ids[i:i + batch_size] for i in range(0, len(token_ids), batch_size)]
+        
+        # Book lane: queued behind order traffic and paced by the book endpoint bucket
+        results = await asyncio.gather(
+            *(clob_scheduler.call("book", self.clob_client.get_order_books,
+                                  [BookParams(token_id=token_id) for token_id in batch])
+              for batch in batches),
+            return_exceptions=True
+        )
+        
+        books = {}
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error fetching {len(batch)} order books: {result}")
+                continue
+            for summary in result or []:
+                books[summary.asset_id] = summary
+        
+        logger.debug(f"Fetched {len(books)}/{len(token_ids)} order books in {len(batches)} requests")
+        return books
+    
+    @staticmethod
+    def summarize_order_book(token_id: str, orderbook) -> Dict[str, Any]:
+        """Market data derived locally from a book summary instead of separate midpoint/price calls"""
+        book = OrderBook(token_id, orderbook.market, orderbook.tick_size or None)
+        book.apply_snapshot(
+            [{'price': level.price, 'size': level.size} for level in (orderbook.bids or [])],
+            [{'price': level.price, 'size': level.size} for level in (orderbook.asks or [])],
+            orderbook.hash,
+            orderbook.timestamp
+        )
+        best_bid = book.best_bid()
+        best_ask = book.best_ask()
+        tick = book.tick_size
+        
+        # Same shapes as get_midpoint ({'mid': ...}) and get_price ({'price': ...})
+        return {
+            'token_id': token_id,
+            # Half-tick precision: (bid + ask) * units / 2 at one more decimal
+            'midpoint': {'mid': format_scaled(book.mid_ticks2() * tick.units * 5, tick.decimals + 1)} if best_bid and best_ask else None,
+            # Best price on each side of the book (BUY = bids, SELL = asks)
+            'buy_price': {'price': book.to_price(best_bid[0])} if best_bid else None,
+            'sell_price': {'price': book.to_price(best_ask[0])} if best_ask else None,
+            'orderbook': orderbook,
+            'last_updated': datetime.now(timezone.utc).isoformat()
+        }
+    
+    async def get_market_data_batch(self, token_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Market data for many tokens from batched book requests"""
+        try:
+            books = await self.get_order_books(token_ids)
+        except Exception as e:
+            logger.error(f"Error getting market data for {len(token_ids)} tokens: {e}")
+            return {}
+        
+        market_data = {}
+        for token_id, orderbook in books.items():
+            try:
+                market_data[token_id] = self.summarize_order_book(token_id, orderbook)
+            except Exception as e:
+                # Malformed or off-grid book, the other tokens are still good
+                logger.error(f"Error summarizing order book for token {token_id}: {e}")
+        return market_data
+    
     async def get_market_data_from_clob(self, token_id: str) -> Optional[Dict[str, Any]]:
         """Get comprehensive market data using CLOB client methods"""
-        try:
-            if not self.clob_client:
-                logger.error("CLOB client not initialized")
-                return None
-            
-            # Get market data using the correct methods from test_buy_order.py
-            midpoint = self.clob_client.get_midpoint(token_id)
-            buy_price = self.clob_client.get_price(token_id, side="BUY")
-            sell_price = self.clob_client.get_price(token_id, side="SELL")
-            orderbook = self.clob_client.get_order_book(token_id)
-            
-            # Get detailed orderbook
-            detailed_books = self.clob_client.get_order_books([BookParams(token_id=token_id)])
-            
-            market_data = {
-                'token_id': token_id,
-                'midpoint': midpoint,
-                'buy_price': buy_price,
-                'sell_price': sell_price,
-                'orderbook': orderbook,
-                'detailed_books': detailed_books,
-                'last_updated': datetime.now(timezone.utc).isoformat()
-            }
-            
+        market_data = (await self.get_market_data_batch([token_id])).get(token_id)
+        if market_data:
             logger.debug(f"Retrieved market data for token {token_id}")
-            return market_data
-            
-        except Exception as e:
-            logger.error(f"Error getting market data for token {token_id}: {e}")
-            return None
+        return market_data
     
     def extract_asset_ids_from_market(self, market: Dict[str, Any]) -> List[str]:
         """Extract asset IDs from market data for WebSocket subscription"""
@@ -167,7 +230,7 @@ class MarketMonitor:
             
             # Create WebSocket subscription callback
             def on_book_update(message):
-                self.handle_book_update(message, market_to_assets)
+                self.handle_book_update(message)
             
             # Subscribe to market channel with asset IDs
             # Note: This is a simplified example - actual implementation may vary
@@ -185,19 +248,15 @@ class MarketMonitor:
         except Exception as e:
             logger.error(f"Error subscribing to market books: {e}")
     
-    async def handle_book_update(self, message: Dict[str, Any], market_to_assets: Dict[str, List[str]]):
+    async def handle_book_update(self, message: Dict[str, Any]):
         """Handle incoming book update from WebSocket"""
         try:
             asset_id = message.get('asset_id')
             if not asset_id:
                 return
             
-            # Find which market this asset belongs to
-            market_id = None
-            for mid, asset_list in market_to_assets.items():
-                if asset_id in asset_list:
-                    market_id = mid
-                    break
+            # Find which market (conditionId) this asset belongs to
+            market_id = market_registry.get_market_for_asset(asset_id)
             
             if not market_id:
                 logger.warning(f"Received book update for unknown asset: {asset_id}")
@@ -226,7 +285,7 @@ class MarketMonitor:
                 }
                 
                 # Store in database
-                success = db_client.store_book_data(market_id, asset_id, book_data)
+                success = await async_db_client.store_book_data(market_id, asset_id, book_data)
                 
                 if success:
                     logger.debug(f"Stored book data for market {market_id}, asset {asset_id}")
@@ -243,7 +302,9 @@ class MarketMonitor:
         while self.running:
             try:
                 await asyncio.sleep(60)  # Refresh every minute
-                await self.refresh_monitored_markets()
+                
+                # The change stream keeps the shared registry current, no need to reload it
+                await self.refresh_monitored_markets(reload=not market_watcher.active)
                 
             except asyncio.CancelledError:
                 break
@@ -283,8 +344,10 @@ class MarketMonitor:
                 # Cleanup clob client connections
                 pass
             
+            await clob_scheduler.stop()
+            
             # Disconnect from database
-            db_client.disconnect()
+            await async_db_client.disconnect()
             
             logger.info("MarketMonitor stopped")
             
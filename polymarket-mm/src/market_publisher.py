@@ -0,0 +1,319 @@
+import asyncio
+import itertools
+import logging
+import time
+from typing import Dict, List, Any, Optional, Tuple
+import aio_pika
+from aio_pika import ExchangeType
+from src.config import config
+from src.order_book import OrderBook, TickSize, order_book_manager
+from src.outbox import NotificationOutbox, OutboxMessage
+from src.rabbitmq_client import rabbitmq_client
+
+logger = logging.getLogger(__name__)
+
+def merge_changes(older: List[Dict[str, Any]], newer: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge two price_change lists, the last change of each (side, price) level wins and keeps its order"""
+    merged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for change in itertools.chain(older, newer):
+        key = ((change.get('side') or '').lower(), str(change.get('price')))
+        merged.pop(key, None)
+        merged[key] = change
+    return list(merged.values())
+
+class PendingNotification:
+    """Market notification waiting for the next flush"""
+    __slots__ = ('asset_id', 'event_type', 'data', 'tick_size')
+
+    def __init__(self, asset_id: str, event_type: str, data: Dict[str, Any], tick_size: Optional[TickSize]):
+        self.asset_id = asset_id
+        self.event_type = event_type
+        self.data = data
+        self.tick_size = tick_size
+
+class MarketPublisher:
+    """Batches market notifications and publishes them with pipelined publisher confirms on a dedicated channel pool"""
+
+    def __init__(self, pool_size: int = None, flush_interval: float = None, max_batch: int = None,
+                 confirm_window: int = None, conflate: bool = None):
+        self.pool_size = pool_size or config.RABBITMQ_PUBLISH_CHANNELS
+        self.flush_interval = flush_interval or config.RABBITMQ_PUBLISH_FLUSH_INTERVAL
+        self.max_batch = max_batch or config.RABBITMQ_PUBLISH_BATCH_SIZE
+        self.confirm_window = confirm_window or config.RABBITMQ_CONFIRM_WINDOW
+        self.conflate = config.RABBITMQ_CONFLATE_DELTAS if conflate is None else conflate
+        self.channels: List[aio_pika.Channel] = []
+        self.exchanges: List[aio_pika.Exchange] = []
+        self.pending: List[PendingNotification] = []
+        self.pending_deltas: Dict[str, PendingNotification] = {}  # asset_id -> pending price_change, when conflating
+        self.outbox = NotificationOutbox(
+            config.OUTBOX_SIZE,
+            config.OUTBOX_POLICY,
+            config.OUTBOX_SPILL_PATH,
+            config.OUTBOX_SPILL_MAX_BYTES
+        )
+        self.publish_timeout = config.RABBITMQ_PUBLISH_TIMEOUT
+        self.sequences: Dict[str, int] = {}  # asset_id -> sequence of the last published delta
+        self.epoch = int(time.time() * 1000)  # Changes on restart, sequences start over
+        self.snapshot_interval = config.MARKET_SNAPSHOT_INTERVAL
+        self._reconnect_hooked = False
+        self.running = False
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+        # Metrics
+        self.submitted = 0
+        self.conflated = 0
+        self.published = 0
+        self.failed = 0
+        self.invalid = 0
+        self.flushes = 0
+        self.snapshots = 0
+
+    async def open_channels(self) -> bool:
+        """Open the publishing channels, separate from the command consumer channel"""
+        try:
+            if not rabbitmq_client.connection:
+                logger.error("RabbitMQ connection not initialized")
+                return False
+
+            self.channels = []
+            self.exchanges = []
+            for _ in range(self.pool_size):
+                channel = await rabbitmq_client.connection.channel(publisher_confirms=True)
+                exchange = await channel.declare_exchange("polymarket", ExchangeType.TOPIC, durable=True)
+                self.channels.append(channel)
+                self.exchanges.append(exchange)
+
+            if not self._reconnect_hooked:
+                # Replay the outbox as soon as connect_robust restores the connection
+                rabbitmq_client.connection.reconnect_callbacks.add(self._on_reconnect)
+                self._reconnect_hooked = True
+
+            logger.info(f"Opened {len(self.channels)} publishing channels")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to open publishing channels: {e}")
+            return False
+
+    def _on_reconnect(self, *args):
+        logger.info(f"RabbitMQ reconnected, replaying {len(self.outbox)} buffered notifications")
+        if self._flush_requested:
+            self._flush_requested.set()
+
+    def is_available(self) -> bool:
+        connection = rabbitmq_client.connection
+        return bool(self.exchanges) and connection is not None and not connection.is_closed
+
+    def submit(self, asset_id: str, event_type: str, data: Dict[str, Any], tick_size: Optional[TickSize] = None):
+        """Queue a market notification for the next batch"""
+        self.submitted += 1
+
+        if self.conflate and event_type == "price_change":
+            pending = self.pending_deltas.get(asset_id)
+            if pending is not None:
+                pending.data = dict(data, changes=merge_changes(pending.data.get('changes', []), data.get('changes', [])))
+                pending.tick_size = tick_size or pending.tick_size
+                self.conflated += 1
+                return
+            notification = PendingNotification(asset_id, event_type, data, tick_size)
+            self.pending_deltas[asset_id] = notification
+        else:
+            notification = PendingNotification(asset_id, event_type, data, tick_size)
+
+        self.pending.append(notification)
+        if len(self.pending) >= self.max_batch and self._flush_requested:
+            self._flush_requested.set()
+
+    def submit_snapshot(self, book: OrderBook):
+        """Queue a full snapshot of an in-memory book, stamped with the sequence of the last delta before it"""
+        # Later deltas must not be merged into a delta queued ahead of the snapshot
+        self.pending_deltas.pop(book.asset_id, None)
+        ladder = book.ladder()
+        self.submit(book.asset_id, "book_snapshot", {
+            "market": book.market,
+            "bids": ladder['bids'],
+            "asks": ladder['asks'],
+            "timestamp": book.timestamp,
+            "hash": book.hash
+        }, book.tick_size)
+        self.snapshots += 1
+
+    def submit_snapshots(self, asset_ids: Optional[List[str]] = None) -> int:
+        """Queue snapshots for the given assets (all books when None), returns how many were queued"""
+        books = order_book_manager.books
+        targets = list(books) if asset_ids is None else [asset_id for asset_id in asset_ids if asset_id in books]
+        for asset_id in targets:
+            self.submit_snapshot(books[asset_id])
+        return len(targets)
+
+    def _encode(self, notification: PendingNotification) -> List[OutboxMessage]:
+        """Stamp and encode a notification, its sequence is only used up once it encodes"""
+        # Per-asset sequence: deltas increment it, snapshots carry the last delta's sequence
+        asset_id = notification.asset_id
+        seq = self.sequences.get(asset_id, 0)
+        if notification.event_type == "price_change":
+            seq += 1
+        data = dict(notification.data, seq=seq, epoch=self.epoch)
+        messages = [
+            (routing_key, body, content_type, asset_id)
+            for routing_key, body, content_type in rabbitmq_client.encode_market_notification(
+                asset_id, notification.event_type, data, notification.tick_size
+            )
+        ]
+        self.sequences[asset_id] = seq
+        return messages
+
+    async def _publish(self, semaphore: asyncio.Semaphore, message: OutboxMessage) -> bool:
+        routing_key, body, content_type, asset_id = message
+        async with semaphore:
+            # One channel per asset keeps its sequence numbers in order on the wire
+            exchange = self.exchanges[hash(asset_id) % len(self.exchanges)]
+            try:
+                # Resolves once the broker confirms the message
+                await exchange.publish(
+                    rabbitmq_client.build_message(body, content_type),
+                    routing_key=routing_key,
+                    timeout=self.publish_timeout
+                )
+                return True
+            except Exception as e:
+                logger.debug(f"Publish to {routing_key} failed: {e}")
+                return False
+
+    async def _publish_all(self, messages: List[OutboxMessage]) -> List[OutboxMessage]:
+        """Publish with up to confirm_window confirms in flight, returns the unconfirmed messages in order"""
+        semaphore = asyncio.Semaphore(self.confirm_window)
+        results = await asyncio.gather(*(self._publish(semaphore, message) for message in messages))
+        failed = [message for message, confirmed in zip(messages, results) if not confirmed]
+        self.published += len(messages) - len(failed)
+        return failed
+
+    async def _replay_outbox(self) -> bool:
+        """Publish buffered messages oldest first, False if the broker is still not accepting them"""
+        while not self.outbox.is_empty():
+            messages = self.outbox.take(self.max_batch)
+            failed = await self._publish_all(messages)
+            if failed:
+                # Keep order: everything from the first failure onwards goes back
+                first = messages.index(failed[0])
+                self.outbox.requeue(messages[first:])
+                return False
+        return True
+
+    async def flush(self) -> bool:
+        """Encode and publish the pending batch, keeping up to confirm_window publishes in flight"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            if not self.pending and self.outbox.is_empty():
+                return True
+
+            batch = self.pending
+            self.pending = []
+            self.pending_deltas = {}
+
+            messages = []
+            for notification in batch:
+                try:
+                    messages.extend(self._encode(notification))
+                except Exception as e:
+                    # One bad notification must not take the rest of the batch with it
+                    self.invalid += 1
+                    logger.error(f"Dropped {notification.event_type} notification for {notification.asset_id}, encoding failed: {e}")
+
+            if not self.exchanges and rabbitmq_client.connection and not rabbitmq_client.connection.is_closed:
+                await self.open_channels()
+
+            # Broker down or still replaying: new messages queue behind the outbox
+            if not self.is_available() or not await self._replay_outbox():
+                for message in messages:
+                    self.outbox.add(message)
+                return False
+
+            failed = await self._publish_all(messages)
+            self.flushes += 1
+
+            if failed:
+                self.failed += len(failed)
+                # Keep per-asset order: everything from an asset's first failure onwards goes back
+                failed_ids = {id(message) for message in failed}
+                retrying, retry = set(), []
+                for message in messages:
+                    if message[3] in retrying or id(message) in failed_ids:
+                        retrying.add(message[3])
+                        retry.append(message)
+                for message in retry:
+                    self.outbox.add(message)
+                logger.warning(f"{len(failed)} of {len(messages)} market notifications not confirmed, kept {len(retry)} in outbox")
+            return not failed
+
+    async def run(self):
+        """Flush on size or time trigger until stopped"""
+        self.running = True
+        self._flush_requested = asyncio.Event()
+        await self.open_channels()
+
+        while self.running:
+            try:
+                try:
+                    await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._flush_requested.clear()
+                await self.flush()
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in market publisher loop: {e}")
+
+    async def snapshot_loop(self):
+        """Publish snapshots of every book periodically so late or lossy consumers converge"""
+        if self.snapshot_interval <= 0:
+            return
+
+        while True:
+            try:
+                await asyncio.sleep(self.snapshot_interval)
+                count = self.submit_snapshots()
+                logger.debug(f"Queued {count} periodic book snapshots")
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in snapshot loop: {e}")
+
+    async def stop(self):
+        """Publish what is left and close the channels"""
+        self.running = False
+        if self._flush_requested:
+            self._flush_requested.set()
+        await self.flush()
+
+        if len(self.outbox):
+            logger.warning(f"Stopping with {len(self.outbox)} unpublished notifications in memory")
+
+        for channel in self.channels:
+            try:
+                await channel.close()
+            except Exception:
+                pass
+        self.channels = []
+        self.exchanges = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'pending': len(self.pending),
+            'submitted': self.submitted,
+            'conflated': self.conflated,
+            'published': self.published,
+            'failed': self.failed,
+            'invalid': self.invalid,
+            'flushes': self.flushes,
+            'snapshots': self.snapshots,
+            'outbox': self.outbox.get_stats()
+        }
+
+# Global market publisher instance
+market_publisher = MarketPublisher()
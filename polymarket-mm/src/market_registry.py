@@ -0,0 +1,188 @@
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional, Set, Tuple
+from src import codec
+from src.database import async_db_client
+
+logger = logging.getLogger(__name__)
+
+class MarketRegistry:
+    """In-process cache of monitored markets with asset <-> market hash indexes"""
+
+    def __init__(self):
+        self.markets: Dict[str, Dict[str, Any]] = {}  # conditionId -> market summary
+        self.market_assets: Dict[str, List[str]] = {}  # conditionId -> asset ids
+        self.asset_to_market: Dict[str, str] = {}  # asset_id -> conditionId
+        self.doc_ids: Dict[Any, str] = {}  # Mongo _id -> conditionId
+        self.raw_token_ids: Dict[str, Any] = {}  # conditionId -> raw clobTokenIds, skips re-parsing unchanged values
+        self.loaded = False
+        self.last_refresh: Optional[datetime] = None
+
+    @staticmethod
+    def market_key(market: Dict[str, Any]) -> Optional[str]:
+        """Markets are keyed by conditionId, the id used by book events"""
+        return market.get('conditionId') or market.get('id')
+
+    @staticmethod
+    def parse_token_ids(market: Dict[str, Any]) -> List[str]:
+        """Extract token IDs from the clobTokenIds JSON string array"""
+        raw = market.get('clobTokenIds')
+        if not raw:
+            logger.warning(f"No clobTokenIds found for market {market.get('id', 'unknown')}")
+            return []
+
+        try:
+            token_ids = codec.loads(raw) if isinstance(raw, (str, bytes)) else raw
+        except codec.DecodeError as e:
+            logger.error(f"Failed to parse clobTokenIds for market {market.get('id', 'unknown')}: {e}")
+            return []
+
+        if not isinstance(token_ids, list):
+            logger.warning(f"clobTokenIds is not a list for market {market.get('id', 'unknown')}: {token_ids}")
+            return []
+
+        # Each market has 2 token IDs for Yes and No outcomes
+        return [str(token_id) for token_id in token_ids if token_id]
+
+    def upsert_market(self, market: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+        """Add or update a market, returns the (added, removed) asset ids"""
+        key = self.market_key(market)
+        if not key:
+            return [], []
+
+        if market.get('_id') is not None:
+            self.doc_ids[market['_id']] = key
+
+        self.markets[key] = {
+            'id': market.get('id'),
+            'conditionId': market.get('conditionId'),
+            'question': market.get('question', 'Unknown'),
+            'slug': market.get('slug', ''),
+            'clobRewards': market.get('clobRewards', []),
+            'orderPriceMinTickSize': market.get('orderPriceMinTickSize')
+        }
+
+        raw = market.get('clobTokenIds')
+        if key in self.raw_token_ids and self.raw_token_ids[key] == raw:
+            return [], []
+
+        self.raw_token_ids[key] = raw
+        old_assets = self.market_assets.get(key, [])
+        new_assets = self.parse_token_ids(market)
+        self.market_assets[key] = new_assets
+
+        new_set = set(new_assets)
+        removed = [asset_id for asset_id in old_assets if asset_id not in new_set]
+        for asset_id in removed:
+            if self.asset_to_market.get(asset_id) == key:
+                del self.asset_to_market[asset_id]
+
+        added = []
+        for asset_id in new_assets:
+            if asset_id not in self.asset_to_market:
+                added.append(asset_id)
+            self.asset_to_market[asset_id] = key
+
+        return added, removed
+
+    def remove_market(self, key: str) -> List[str]:
+        """Remove a market, returns the asset ids it owned"""
+        self.markets.pop(key, None)
+        self.raw_token_ids.pop(key, None)
+        removed = []
+        for asset_id in self.market_assets.pop(key, []):
+            if self.asset_to_market.get(asset_id) == key:
+                del self.asset_to_market[asset_id]
+                removed.append(asset_id)
+        return removed
+
+    @staticmethod
+    def is_monitored(market: Dict[str, Any]) -> bool:
+        """Same criteria as MongoDBClient.get_monitored_markets"""
+        return market.get('monitored') is True and bool(market.get('clobRewards'))
+
+    def apply_document(self, market: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+        """Apply a single changed market document, returns the (added, removed) asset ids"""
+        if self.is_monitored(market):
+            return self.upsert_market(market)
+
+        key = self.market_key(market) or self.doc_ids.get(market.get('_id'))
+        self.doc_ids.pop(market.get('_id'), None)
+        return [], self.remove_market(key) if key in self.markets else []
+
+    def remove_document(self, doc_id: Any) -> List[str]:
+        """Remove the market stored under a Mongo _id, returns the asset ids it owned"""
+        key = self.doc_ids.pop(doc_id, None)
+        return self.remove_market(key) if key else []
+
+    def _upsert_seen(self, markets: List[Dict[str, Any]], seen: Set[str]):
+        for market in markets:
+            key = self.market_key(market)
+            if key:
+                seen.add(key)
+                self.upsert_market(market)
+
+    def _prune(self, seen: Set[str]):
+        """Remove markets missing from a complete reload"""
+        for key in [key for key in self.markets if key not in seen]:
+            self.remove_market(key)
+        self.doc_ids = {doc_id: key for doc_id, key in self.doc_ids.items() if key in self.markets}
+
+    def apply_markets(self, markets: List[Dict[str, Any]]) -> Tuple[Set[str], Set[str]]:
+        """Replace the registry contents with a full monitored market list, returns (added, removed) assets"""
+        before = set(self.asset_to_market)
+        seen: Set[str] = set()
+        self._upsert_seen(markets, seen)
+        self._prune(seen)
+        after = set(self.asset_to_market)
+        return after - before, before - after
+
+    async def refresh(self) -> Tuple[Set[str], Set[str]]:
+        """Reload monitored markets from the database, returns (added, removed) assets"""
+        before = set(self.asset_to_market)
+        seen: Set[str] = set()
+
+        try:
+            async for batch in async_db_client.iter_monitored_markets():
+                self._upsert_seen(batch, seen)
+            self._prune(seen)
+        except Exception as e:
+            # Keep the current set rather than dropping every market on a failed read
+            logger.error(f"Error refreshing market registry: {e}")
+
+        after = set(self.asset_to_market)
+        added, removed = after - before, before - after
+        self.loaded = True
+        self.last_refresh = datetime.now(timezone.utc)
+
+        if added or removed:
+            logger.info(f"Market registry refreshed: {len(self.markets)} markets, {len(self.asset_to_market)} assets "
+                        f"(+{len(added)}/-{len(removed)})")
+        return added, removed
+
+    def asset_ids(self) -> List[str]:
+        return list(self.asset_to_market)
+
+    def asset_count(self) -> int:
+        return len(self.asset_to_market)
+
+    def get_market_for_asset(self, asset_id: str) -> Optional[str]:
+        """conditionId of the market owning an asset"""
+        return self.asset_to_market.get(asset_id)
+
+    def get_tick_size(self, asset_id: str) -> Optional[Any]:
+        """orderPriceMinTickSize of the market owning an asset"""
+        market = self.markets.get(self.asset_to_market.get(asset_id))
+        return market.get('orderPriceMinTickSize') if market else None
+
+    def get_assets_for_market(self, key: str) -> List[str]:
+        return self.market_assets.get(key, [])
+
+    def get_market(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.markets.get(key)
+
+    def __len__(self):
+        return len(self.markets)
+
+# Global market registry instance
+market_registry = MarketRegistry()
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List
+from pymongo.errors import OperationFailure, PyMongoError
+from src.database import db_client
+from src.market_registry import market_registry
+
+logger = logging.getLogger(__name__)
+
+# Raised by servers that don't support change streams (standalone mongod)
+CHANGE_STREAM_UNSUPPORTED_CODES = (40573, 40324)
+
+WATCHED_FIELDS = ("monitored", "clobRewards", "clobTokenIds")
+
+def build_pipeline() -> List[Dict[str, Any]]:
+    """Only pass changes that can alter the monitored asset set"""
+    updated = [{f"updateDescription.updatedFields.{field}": {"$exists": True}} for field in WATCHED_FIELDS]
+    return [{
+        "$match": {
+            "$or": [
+                {"operationType": "insert", "fullDocument.monitored": True},
+                {"operationType": "replace"},
+                {"operationType": "update", "$or": updated + [
+                    {"updateDescription.removedFields": {"$in": list(WATCHED_FIELDS)}}
+                ]},
+                {"operationType": "delete"}
+            ]
+        }
+    }]
+
+class MarketChangeWatcher:
+    """Pushes monitored market set changes from a Mongo change stream into the subscription manager"""
+
+    def __init__(self):
+        self.active = False  # True while the change stream is open, polling can back off
+        self.running = False
+        self.resume_token = None
+        self.stream = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="market-watch")
+        self.changes_applied = 0
+
+    async def _call(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    def _open_stream(self):
+        return db_client.markets_collection.watch(
+            build_pipeline(),
+            full_document="updateLookup",
+            resume_after=self.resume_token,
+            max_await_time_ms=1000
+        )
+
+    def _close_stream(self):
+        if self.stream:
+            try:
+                self.stream.close()
+            except PyMongoError:
+                pass
+            self.stream = None
+
+    def apply_change(self, change: Dict[str, Any]):
+        """Apply one change event to the registry, returns (added, removed) asset ids"""
+        operation = change.get("operationType")
+        doc_id = change.get("documentKey", {}).get("_id")
+
+        if operation == "delete":
+            return [], market_registry.remove_document(doc_id)
+
+        document = change.get("fullDocument")
+        if document is None:
+            # Deleted before the update could be looked up
+            return [], market_registry.remove_document(doc_id)
+
+        return market_registry.apply_document(document)
+
+    async def run(self, on_change: Callable[[], Awaitable[Any]], retry_delay: int = 5):
+        """Watch the markets collection and call on_change whenever the asset set changes"""
+        self.running = True
+
+        while self.running:
+            try:
+                self.stream = await self._call(self._open_stream)
+                if not self.active:
+                    logger.info("Watching markets collection change stream")
+                self.active = True
+
+                # Catch anything that changed between the last full load and the stream opening
+                if self.resume_token is None:
+                    added, removed = await market_registry.refresh()
+                    if added or removed:
+                        await on_change()
+
+                while self.running:
+                    change = await self._call(self.stream.try_next)
+                    self.resume_token = self.stream.resume_token
+
+                    if change is None:
+                        continue
+
+                    added, removed = self.apply_change(change)
+                    if added or removed:
+                        self.changes_applied += 1
+                        logger.info(f"Market change stream: +{len(added)}/-{len(removed)} assets")
+                        await on_change()
+
+            except asyncio.CancelledError:
+                break
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAM_UNSUPPORTED_CODES:
+                    logger.info("Change streams not supported by this MongoDB deployment, using polling")
+                    self.running = False
+                    break
+                logger.error(f"Market change stream failed: {e}")
+                # Resume token may be too old to resume from
+                self.resume_token = None
+            except Exception as e:
+                logger.error(f"Error in market change stream: {e}")
+            finally:
+                self.active = False
+                await self._call(self._close_stream)
+
+            if self.running:
+                await asyncio.sleep(retry_delay)
+
+    async def stop(self):
+        self.running = False
+        self.active = False
+
+# Global market watcher instance
+market_watcher = MarketChangeWatcher()
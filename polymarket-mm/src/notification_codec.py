@@ -0,0 +1,106 @@
+import logging
+import struct
+from typing import Dict, List, Any, Optional
+from src import codec
+from src.config import config
+from src.order_book import TickSize, BID_SIDES, ASK_SIDES, SIZE_DECIMALS, parse_scaled
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+CONTENT_TYPES = {
+    "json": "application/json",
+    "msgpack": "application/msgpack",
+    "binary": "application/x-polymarket-book-delta"
+}
+
+# Binary layout (little endian):
+#   header: version u8, event u8, tick decimals u8, tick units u32, timestamp ms i64, sequence u64,
+#           epoch u64, level count u32, asset id length u16
+#   asset id: ascii bytes
+#   level: side u8 (0 bid, 1 ask), price ticks i32, size units u64 (10^-6 shares)
+# price_change levels are the changed levels, book_snapshot levels are the full ladder
+BINARY_VERSION = 3
+HEADER = struct.Struct("<BBBIqQQIH")
+LEVEL = struct.Struct("<BiQ")
+
+BINARY_EVENTS = {"price_change": 1, "book_snapshot": 2}
+BINARY_EVENT_NAMES = {code: name for name, code in BINARY_EVENTS.items()}
+
+def select_formats(requested: str) -> List[str]:
+    """Parse the configured format list, dropping unknown or unavailable formats"""
+    formats = []
+    for name in (part.strip().lower() for part in requested.split(",")):
+        if not name or name in formats:
+            continue
+        if name not in CONTENT_TYPES:
+            logger.warning(f"Unknown market notification format '{name}'")
+        elif name == "msgpack" and msgpack is None:
+            logger.warning("msgpack not installed, market notifications won't be published as msgpack")
+        else:
+            formats.append(name)
+    return formats or ["json"]
+
+def encode_binary(notification: Dict[str, Any], tick_size: Optional[TickSize] = None) -> Optional[bytes]:
+    """Fixed layout for price_change and book_snapshot notifications, None for other event types"""
+    event = BINARY_EVENTS.get(notification.get("event_type"))
+    if event is None:
+        return None
+
+    data = notification.get("data", {})
+    asset = notification["asset_id"].encode()
+
+    if event == BINARY_EVENTS["book_snapshot"]:
+        entries = [(0, level) for level in data.get("bids", [])] + [(1, level) for level in data.get("asks", [])]
+    else:
+        entries = []
+        for change in data.get("changes", []):
+            side = (change.get("side") or "").lower()
+            if side in BID_SIDES:
+                entries.append((0, change))
+            elif side in ASK_SIDES:
+                entries.append((1, change))
+
+    # Prices finer than the book's tick (or without a book) widen the tick, never rounded
+    tick = tick_size or TickSize(config.DEFAULT_TICK_SIZE)
+    for _, level in entries:
+        tick = tick.refine(level["price"])
+
+    levels = [LEVEL.pack(side, tick.to_ticks(level["price"]), parse_scaled(level["size"], SIZE_DECIMALS))
+              for side, level in entries]
+    timestamp = int(data.get("timestamp") or 0)
+    header = HEADER.pack(BINARY_VERSION, event, tick.decimals, tick.units, timestamp,
+                         data.get("seq", 0), data.get("epoch", 0), len(levels), len(asset))
+    return b"".join([header, asset] + levels)
+
+def decode_binary(body: bytes) -> Dict[str, Any]:
+    """Decode a binary notification (for consumers and debugging)"""
+    version, event, decimals, units, timestamp, seq, epoch, count, asset_length = HEADER.unpack_from(body)
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary notification version {version}")
+    offset = HEADER.size
+    asset_id = body[offset:offset + asset_length].decode()
+    offset += asset_length
+    levels = [LEVEL.unpack_from(body, offset + i * LEVEL.size) for i in range(count)]
+    return {
+        "asset_id": asset_id,
+        "event_type": BINARY_EVENT_NAMES.get(event),
+        "tick_decimals": decimals,
+        "tick_units": units,
+        "timestamp": timestamp,
+        "seq": seq,
+        "epoch": epoch,
+        "levels": levels  # (side, price ticks, size units)
+    }
+
+def encode(fmt: str, notification: Dict[str, Any], tick_size: Optional[TickSize] = None) -> Optional[bytes]:
+    """Encode a market notification in the given format, None if the format doesn't cover it"""
+    if fmt == "binary":
+        return encode_binary(notification, tick_size)
+    if fmt == "msgpack":
+        return msgpack.packb(notification, use_bin_type=True)
+    return codec.dumps(notification)
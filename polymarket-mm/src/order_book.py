@@ -0,0 +1,421 @@
+import logging
+from bisect import bisect_left, insort
+from decimal import Decimal
+from typing import Dict, List, Any, Optional, Tuple
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+BID_SIDES = ('buy', 'bid')
+ASK_SIDES = ('sell', 'ask')
+
+# Sizes are kept as integer units of 10^-6 shares (conditional token precision)
+SIZE_DECIMALS = 6
+SIZE_SCALE = 10 ** SIZE_DECIMALS
+
+def _plain(value) -> str:
+    """Decimal string of a price/size without exponent notation (floats via repr, e.g. 0.001 from Gamma)"""
+    text = value if isinstance(value, str) else repr(value)
+    if 'e' in text or 'E' in text:
+        text = format(Decimal(text), 'f')
+    return text
+
+def decimals_of(value) -> int:
+    """Number of significant decimal places of a price or size"""
+    if isinstance(value, int):
+        return 0
+    return len(_plain(value).partition('.')[2].rstrip('0'))
+
+def parse_scaled(value, decimals: int) -> int:
+    """Parse a decimal value into an integer scaled by 10^decimals without going through float
+
+    Raises ValueError rather than dropping digits when the value has more than `decimals` decimals.
+    """
+    if isinstance(value, int):
+        return value * 10 ** decimals
+    text = _plain(value)
+    whole, _, fraction = text.partition('.')
+    if (whole.isdigit() or not whole) and (fraction.isdigit() or not fraction) and (whole or fraction):
+        if fraction[decimals:].strip('0'):
+            raise ValueError(f"{text} has more than {decimals} decimals")
+        fraction = (fraction + '0' * decimals)[:decimals]
+        return int(whole or '0') * 10 ** decimals + int(fraction or '0')
+    # Signs and other unusual formats
+    scaled = Decimal(text).scaleb(decimals)
+    if scaled != scaled.to_integral_value():
+        raise ValueError(f"{text} has more than {decimals} decimals")
+    return int(scaled)
+
+def format_scaled(value: int, decimals: int) -> str:
+    """Format an integer scaled by 10^decimals as a plain decimal string"""
+    if not decimals:
+        return str(value)
+    whole, fraction = divmod(value, 10 ** decimals)
+    fraction_str = f"{fraction:0{decimals}d}".rstrip('0')
+    return f"{whole}.{fraction_str}" if fraction_str else str(whole)
+
+class TickSize:
+    """Tick size as an integer number of units at 10^-decimals (0.01 -> 1 unit at 2 decimals)"""
+    __slots__ = ('decimals', 'units', 'scale')
+
+    def __init__(self, tick_size):
+        if isinstance(tick_size, TickSize):
+            tick_size = str(tick_size)
+        self.decimals = decimals_of(tick_size)
+        self.units = parse_scaled(tick_size, self.decimals)
+        self.scale = 10 ** self.decimals
+        if self.units <= 0:
+            raise ValueError(f"Invalid tick size: {tick_size}")
+
+    def units_at(self, decimals: int) -> int:
+        """Tick size as integer units at 10^-decimals (decimals >= self.decimals)"""
+        return self.units * 10 ** (decimals - self.decimals)
+
+    def fits(self, price) -> bool:
+        """True if the price lies on this tick grid"""
+        decimals = max(self.decimals, decimals_of(price))
+        return parse_scaled(price, decimals) % self.units_at(decimals) == 0
+
+    def refine(self, price) -> 'TickSize':
+        """Tick at the price's precision (0.01 + "0.955" -> 0.001), self if the price is already on the grid"""
+        if self.fits(price):
+            return self
+        return TickSize(format_scaled(1, max(self.decimals, decimals_of(price))))
+
+    def same_as(self, other: 'TickSize') -> bool:
+        return self.units * other.scale == other.units * self.scale
+
+    def to_ticks(self, price) -> int:
+        """Price to integer ticks, ValueError if the price is not on the tick grid"""
+        ticks, remainder = divmod(parse_scaled(price, self.decimals), self.units)
+        if remainder:
+            raise ValueError(f"Price {price} is not a multiple of tick size {self}")
+        return ticks
+
+    def to_price(self, ticks: int) -> str:
+        """Integer ticks back to a price string"""
+        return format_scaled(ticks * self.units, self.decimals)
+
+    def __str__(self):
+        return format_scaled(self.units, self.decimals)
+
+class BookSide:
+    """One side of an L2 book: tick -> size units map plus a sorted tick index"""
+    __slots__ = ('levels', 'prices', 'descending')
+
+    def __init__(self, descending: bool):
+        self.levels: Dict[int, int] = {}
+        self.prices: List[int] = []  # Always ascending, best level depends on side
+        self.descending = descending
+
+    def clear(self):
+        self.levels.clear()
+        self.prices.clear()
+
+    def load(self, levels: List[Tuple[int, int]]):
+        """Replace all levels with a snapshot"""
+        self.levels = {price: size for price, size in levels if size > 0}
+        self.prices = sorted(self.levels)
+
+    def update(self, price: int, size: int):
+        """Set the size at a price level, removing the level when size is zero"""
+        if size > 0:
+            if price not in self.levels:
+                insort(self.prices, price)
+            self.levels[price] = size
+        elif price in self.levels:
+            del self.levels[price]
+            index = bisect_left(self.prices, price)
+            del self.prices[index]
+
+    def rescale(self, old: TickSize, new: TickSize):
+        """Convert all levels from one tick size to another, every level must lie on the new grid"""
+        decimals = max(old.decimals, new.decimals)
+        old_units = old.units_at(decimals)
+        new_units = new.units_at(decimals)
+        levels: Dict[int, int] = {}
+        for price, size in self.levels.items():
+            tick, remainder = divmod(price * old_units, new_units)
+            if remainder:
+                raise ValueError(f"Level {price} x {old} is not on the {new} grid")
+            levels[tick] = size
+        self.levels = levels
+        self.prices = sorted(levels)
+
+    def off_grid(self, old: TickSize, new: TickSize) -> bool:
+        """True if any level would not lie on the new tick grid"""
+        decimals = max(old.decimals, new.decimals)
+        old_units = old.units_at(decimals)
+        new_units = new.units_at(decimals)
+        return any(price * old_units % new_units for price in self.prices)
+
+    def best(self) -> Optional[Tuple[int, int]]:
+        """Best price level as (ticks, size units)"""
+        if not self.prices:
+            return None
+        price = self.prices[-1] if self.descending else self.prices[0]
+        return price, self.levels[price]
+
+    def top(self, depth: int) -> List[Tuple[int, int]]:
+        """Best `depth` levels ordered from the top of book outwards"""
+        if self.descending:
+            prices = self.prices[:-depth - 1:-1] if depth > 0 else []
+        else:
+            prices = self.prices[:depth]
+        return [(price, self.levels[price]) for price in prices]
+
+    def ladder(self) -> List[Tuple[int, int]]:
+        """All levels ordered from the top of book outwards"""
+        prices = reversed(self.prices) if self.descending else self.prices
+        return [(price, self.levels[price]) for price in prices]
+
+    def size(self, depth: int) -> int:
+        """Total size units in the best `depth` levels"""
+        return sum(size for _, size in self.top(depth))
+
+    def notional(self, depth: int) -> int:
+        """Sum of ticks x size units over the best `depth` levels"""
+        return sum(price * size for price, size in self.top(depth))
+
+    def __len__(self):
+        return len(self.prices)
+
+class OrderBook:
+    """In-memory L2 order book for a single asset, prices in integer ticks and sizes in integer units"""
+    __slots__ = ('asset_id', 'market', 'tick_size', 'bids', 'asks', 'hash', 'timestamp')
+
+    def __init__(self, asset_id: str, market: Optional[str] = None, tick_size=None):
+        self.asset_id = asset_id
+        self.market = market
+        self.tick_size = TickSize(tick_size or config.DEFAULT_TICK_SIZE)
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.hash: Optional[str] = None
+        self.timestamp: Optional[str] = None
+
+    def _rescale(self, new: TickSize):
+        self.bids.rescale(self.tick_size, new)
+        self.asks.rescale(self.tick_size, new)
+        self.tick_size = new
+
+    def fit_tick_size(self, prices) -> bool:
+        """Refine the tick size so every price lies on the grid (prices finer than the known tick), True if it changed"""
+        tick = self.tick_size
+        for price in prices:
+            tick = tick.refine(price)
+        if tick is self.tick_size:
+            return False
+        logger.info(f"Tick size for asset {self.asset_id} refined from {self.tick_size} to {tick} by price precision")
+        self._rescale(tick)
+        return True
+
+    def _parse_levels(self, levels: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+        to_ticks = self.tick_size.to_ticks
+        return [(to_ticks(level['price']), parse_scaled(level['size'], SIZE_DECIMALS)) for level in levels]
+
+    def apply_snapshot(self, bids: List[Dict[str, Any]], asks: List[Dict[str, Any]],
+                       hash_value: Optional[str] = None, timestamp: Optional[str] = None):
+        """Replace the book with a full `book` snapshot"""
+        self.fit_tick_size([level['price'] for level in bids] + [level['price'] for level in asks])
+        self.bids.load(self._parse_levels(bids))
+        self.asks.load(self._parse_levels(asks))
+        self.hash = hash_value
+        self.timestamp = timestamp
+
+    def apply_change(self, side: str, price, size) -> bool:
+        """Apply a single price level change, returns False for an unknown side"""
+        side = side.lower()
+        if side in BID_SIDES:
+            book_side = self.bids
+        elif side in ASK_SIDES:
+            book_side = self.asks
+        else:
+            return False
+        self.fit_tick_size([price])
+        book_side.update(self.tick_size.to_ticks(price), parse_scaled(size, SIZE_DECIMALS))
+        return True
+
+    def apply_changes(self, changes: List[Dict[str, Any]], hash_value: Optional[str] = None,
+                      timestamp: Optional[str] = None) -> int:
+        """Apply a `price_change` changes list, returns the number of applied levels"""
+        applied = 0
+        for change in changes:
+            side = change.get('side')
+            price = change.get('price')
+            size = change.get('size')
+            if side and price is not None and size is not None and self.apply_change(side, price, size):
+                applied += 1
+        if hash_value is not None:
+            self.hash = hash_value
+        if timestamp is not None:
+            self.timestamp = timestamp
+        return applied
+
+    def set_tick_size(self, tick_size):
+        """Switch to a new tick size, rescaling existing levels
+
+        Levels that are not on the new grid are never merged: the tick is refined until they fit.
+        """
+        new = TickSize(tick_size)
+        old = self.tick_size
+        if new.same_as(old):
+            return
+        if self.bids.off_grid(old, new) or self.asks.off_grid(old, new):
+            new = new.refine(str(old))
+            if new.same_as(old):
+                return
+        self._rescale(new)
+
+    def best_bid(self) -> Optional[Tuple[int, int]]:
+        return self.bids.best()
+
+    def best_ask(self) -> Optional[Tuple[int, int]]:
+        return self.asks.best()
+
+    def spread_ticks(self) -> Optional[int]:
+        """Best ask minus best bid in ticks, None if either side is empty"""
+        bid = self.bids.best()
+        ask = self.asks.best()
+        if bid is None or ask is None:
+            return None
+        return ask[0] - bid[0]
+
+    def mid_ticks2(self) -> int:
+        """Twice the mid price in ticks (exact), falling back to the only populated side"""
+        bid = self.bids.best()
+        ask = self.asks.best()
+        if bid and ask:
+            return bid[0] + ask[0]
+        if bid:
+            return 2 * bid[0]
+        if ask:
+            return 2 * ask[0]
+        return 0
+
+    def within_spread(self, max_spread) -> bool:
+        """Check if the bid/ask spread is at most max_spread (a price, e.g. "0.035")"""
+        spread = self.spread_ticks()
+        if spread is None:
+            return False
+        decimals = max(self.tick_size.decimals, decimals_of(max_spread))
+        return spread * self.tick_size.units_at(decimals) <= parse_scaled(max_spread, decimals)
+
+    def to_price(self, ticks: int) -> str:
+        return self.tick_size.to_price(ticks)
+
+    def spread(self) -> Optional[float]:
+        """Spread as a price, None if either side is empty"""
+        spread = self.spread_ticks()
+        if spread is None:
+            return None
+        return spread * self.tick_size.units / self.tick_size.scale
+
+    def mid_price(self) -> float:
+        """Mid price, falling back to the only populated side (0.0 for an empty book)"""
+        return self.mid_ticks2() * self.tick_size.units / (2 * self.tick_size.scale)
+
+    def depth(self, levels: int = 5) -> Dict[str, List[Tuple[int, int]]]:
+        """Top `levels` price levels on each side as (ticks, size units)"""
+        return {'bids': self.bids.top(levels), 'asks': self.asks.top(levels)}
+
+    def ladder(self) -> Dict[str, List[Dict[str, str]]]:
+        """Full ladder in the same bids/asks format used by `book` events"""
+        to_price = self.tick_size.to_price
+        return {
+            'bids': [{'price': to_price(price), 'size': format_scaled(size, SIZE_DECIMALS)} for price, size in self.bids.ladder()],
+            'asks': [{'price': to_price(price), 'size': format_scaled(size, SIZE_DECIMALS)} for price, size in self.asks.ladder()]
+        }
+
+class OrderBookManager:
+    """Keeps a live order book for every subscribed asset"""
+
+    def __init__(self):
+        self.books: Dict[str, OrderBook] = {}
+        self.tick_sizes: Dict[str, str] = {}  # Tick sizes seen before the first snapshot
+        self.unchanged_snapshots = 0
+
+    def get_book(self, asset_id: str) -> Optional[OrderBook]:
+        return self.books.get(asset_id)
+
+    def _get_or_create(self, asset_id: str, market: Optional[str]) -> OrderBook:
+        book = self.books.get(asset_id)
+        if book is None:
+            book = OrderBook(asset_id, market, self.tick_sizes.get(asset_id))
+            self.books[asset_id] = book
+        elif market:
+            book.market = market
+        return book
+
+    def is_unchanged(self, asset_id: str, hash_value: Optional[str]) -> bool:
+        """True if a snapshot's hash matches the current book, counting it as skipped"""
+        book = self.books.get(asset_id)
+        if hash_value and book is not None and book.hash == hash_value:
+            self.unchanged_snapshots += 1
+            return True
+        return False
+
+    def apply_snapshot(self, asset_id: str, market: Optional[str], bids: List[Dict[str, Any]],
+                       asks: List[Dict[str, Any]], hash_value: Optional[str] = None,
+                       timestamp: Optional[str] = None, tick_size=None) -> OrderBook:
+        """Load a full `book` snapshot for an asset"""
+        book = self._get_or_create(asset_id, market)
+        if tick_size:
+            book.set_tick_size(tick_size)
+        book.apply_snapshot(bids, asks, hash_value, timestamp)
+        logger.debug(f"Loaded book snapshot for asset {asset_id}: {len(book.bids)} bids, {len(book.asks)} asks")
+        return book
+
+    def apply_price_change(self, asset_id: str, changes: List[Dict[str, Any]],
+                           hash_value: Optional[str] = None, timestamp: Optional[str] = None) -> Optional[OrderBook]:
+        """Apply `price_change` deltas, ignored until a snapshot has been loaded"""
+        book = self.books.get(asset_id)
+        if book is None:
+            logger.debug(f"Ignoring price change for asset {asset_id} without a snapshot")
+            return None
+        book.apply_changes(changes, hash_value, timestamp)
+        return book
+
+    def set_tick_size(self, asset_id: str, tick_size):
+        """Apply a tick_size_change to an asset's book"""
+        self.tick_sizes[asset_id] = tick_size
+        book = self.books.get(asset_id)
+        if book:
+            book.set_tick_size(tick_size)
+            logger.debug(f"Tick size for asset {asset_id} set to {book.tick_size}")
+
+    def best_bid(self, asset_id: str) -> Optional[Tuple[int, int]]:
+        book = self.books.get(asset_id)
+        return book.best_bid() if book else None
+
+    def best_ask(self, asset_id: str) -> Optional[Tuple[int, int]]:
+        book = self.books.get(asset_id)
+        return book.best_ask() if book else None
+
+    def remove(self, asset_id: str, keep_tick_size: bool = False):
+        """Drop the book of an asset, keeping its tick size when the book is about to be reloaded (resync)"""
+        book = self.books.pop(asset_id, None)
+        if not keep_tick_size:
+            self.tick_sizes.pop(asset_id, None)
+        elif book is not None:
+            self.tick_sizes[asset_id] = str(book.tick_size)
+
+    def seed_tick_size(self, asset_id: str, tick_size):
+        """Known tick size for an asset (e.g. the market's orderPriceMinTickSize), used until the CLOB reports one"""
+        if tick_size and asset_id not in self.tick_sizes and asset_id not in self.books:
+            self.tick_sizes[asset_id] = str(TickSize(tick_size))
+
+    def clear(self):
+        self.books.clear()
+        self.tick_sizes.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'books': len(self.books),
+            'unchanged_snapshots': self.unchanged_snapshots
+        }
+
+    def __len__(self):
+        return len(self.books)
+
+# Global order book manager instance
+order_book_manager = OrderBookManager()
@@ -0,0 +1,199 @@
+import logging
+import os
+import struct
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_POLICIES = ("drop_oldest", "keep_latest")
+
+# Spill record: routing key, content type and key lengths (u16) and body length (u32), then the bytes
+RECORD_HEADER = struct.Struct("<HHHI")
+
+OutboxMessage = Tuple[str, bytes, str, str]  # (routing_key, body, content_type, asset_id)
+
+class _Entry:
+    """Buffered message, marked dead when evicted by the keep_latest policy"""
+    __slots__ = ('message', 'live')
+
+    def __init__(self, message: OutboxMessage):
+        self.message = message
+        self.live = True
+
+class NotificationOutbox:
+    """Bounded FIFO of notifications the broker hasn't accepted yet, with optional spill to an append-only file
+
+    Once the memory buffer is full, messages go to the spill file (when configured) until it is fully
+    replayed, so replay order is always memory first, then file. Without a spill file, the drop policy
+    applies: drop_oldest evicts the oldest message, keep_latest evicts the oldest message of the same asset
+    first so every asset keeps its most recent notifications. Once the spill file reaches max_spill_bytes
+    (or can't be written) the new message is dropped, as the older ones are already on disk.
+    """
+
+    def __init__(self, capacity: int = 10000, policy: str = "drop_oldest",
+                 spill_path: Optional[str] = None, max_spill_bytes: int = 0):
+        if policy not in OUTBOX_POLICIES:
+            logger.warning(f"Unknown outbox policy '{policy}', using drop_oldest")
+            policy = "drop_oldest"
+
+        self.capacity = capacity
+        self.policy = policy
+        self.spill_path = spill_path or None
+        self.max_spill_bytes = max_spill_bytes
+        self._entries: Deque[_Entry] = deque()
+        self._by_asset: Dict[str, Deque[_Entry]] = {}
+        self._size = 0  # Live entries only
+        self._spill_offset = 0  # Next unread byte of the spill file
+        self._spill_size = 0
+
+        # Metrics
+        self.buffered = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.dropped = 0
+
+        if self.spill_path and os.path.exists(self.spill_path):
+            # Left over from a previous run, replayed after the memory buffer
+            self._spill_size = os.path.getsize(self.spill_path)
+            if self._spill_size:
+                logger.info(f"Found {self._spill_size} bytes of unsent notifications in {self.spill_path}")
+
+    def __len__(self):
+        return self._size
+
+    def has_spill(self) -> bool:
+        return self._spill_offset < self._spill_size
+
+    def is_empty(self) -> bool:
+        return self._size == 0 and not self.has_spill()
+
+    def _discard(self, entry: _Entry):
+        entry.live = False
+        self._size -= 1
+        entries = self._by_asset.get(entry.message[3])
+        if entries is not None:
+            try:
+                entries.remove(entry)
+            except ValueError:
+                pass
+            if not entries:
+                del self._by_asset[entry.message[3]]
+
+    def _evict(self, asset_id: str):
+        """Free one slot according to the drop policy"""
+        if self.policy == "keep_latest" and self._by_asset.get(asset_id):
+            self._discard(self._by_asset[asset_id][0])
+            self.dropped += 1
+            return
+        while self._entries:
+            entry = self._entries.popleft()
+            if entry.live:
+                self._discard(entry)
+                self.dropped += 1
+                return
+
+    def _spill(self, message: OutboxMessage) -> bool:
+        routing_key, body, content_type, asset_id = message
+        fields = [routing_key.encode(), content_type.encode(), asset_id.encode()]
+        record = RECORD_HEADER.pack(len(fields[0]), len(fields[1]), len(fields[2]), len(body)) + b"".join(fields) + body
+        if self.max_spill_bytes and self._spill_size + len(record) > self.max_spill_bytes:
+            return False
+        try:
+            with open(self.spill_path, "ab") as spill:
+                spill.write(record)
+        except OSError as e:
+            logger.error(f"Failed to spill notification to {self.spill_path}: {e}")
+            return False
+        self._spill_size += len(record)
+        self.spilled += 1
+        return True
+
+    def add(self, message: OutboxMessage):
+        """Buffer a message that couldn't be published"""
+        # Keep file order once spilling has started
+        if self.spill_path and (self.has_spill() or self._size >= self.capacity):
+            if self._spill(message):
+                return
+            if self.has_spill():
+                # Buffering in memory would replay it ahead of the spilled messages
+                self.dropped += 1
+                return
+
+        if self._size >= self.capacity:
+            self._evict(message[3])
+
+        entry = _Entry(message)
+        self._entries.append(entry)
+        self._by_asset.setdefault(message[3], deque()).append(entry)
+        self._size += 1
+        self.buffered += 1
+
+    def _read_spill(self, limit: int) -> List[OutboxMessage]:
+        messages = []
+        try:
+            with open(self.spill_path, "rb") as spill:
+                spill.seek(self._spill_offset)
+                while len(messages) < limit:
+                    header = spill.read(RECORD_HEADER.size)
+                    if len(header) < RECORD_HEADER.size:
+                        break
+                    key_length, type_length, asset_length, body_length = RECORD_HEADER.unpack(header)
+                    data = spill.read(key_length + type_length + asset_length + body_length)
+                    routing_key = data[:key_length].decode()
+                    content_type = data[key_length:key_length + type_length].decode()
+                    asset_id = data[key_length + type_length:key_length + type_length + asset_length].decode()
+                    body = data[key_length + type_length + asset_length:]
+                    messages.append((routing_key, body, content_type, asset_id))
+                self._spill_offset = spill.tell()
+        except OSError as e:
+            logger.error(f"Failed to read spilled notifications from {self.spill_path}: {e}")
+            return messages
+
+        if self._spill_offset >= self._spill_size:
+            self._truncate_spill()
+        return messages
+
+    def _truncate_spill(self):
+        try:
+            open(self.spill_path, "wb").close()
+        except OSError as e:
+            logger.error(f"Failed to truncate {self.spill_path}: {e}")
+        self._spill_offset = 0
+        self._spill_size = 0
+
+    def take(self, limit: int) -> List[OutboxMessage]:
+        """Remove up to limit messages in publish order"""
+        messages = []
+        while self._entries and len(messages) < limit:
+            entry = self._entries.popleft()
+            if entry.live:
+                self._discard(entry)
+                messages.append(entry.message)
+
+        if len(messages) < limit and self.spill_path and self.has_spill():
+            messages.extend(self._read_spill(limit - len(messages)))
+
+        self.replayed += len(messages)
+        return messages
+
+    def requeue(self, messages: List[OutboxMessage]):
+        """Put back messages taken for replay that still failed, ahead of everything buffered"""
+        for message in reversed(messages):
+            if self._size >= self.capacity:
+                self._evict(message[3])
+            entry = _Entry(message)
+            self._entries.appendleft(entry)
+            self._by_asset.setdefault(message[3], deque()).appendleft(entry)
+            self._size += 1
+        self.replayed -= len(messages)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'size': self._size,
+            'spill_bytes': self._spill_size - self._spill_offset,
+            'buffered': self.buffered,
+            'spilled': self.spilled,
+            'replayed': self.replayed,
+            'dropped': self.dropped
+        }
@@ -1,10 +1,11 @@
 import asyncio
-import json
 import logging
-from typing import Dict, Any, Callable, Optional
+from typing import Dict, List, Any, Callable, Optional, Set, Tuple
 import aio_pika
 from aio_pika import Message, ExchangeType
 from src.config import config
+from src import codec, notification_codec
+from src.order_book import TickSize
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +17,8 @@ class RabbitMQClient:
         self.notification_queue: Optional[aio_pika.Queue] = None
         self.running = False
         self.command_handlers: Dict[str, Callable] = {}
+        self.command_tasks: Set[asyncio.Task] = set()
+        self.market_formats = notification_codec.select_formats(config.MARKET_NOTIFICATION_FORMATS)
         
     async def connect(self) -> bool:
         """Connect to RabbitMQ"""
@@ -26,6 +29,9 @@ class RabbitMQClient:
             self.connection = await aio_pika.connect_robust(config.RABBITMQ_URL)
             self.channel = await self.connection.channel()
             
+            # Commands are processed concurrently, at most this many unacknowledged at a time
+            await self.channel.set_qos(prefetch_count=config.RABBITMQ_COMMAND_PREFETCH)
+            
             # Create exchange for topics
             self.exchange = await self.channel.declare_exchange(
                 "polymarket", 
@@ -76,58 +82,90 @@ class RabbitMQClient:
             async def process_command(message: aio_pika.IncomingMessage):
                 async with message.process():
                     try:
-                        # Decode message
-                        body = message.body.decode()
-                        logger.info(f"Received command: {body}")
+                        body = message.body
+                        logger.info(f"Received command: {body.decode(errors='replace')}")
                         
-                        # Parse JSON
+                        # Parse JSON straight from the body bytes
                         try:
-                            command_data = json.loads(body)
-                        except json.JSONDecodeError:
+                            command_data = codec.loads(body)
+                        except codec.DecodeError:
+                            command_data = None
+                        
+                        if not isinstance(command_data, dict):
                             # Handle simple string commands
-                            command_data = {"command": body.strip()}
+                            command_data = {"command": body.decode(errors='replace').strip()}
                         
                         command = command_data.get("command")
                         if not command:
                             logger.warning(f"No command found in message: {body}")
+                            await self.send_reply(message, {"success": False, "error": "missing command"})
                             return
                         
                         # Execute command handler
                         if command in self.command_handlers:
                             logger.info(f"Executing command: {command}")
                             try:
-                                await self.command_handlers[command](command_data)
+                                result = await self.command_handlers[command](command_data)
                                 logger.info(f"Command executed successfully: {command}")
+                                reply = {"command": command, "success": True, "result": result}
                             except Exception as e:
                                 logger.error(f"Error executing command {command}: {e}")
+                                reply = {"command": command, "success": False, "error": str(e)}
                         else:
                             logger.warning(f"Unknown command: {command}")
+                            reply = {"command": command, "success": False, "error": "unknown command"}
+                        
+                        await self.send_reply(message, reply)
                             
                     except Exception as e:
                         logger.error(f"Error processing command message: {e}")
             
+            async def dispatch_command(message: aio_pika.IncomingMessage):
+                # Run each command in its own task so a slow restart doesn't hold up stats or snapshot requests
+                task = asyncio.create_task(process_command(message))
+                self.command_tasks.add(task)
+                task.add_done_callback(self.command_tasks.discard)
+            
             # Start consuming messages
-            await self.notification_queue.consume(process_command)
+            await self.notification_queue.consume(dispatch_command)
             
         except Exception as e:
             logger.error(f"Error in command listener: {e}")
     
-    async def publish_notification(self, routing_key: str, message: Dict[str, Any]):
-        """Publish notification to topic exchange"""
+    async def send_reply(self, message: aio_pika.IncomingMessage, reply: Dict[str, Any]):
+        """Reply to a command sent with reply_to, echoing its correlation_id"""
+        if not message.reply_to:
+            return
+        try:
+            await self.channel.default_exchange.publish(
+                Message(
+                    codec.dumps(reply),
+                    content_type="application/json",
+                    correlation_id=message.correlation_id
+                ),
+                routing_key=message.reply_to
+            )
+        except Exception as e:
+            logger.error(f"Error sending reply to {message.reply_to}: {e}")
+    
+    @staticmethod
+    def build_message(body: bytes, content_type: str = "application/json") -> Message:
+        """AMQP message for an encoded body"""
+        return Message(
+            body,
+            content_type=content_type,
+            timestamp=asyncio.get_event_loop().time()
+        )
+    
+    async def publish_body(self, routing_key: str, body: bytes, content_type: str = "application/json"):
+        """Publish an already encoded body to topic exchange, content_type tells consumers how to decode it"""
         try:
             if not self.exchange:
                 logger.error("Exchange not initialized")
                 return False
             
-            # Convert message to JSON
-            message_body = json.dumps(message)
-            
             # Create message
-            rabbit_message = Message(
-                message_body.encode(),
-                content_type="application/json",
-                timestamp=asyncio.get_event_loop().time()
-            )
+            rabbit_message = self.build_message(body, content_type)
             
             # Publish to exchange with routing key
             await self.exchange.publish(
@@ -135,27 +173,52 @@ class RabbitMQClient:
                 routing_key=routing_key
             )
             
-            logger.debug(f"Published notification to {routing_key}: {message}")
+            logger.debug(f"Published {len(body)} bytes ({content_type}) to {routing_key}")
             return True
             
         except Exception as e:
             logger.error(f"Error publishing notification: {e}")
             return False
     
-    async def publish_market_notification(self, asset_id: str, event_type: str, data: Dict[str, Any]):
-        """Publish market-related notification"""
+    async def publish_notification(self, routing_key: str, message: Dict[str, Any]):
+        """Publish notification to topic exchange"""
+        # Convert message to JSON bytes
+        return await self.publish_body(routing_key, codec.dumps(message))
+    
+    def encode_market_notification(self, asset_id: str, event_type: str, data: Dict[str, Any],
+                                   tick_size: Optional[TickSize] = None) -> List[Tuple[str, bytes, str]]:
+        """(routing_key, body, content_type) for every configured market notification format"""
+        notification = {
+            "asset_id": asset_id,
+            "event_type": event_type,
+            "data": data,
+            "timestamp": asyncio.get_event_loop().time()
+        }
+        
+        messages = []
+        for fmt in self.market_formats:
+            body = notification_codec.encode(fmt, notification, tick_size)
+            if body is None:
+                continue
+            
+            # JSON keeps markets.<asset_id>, compact formats go to markets.<format>.<asset_id>
+            if fmt == "json":
+                routing_key = f"{config.RABBITMQ_MARKETS_TOPIC}.{asset_id}"
+            else:
+                routing_key = f"{config.RABBITMQ_MARKETS_TOPIC}.{fmt}.{asset_id}"
+            messages.append((routing_key, body, notification_codec.CONTENT_TYPES[fmt]))
+        
+        return messages
+    
+    async def publish_market_notification(self, asset_id: str, event_type: str, data: Dict[str, Any],
+                                          tick_size: Optional[TickSize] = None):
+        """Publish market-related notification in every configured format"""
         try:
-            notification = {
-                "asset_id": asset_id,
-                "event_type": event_type,
-                "data": data,
-                "timestamp": asyncio.get_event_loop().time()
-            }
-            
-            # Use markets topic with asset_id as routing key
-            routing_key = f"{config.RABBITMQ_MARKETS_TOPIC}.{asset_id}"
+            success = True
+            for routing_key, body, content_type in self.encode_market_notification(asset_id, event_type, data, tick_size):
+                success = await self.publish_body(routing_key, body, content_type) and success
             
-            return await self.publish_notification(routing_key, notification)
+            return success
             
         except Exception as e:
             logger.error(f"Error publishing market notification: {e}")
@@ -1,37 +1,54 @@
 import asyncio
-import json
+import hashlib
+import heapq
 import logging
 import websockets
-import threading
-import time
-from typing import Dict, List, Callable, Any, Optional
+from bisect import bisect
+from typing import Dict, List, Set, Callable, Any, Optional
 from datetime import datetime, timezone
 from src.config import config
+from src import codec
+from src.ingest_queue import ConflatingIngestQueue
+from src.events import MarketEvent, BookEvent, PriceChangeEvent, TickSizeChangeEvent, decode_event
 
 logger = logging.getLogger(__name__)
 
+# Events whose loss leaves the in-memory book wrong until a fresh snapshot
+BOOK_EVENT_TYPES = (BookEvent.event_type, PriceChangeEvent.event_type, TickSizeChangeEvent.event_type)
+
+# Weight of the previous per-asset rate at each rebalance check of the rate strategy
+RATE_DECAY = 0.5
+
 class PolymarketWebSocketClient:
-    def __init__(self):
+    def __init__(self, name: str = "ws"):
+        self.name = name
         self.websocket = None
         self.running = False
         self.subscriptions: Dict[str, List[str]] = {}
         self.message_handlers: List[Callable] = []
+        self.connect_callbacks: List[Callable] = []  # Called with the subscribed asset ids after each (re)connect
+        self.callback_tasks: Set[asyncio.Task] = set()  # Connect callbacks still running
         self.ping_task = None
+        self.api_creds = None
+        self.message_counts: Dict[str, int] = {}  # Market updates received per asset
+        self.ingest_queue = ConflatingIngestQueue(config.INGEST_QUEUE_SIZE, config.INGEST_BACKPRESSURE_POLICY,
+                                                  on_drop=self.on_ingest_drop)
+        self.consumer_task = None
+        self.resync_callbacks: List[Callable] = []  # Called with assets whose updates were dropped by backpressure
+        self.stale_assets: Set[str] = set()  # Waiting for the resync callbacks
+        self.resync_task: Optional[asyncio.Task] = None
+        self.dropped_deltas = 0
+        
+    def is_connected(self) -> bool:
+        """Check if the WebSocket connection is open"""
+        return bool(self.websocket) and not self.websocket.closed
         
     async def connect(self) -> bool:
         """Connect to Polymarket WebSocket"""
         try:
-            logger.info(f"Connecting to WebSocket: {config.POLYMARKET_WSS_URL}")
-            
-            # Create WebSocket connection with proper URL and headers
-            self.websocket = await websockets.connect(
-                config.POLYMARKET_WSS_URL,
-                ping_interval=None,  # Disable automatic ping
-                ping_timeout=None,   # Disable automatic ping timeout
-                extra_headers={
-                    "User-Agent": "polymarket-mm/1.0"
-                }
-            )
+            logger.info(f"Connecting to WebSocket ({self.name}): {config.POLYMARKET_WSS_URL}")
+            
+            self.websocket = await self.open_connection()
             
             logger.info("Connected to Polymarket WebSocket")
             return True
@@ -40,6 +57,18 @@ class PolymarketWebSocketClient:
             logger.error(f"Failed to connect to WebSocket: {e}")
             return False
     
+    async def open_connection(self):
+        """Open a new WebSocket connection without attaching it to the client"""
+        # Create WebSocket connection with proper URL and headers
+        return await websockets.connect(
+            config.POLYMARKET_WSS_URL,
+            ping_interval=None,  # Disable automatic ping
+            ping_timeout=None,   # Disable automatic ping timeout
+            extra_headers={
+                "User-Agent": "polymarket-mm/1.0"
+            }
+        )
+    
     async def authenticate(self, api_creds=None) -> bool:
         """Authenticate with the WebSocket server using CLOB API credentials"""
         try:
@@ -117,60 +146,105 @@ class PolymarketWebSocketClient:
             logger.error(f"Failed to subscribe to market channel: {e}")
             return False
     
+    async def send_subscription_operation(self, operation: str, asset_ids: List[str]) -> bool:
+        """Subscribe or unsubscribe assets on the open connection without resubscribing the rest"""
+        try:
+            if not asset_ids:
+                return True
+            
+            await self.send_message({
+                "assets_ids": asset_ids,
+                "operation": operation
+            })
+            
+            logger.info(f"Sent {operation} for {len(asset_ids)} assets: {asset_ids[:5]}...")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to {operation} assets: {e}")
+            return False
+    
+    async def resubscribe(self, asset_ids: List[str]) -> bool:
+        """Unsubscribe and subscribe again so the server resends full books for these assets"""
+        subscribed = set(self.subscriptions.get("market", []))
+        asset_ids = [asset_id for asset_id in asset_ids if asset_id in subscribed]
+        if not asset_ids or not self.is_connected():
+            return False
+        return (await self.send_subscription_operation("unsubscribe", asset_ids) and
+                await self.send_subscription_operation("subscribe", asset_ids))
+    
+    def get_message_counts(self) -> Dict[str, int]:
+        """Market updates received per asset"""
+        return dict(self.message_counts)
+    
+    async def swap_connection(self, asset_ids: List[str]) -> bool:
+        """Make-before-break swap: subscribe on a new connection before closing the old one"""
+        old_websocket = self.websocket
+        
+        try:
+            logger.info(f"Opening replacement WebSocket connection ({self.name}) for {len(asset_ids)} assets")
+            self.websocket = await self.open_connection()
+        except Exception as e:
+            logger.error(f"Failed to open replacement WebSocket connection: {e}")
+            self.websocket = old_websocket
+            return False
+        
+        # The listener keeps draining the old connection until it is closed below,
+        # frames arriving on the new one are buffered until it switches over
+        if not await self.authenticate(self.api_creds):
+            logger.warning("Authentication failed on replacement connection, continuing without auth")
+        
+        if not await self.subscribe_to_market_channel(asset_ids):
+            logger.error("Failed to subscribe on replacement connection, keeping the old one")
+            new_websocket = self.websocket
+            self.websocket = old_websocket
+            try:
+                await new_websocket.close()
+            except Exception as e:
+                logger.debug(f"Error closing replacement WebSocket: {e}")
+            return False
+        
+        if old_websocket:
+            try:
+                await old_websocket.close()
+            except Exception as e:
+                logger.debug(f"Error closing old WebSocket: {e}")
+        
+        logger.info(f"Swapped WebSocket connection ({self.name}) with {len(asset_ids)} assets")
+        return True
+    
     async def update_market_subscriptions(self, new_asset_ids: List[str]) -> bool:
-        """Update market channel subscriptions with new asset list using hard reset"""
+        """Update market channel subscriptions, sending only the added and removed assets"""
         try:
             if not new_asset_ids:
                 logger.warning("No asset IDs provided for subscription update")
                 return False
             
-            logger.info(f"Forcing hard reset of WebSocket connection with {len(new_asset_ids)} assets")
+            current_set = set(self.subscriptions.get("market", []))
+            new_set = set(new_asset_ids)
+            added_assets = [asset_id for asset_id in new_asset_ids if asset_id not in current_set]
+            removed_assets = [asset_id for asset_id in current_set if asset_id not in new_set]
             
-            # Store the new asset list before reconnecting
+            # The reconnect loop always subscribes to the latest list
             self.subscriptions["market"] = new_asset_ids.copy()
             
-            # Cancel ping task if running
-            if self.ping_task:
-                self.ping_task.cancel()
-                try:
-                    await self.ping_task
-                except asyncio.CancelledError:
-                    pass
-                self.ping_task = None
-            
-            # Close current connection forcefully
-            if self.websocket:
-                try:
-                    await self.websocket.close()
-                except Exception as e:
-                    logger.debug(f"Error closing WebSocket: {e}")
-                self.websocket = None
+            if not self.is_connected():
+                logger.info(f"WebSocket not connected, {len(new_asset_ids)} assets will be subscribed on connect")
+                return True
             
-            # Stop current connection
-            old_running = self.running
-            self.running = False
+            if not added_assets and not removed_assets:
+                return True
             
-            # Delay to ensure clean shutdown
-            await asyncio.sleep(2)
+            logger.info(f"Updating subscriptions ({self.name}) - Added: {len(added_assets)}, Removed: {len(removed_assets)}")
             
-            # Reconnect with new asset list
-            logger.info("Attempting to reconnect WebSocket...")
-            if await self.connect():
-                self.running = old_running  # Restore running state
-                
-                # Subscribe to new asset list
-                logger.info(f"Subscribing to {len(new_asset_ids)} assets after reconnection")
-                success = await self.subscribe_to_market_channel(new_asset_ids)
-                
-                if success:
-                    logger.info(f"Successfully reinitialized WebSocket with {len(new_asset_ids)} assets")
+            if config.WS_INCREMENTAL_SUBSCRIPTIONS:
+                # Subscribe first so an asset moving between connections never has a gap
+                if (await self.send_subscription_operation("subscribe", added_assets) and
+                        await self.send_subscription_operation("unsubscribe", removed_assets)):
                     return True
-                else:
-                    logger.error("Failed to subscribe after reconnection")
-                    return False
-            else:
-                logger.error("Failed to reconnect WebSocket")
-                return False
+                logger.warning("Incremental subscription update failed, falling back to connection swap")
+            
+            return await self.swap_connection(new_asset_ids)
             
         except Exception as e:
             logger.error(f"Error updating market subscriptions: {e}")
@@ -181,35 +255,74 @@ class PolymarketWebSocketClient:
         if not self.websocket:
             raise Exception("WebSocket not connected")
         
-        message_str = json.dumps(message)
+        message_str = codec.dumps_str(message)
         await self.websocket.send(message_str)
         logger.debug(f"Sent message: {message_str}")
     
     def add_message_handler(self, handler: Callable):
-        """Add a message handler function"""
-        self.message_handlers.append(handler)
+        """Add a message handler function (ignored if already registered)"""
+        if handler not in self.message_handlers:
+            self.message_handlers.append(handler)
+    
+    def add_connect_callback(self, callback: Callable):
+        """Add a coroutine function called with the asset ids after each successful subscribe"""
+        if callback not in self.connect_callbacks:
+            self.connect_callbacks.append(callback)
+    
+    def add_resync_callback(self, callback: Callable):
+        """Add a coroutine function called with the assets that lost book updates to ingest backpressure"""
+        if callback not in self.resync_callbacks:
+            self.resync_callbacks.append(callback)
+    
+    def on_ingest_drop(self, event: MarketEvent):
+        """Ingest queue dropped an event, books it applied to are stale until resynced"""
+        if event.event_type == PriceChangeEvent.event_type:
+            self.dropped_deltas += 1
+        if event.event_type not in BOOK_EVENT_TYPES or not event.asset_id or not self.resync_callbacks:
+            return
+        self.stale_assets.add(event.asset_id)
+        if self.resync_task is None or self.resync_task.done():
+            self.resync_task = asyncio.create_task(self.resync_stale_assets())
+    
+    async def resync_stale_assets(self):
+        """Pass the stale assets to the resync callbacks once the ingest queue has room again"""
+        try:
+            # Snapshots requested while still full would be dropped as well
+            while self.ingest_queue.full():
+                await asyncio.sleep(1)
+            asset_ids = list(self.stale_assets)
+            self.stale_assets.clear()
+            logger.warning(f"Resyncing {len(asset_ids)} assets ({self.name}) after dropped market updates")
+            for callback in self.resync_callbacks:
+                await callback(asset_ids)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error resyncing stale assets: {e}")
+    
+    def notify_connected(self, asset_ids: List[str]):
+        """Run connect callbacks in the background so listening starts right away"""
+        for callback in self.connect_callbacks:
+            task = asyncio.create_task(callback(list(asset_ids)))
+            self.callback_tasks.add(task)
+            task.add_done_callback(self.callback_tasks.discard)
     
     async def handle_message(self, message):
         """Handle incoming message from WebSocket"""
         try:
             # Check if message is a list (market data updates)
             if isinstance(message, list):
-                # Handle each item in the list
+                # Queue each item for the consumer task
                 for item in message:
-                    await self.handle_market_update(item)
+                    await self.enqueue_market_update(item)
                 return
             
-            # Handle dict messages (control messages)
+            # Handle dict messages (single market updates and control messages)
             if isinstance(message, dict):
                 message_type = message.get("type")
                 
-                if message_type == "book":
-                    # Handle book update
-                    for handler in self.message_handlers:
-                        try:
-                            await handler(message)
-                        except Exception as e:
-                            logger.error(f"Error in message handler: {e}")
+                if message.get("event_type") or message_type == "book":
+                    await self.enqueue_market_update(message)
                 
                 elif message_type == "ping":
                     # Respond to ping with pong
@@ -239,201 +352,45 @@ class PolymarketWebSocketClient:
         except Exception as e:
             logger.error(f"Error handling message: {e}")
     
-    async def handle_market_update(self, item: Dict[str, Any]):
-        """Handle individual market update item"""
-        try:
-            asset_id = item.get('asset_id')
-            event_type = item.get('event_type')
-            market = item.get('market')
-            timestamp = item.get('timestamp')
-            
-            logger.debug(f"Market update - Asset: {asset_id}, Event: {event_type}")
-            
-            # Handle different event types according to Polymarket documentation
-            if event_type == 'book':
-                await self.handle_book_event(item)
-            elif event_type == 'price_change':
-                await self.handle_price_change_event(item)
-            elif event_type == 'tick_size_change':
-                await self.handle_tick_size_change_event(item)
-            elif event_type == 'last_trade_price':
-                await self.handle_last_trade_price_event(item)
-            else:
-                logger.warning(f"Unknown event type: {event_type} for asset {asset_id}")
-                
-        except Exception as e:
-            logger.error(f"Error handling market update: {e}")
-    
-    async def handle_book_event(self, item: Dict[str, Any]):
-        """Handle book event - full orderbook snapshot"""
-        try:
-            asset_id = item.get('asset_id')
-            market = item.get('market')
-            timestamp = item.get('timestamp')
-            hash_value = item.get('hash')
-            bids = item.get('bids', [])
-            asks = item.get('asks', [])
-            
-            # Convert to standardized book format
-            book_message = {
-                'type': 'book',
-                'asset_id': asset_id,
-                'market': market,
-                'timestamp': timestamp,
-                'event_type': 'book',
-                'hash': hash_value,
-                'bids': bids,
-                'asks': asks,
-                'spread': None,
-                'sequence': None,
-                'last_update_id': hash_value
-            }
-            
-            # Calculate spread if both bids and asks exist
-            if bids and asks:
-                best_bid = float(bids[0].get('price', 0)) if bids else 0
-                best_ask = float(asks[0].get('price', 0)) if asks else 0
-                if best_bid > 0 and best_ask > 0:
-                    book_message['spread'] = best_ask - best_bid
-            
-            logger.info(f"Book snapshot - Asset: {asset_id}, Bids: {len(bids)}, Asks: {len(asks)}")
-            
-            # Call message handlers
-            for handler in self.message_handlers:
-                try:
-                    await handler(book_message)
-                except Exception as e:
-                    logger.error(f"Error in book handler for asset {asset_id}: {e}")
-                    
-        except Exception as e:
-            logger.error(f"Error handling book event: {e}")
+    async def enqueue_market_update(self, item: Dict[str, Any]):
+        """Decode a market update into a typed event and queue it, book snapshots for the same asset are conflated"""
+        event = decode_event(item) if isinstance(item, dict) else None
+        if event is None:
+            logger.warning(f"Unknown market update: {item.get('event_type') if isinstance(item, dict) else type(item)}")
+            return
+        
+        key = event.asset_id if event.event_type == 'book' else None
+        
+        if not await self.ingest_queue.put(event, key):
+            logger.debug(f"Ingest queue full, dropped update for asset {event.asset_id}")
     
-    async def handle_price_change_event(self, item: Dict[str, Any]):
-        """Handle price_change event - order book updates"""
-        try:
-            asset_id = item.get('asset_id')
-            market = item.get('market')
-            timestamp = item.get('timestamp')
-            changes = item.get('changes', [])
-            
-            # Convert changes to bids/asks format
-            bids = []
-            asks = []
-            
-            for change in changes:
-                if isinstance(change, dict):
-                    side = change.get('side')
-                    price = change.get('price')
-                    size = change.get('size')
-                    
-                    if side and price is not None and size is not None:
-                        order_info = {'price': str(price), 'size': str(size)}
-                        if side.lower() in ['buy', 'bid']:
-                            bids.append(order_info)
-                        elif side.lower() in ['sell', 'ask']:
-                            asks.append(order_info)
-            
-            book_message = {
-                'type': 'book',
-                'asset_id': asset_id,
-                'market': market,
-                'timestamp': timestamp,
-                'event_type': 'price_change',
-                'changes': changes,
-                'bids': bids,
-                'asks': asks,
-                'spread': None,
-                'sequence': None,
-                'last_update_id': None
-            }
-            
-            logger.debug(f"Price change - Asset: {asset_id}, Changes: {len(changes)}, Bids: {len(bids)}, Asks: {len(asks)}")
-            
-            # Call message handlers
-            for handler in self.message_handlers:
-                try:
-                    await handler(book_message)
-                except Exception as e:
-                    logger.error(f"Error in price change handler for asset {asset_id}: {e}")
-                    
-        except Exception as e:
-            logger.error(f"Error handling price change event: {e}")
+    async def process_ingest_queue(self):
+        """Consume queued market updates so slow handlers never stall the socket reader"""
+        while True:
+            event = await self.ingest_queue.get()
+            try:
+                await self.handle_market_update(event)
+            except Exception as e:
+                logger.error(f"Error processing queued market update: {e}")
     
-    async def handle_tick_size_change_event(self, item: Dict[str, Any]):
-        """Handle tick_size_change event"""
-        try:
-            asset_id = item.get('asset_id')
-            market = item.get('market')
-            timestamp = item.get('timestamp')
-            old_tick_size = item.get('old_tick_size')
-            new_tick_size = item.get('new_tick_size')
-            
-            logger.info(f"Tick size change - Asset: {asset_id}, Old: {old_tick_size}, New: {new_tick_size}")
-            
-            # Create message for tick size change
-            tick_message = {
-                'type': 'tick_size_change',
-                'asset_id': asset_id,
-                'market': market,
-                'timestamp': timestamp,
-                'event_type': 'tick_size_change',
-                'old_tick_size': old_tick_size,
-                'new_tick_size': new_tick_size,
-                'bids': [],
-                'asks': [],
-                'spread': None,
-                'sequence': None,
-                'last_update_id': None
-            }
-            
-            # Call message handlers
-            for handler in self.message_handlers:
-                try:
-                    await handler(tick_message)
-                except Exception as e:
-                    logger.error(f"Error in tick size change handler for asset {asset_id}: {e}")
-                    
-        except Exception as e:
-            logger.error(f"Error handling tick size change event: {e}")
+    def get_ingest_stats(self) -> Dict[str, Any]:
+        """Ingest queue depth, conflation and drop counters"""
+        return dict(self.ingest_queue.get_stats(), dropped_deltas=self.dropped_deltas)
     
-    async def handle_last_trade_price_event(self, item: Dict[str, Any]):
-        """Handle last_trade_price event - trade execution"""
-        try:
-            asset_id = item.get('asset_id')
-            market = item.get('market')
-            timestamp = item.get('timestamp')
-            price = item.get('price')
-            side = item.get('side')
-            size = item.get('size')
-            
-            logger.info(f"Trade executed - Asset: {asset_id}, Side: {side}, Price: {price}, Size: {size}")
-            
-            # Create message for trade
-            trade_message = {
-                'type': 'last_trade_price',
-                'asset_id': asset_id,
-                'market': market,
-                'timestamp': timestamp,
-                'event_type': 'last_trade_price',
-                'price': price,
-                'side': side,
-                'size': size,
-                'bids': [],
-                'asks': [],
-                'spread': None,
-                'sequence': None,
-                'last_update_id': None
-            }
-            
-            # Call message handlers
-            for handler in self.message_handlers:
-                try:
-                    await handler(trade_message)
-                except Exception as e:
-                    logger.error(f"Error in trade handler for asset {asset_id}: {e}")
-                    
-        except Exception as e:
-            logger.error(f"Error handling last trade price event: {e}")
+    async def handle_market_update(self, event: MarketEvent):
+        """Pass a typed market event to the registered handlers"""
+        asset_id = event.asset_id
+        
+        logger.debug(f"Market update - Asset: {asset_id}, Event: {event.event_type}")
+        
+        if asset_id:
+            self.message_counts[asset_id] = self.message_counts.get(asset_id, 0) + 1
+        
+        for handler in self.message_handlers:
+            try:
+                await handler(event)
+            except Exception as e:
+                logger.error(f"Error in {event.event_type} handler for asset {asset_id}: {e}")
     
     async def send_ping(self):
         """Send periodic PING messages to keep connection alive"""
@@ -454,33 +411,29 @@ class PolymarketWebSocketClient:
                 raise Exception("WebSocket not connected")
             
             self.running = True
-            logger.info("Starting WebSocket message listener")
+            logger.info(f"Starting WebSocket message listener ({self.name})")
             
             # Start ping task to keep connection alive
             self.ping_task = asyncio.create_task(self.send_ping())
             
-            async for message_str in self.websocket:
+            # Start consumer task, it survives reconnects so queued updates are not lost
+            if not self.consumer_task or self.consumer_task.done():
+                self.consumer_task = asyncio.create_task(self.process_ingest_queue())
+            
+            while self.running and self.websocket:
+                websocket = self.websocket
+                
                 try:
-                    # Handle both JSON messages and simple strings
-                    if message_str == "PONG":
-                        logger.debug("Received PONG response")
-                        continue
-                    
-                    try:
-                        message = json.loads(message_str)
-                        await self.handle_message(message)
-                    except json.JSONDecodeError:
-                        # Handle non-JSON messages
-                        logger.debug(f"Received non-JSON message: {message_str}")
-                        if message_str == "PING":
-                            await self.websocket.send("PONG")
-                            logger.debug("Responded to PING with PONG")
-                    
-                except Exception as e:
-                    logger.error(f"Error processing message: {e}")
+                    await self.consume(websocket)
+                except websockets.exceptions.ConnectionClosed:
+                    if self.websocket is websocket:
+                        raise
                 
-                if not self.running:
+                if self.websocket is websocket:
                     break
+                
+                # Connection was swapped by update_market_subscriptions
+                logger.info(f"WebSocket listener ({self.name}) switched to replacement connection")
                     
         except websockets.exceptions.ConnectionClosed:
             logger.warning("WebSocket connection closed")
@@ -491,6 +444,35 @@ class PolymarketWebSocketClient:
             if self.ping_task:
                 self.ping_task.cancel()
     
+    async def consume(self, websocket):
+        """Process messages from a single connection until it closes"""
+        async for message_str in websocket:
+            try:
+                # Handle both JSON messages and simple strings
+                if message_str == "PONG":
+                    logger.debug("Received PONG response")
+                    continue
+                
+                try:
+                    message = codec.loads(message_str)
+                except codec.DecodeError:
+                    message = None
+                
+                if message is not None:
+                    await self.handle_message(message)
+                else:
+                    # Handle non-JSON messages
+                    logger.debug(f"Received non-JSON message: {message_str}")
+                    if message_str == "PING":
+                        await websocket.send("PONG")
+                        logger.debug("Responded to PING with PONG")
+                
+            except Exception as e:
+                logger.error(f"Error processing message: {e}")
+            
+            if not self.running:
+                break
+    
     async def start_with_subscriptions(self, asset_ids: List[str], message_handler: Callable, api_creds=None):
         """Start WebSocket client with market subscriptions"""
         try:
@@ -502,6 +484,8 @@ class PolymarketWebSocketClient:
             if not await self.authenticate(api_creds):
                 logger.warning("Authentication failed, continuing without auth")
             
+            self.api_creds = api_creds
+            
             # Add message handler
             self.add_message_handler(message_handler)
             
@@ -512,6 +496,8 @@ class PolymarketWebSocketClient:
             if not await self.subscribe_to_market_channel(asset_ids):
                 return False
             
+            self.notify_connected(asset_ids)
+            
             # Start listening for messages
             await self.listen()
             
@@ -526,13 +512,15 @@ class PolymarketWebSocketClient:
         try:
             self.running = False
             
-            # Cancel ping task
-            if self.ping_task:
-                self.ping_task.cancel()
-                try:
-                    await self.ping_task
-                except asyncio.CancelledError:
-                    pass
+            # Cancel ping and consumer tasks
+            for task in (self.ping_task, self.consumer_task):
+                if task:
+                    task.cancel()
+                    try:
+                        await task
+                    except asyncio.CancelledError:
+                        pass
+            self.consumer_task = None
             
             if self.websocket:
                 await self.websocket.close()
@@ -550,6 +538,9 @@ class PolymarketWebSocketClient:
             try:
                 logger.info(f"Attempting to connect (attempt {retry_count + 1}/{max_retries})")
                 
+                # Subscriptions may have been updated since the loop started
+                asset_ids = self.subscriptions.get("market") or asset_ids
+                
                 if await self.start_with_subscriptions(asset_ids, message_handler, api_creds):
                     retry_count = 0  # Reset retry count on successful connection
                 else:
@@ -567,5 +558,292 @@ class PolymarketWebSocketClient:
             
         logger.error(f"Max reconnection attempts ({max_retries}) reached")
 
-# Create WebSocket client instance
-websocket_client = PolymarketWebSocketClient()
\ No newline at end of file
+class ConsistentHashRing:
+    """Consistent hash ring mapping asset IDs to connection indexes"""
+    
+    def __init__(self, nodes: List[int], replicas: int = 100):
+        self.keys: List[int] = []
+        self.nodes: List[int] = []
+        points = sorted(
+            (self._hash(f"{node}:{replica}"), node)
+            for node in nodes
+            for replica in range(replicas)
+        )
+        for point, node in points:
+            self.keys.append(point)
+            self.nodes.append(node)
+    
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+    
+    def get_node(self, key: str) -> int:
+        """Get the node owning a key"""
+        index = bisect(self.keys, self._hash(key)) % len(self.keys)
+        return self.nodes[index]
+
+class WebSocketConnectionPool:
+    """Sharded pool of WebSocket connections exposing the PolymarketWebSocketClient interface"""
+    
+    def __init__(self, size: int, strategy: str = "hash"):
+        if strategy not in ("hash", "rate"):
+            logger.warning(f"Unknown WebSocket pool strategy '{strategy}', using hash")
+            strategy = "hash"
+        
+        self.size = size
+        self.strategy = strategy
+        self.clients = [PolymarketWebSocketClient(name=f"ws-{index}") for index in range(size)]
+        self.ring = ConsistentHashRing(list(range(size)))
+        self.subscriptions: Dict[str, List[str]] = {}
+        self.client_tasks: Dict[int, asyncio.Task] = {}
+        self.message_handler: Optional[Callable] = None
+        self.api_creds = None
+        self.rates: Dict[str, float] = {}  # Decayed messages/s per asset, rate strategy only
+        self.rate_counts: Dict[str, int] = {}  # Message counts at the last rate update
+        self.max_retries = 5
+        self.running = False
+    
+    def add_connect_callback(self, callback: Callable):
+        """Register a connect callback on every pooled connection"""
+        for client in self.clients:
+            client.add_connect_callback(callback)
+    
+    def add_resync_callback(self, callback: Callable):
+        """Register a resync callback on every pooled connection"""
+        for client in self.clients:
+            client.add_resync_callback(callback)
+    
+    def is_connected(self) -> bool:
+        """Check if at least one pooled connection is open"""
+        return any(client.is_connected() for client in self.clients)
+    
+    def get_message_counts(self) -> Dict[str, int]:
+        """Market updates received per asset across all connections"""
+        counts: Dict[str, int] = {}
+        for client in self.clients:
+            counts.update(client.message_counts)
+        return counts
+    
+    async def resubscribe(self, asset_ids: List[str]) -> bool:
+        """Resubscribe assets on the connections that own them"""
+        wanted = set(asset_ids)
+        results = []
+        for client in self.clients:
+            owned = [asset_id for asset_id in client.subscriptions.get("market", []) if asset_id in wanted]
+            if owned:
+                results.append(await client.resubscribe(owned))
+        return bool(results) and all(results)
+    
+    def get_ingest_stats(self) -> Dict[str, Any]:
+        """Ingest queue counters summed across all connections"""
+        stats: Dict[str, Any] = {}
+        for client in self.clients:
+            for name, value in client.get_ingest_stats().items():
+                if isinstance(value, int):
+                    stats[name] = stats.get(name, 0) + value
+                else:
+                    stats[name] = value
+        return stats
+    
+    def _place(self, shards: List[List[str]], asset_ids: List[str]):
+        """Greedily add assets to the connection with the lowest rate, ties broken by asset count"""
+        loads = [(sum(self.rates.get(asset_id, 0.0) for asset_id in shard), len(shard), index)
+                 for index, shard in enumerate(shards)]
+        heapq.heapify(loads)
+        for asset_id in asset_ids:
+            load, count, index = heapq.heappop(loads)
+            shards[index].append(asset_id)
+            heapq.heappush(loads, (load + self.rates.get(asset_id, 0.0), count + 1, index))
+    
+    def partition(self, asset_ids: List[str]) -> List[List[str]]:
+        """Split asset IDs into one list per connection"""
+        shards: List[List[str]] = [[] for _ in range(self.size)]
+        
+        if self.strategy == "rate":
+            # Longest-processing-time assignment on the decayed message rates,
+            # unseen assets are spread by count
+            self._place(shards, sorted(asset_ids, key=lambda asset_id: self.rates.get(asset_id, 0.0), reverse=True))
+        else:
+            for asset_id in asset_ids:
+                shards[self.ring.get_node(asset_id)].append(asset_id)
+        
+        return shards
+    
+    def assign(self, asset_ids: List[str]) -> List[List[str]]:
+        """Like partition, but assets keep their current connection and only new ones are placed"""
+        if self.strategy != "rate":
+            # The hash ring is already stable
+            return self.partition(asset_ids)
+        
+        wanted = set(asset_ids)
+        shards = [[asset_id for asset_id in client.subscriptions.get("market", []) if asset_id in wanted]
+                  for client in self.clients]
+        assigned = {asset_id for shard in shards for asset_id in shard}
+        self._place(shards, [asset_id for asset_id in asset_ids if asset_id not in assigned])
+        return shards
+    
+    def update_rates(self, elapsed: float):
+        """Fold the messages received since the last update into the decayed per-asset rates"""
+        counts = self.get_message_counts()
+        rates = {}
+        for asset_id in self.subscriptions.get("market", []):
+            received = max(counts.get(asset_id, 0) - self.rate_counts.get(asset_id, 0), 0)
+            rates[asset_id] = RATE_DECAY * self.rates.get(asset_id, 0.0) + (1 - RATE_DECAY) * received / elapsed
+        self.rates = rates
+        self.rate_counts = counts
+    
+    def is_imbalanced(self, threshold: float = 1.5) -> bool:
+        """Check if the busiest connection carries more than threshold x the average load"""
+        loads = [
+            sum(self.rates.get(asset_id, 0.0) for asset_id in client.subscriptions.get("market", []))
+            for client in self.clients
+        ]
+        total = sum(loads)
+        if not total:
+            return False
+        return max(loads) > threshold * total / self.size
+    
+    def _start_client(self, index: int, asset_ids: List[str]):
+        """Start the reconnect loop of a single pooled connection"""
+        client = self.clients[index]
+        client.subscriptions["market"] = asset_ids.copy()
+        self.client_tasks[index] = asyncio.create_task(
+            client.reconnect_loop(asset_ids, self.message_handler, self.api_creds, self.max_retries)
+        )
+        logger.info(f"Started {client.name} with {len(asset_ids)} assets")
+    
+    async def _rebalance_loop(self):
+        """Periodically move assets between connections based on observed message rates"""
+        loop = asyncio.get_running_loop()
+        self.rate_counts = self.get_message_counts()
+        updated = loop.time()
+        while self.running:
+            await asyncio.sleep(config.WS_POOL_REBALANCE_INTERVAL)
+            now = loop.time()
+            self.update_rates(max(now - updated, 1e-9))
+            updated = now
+            if self.is_imbalanced():
+                logger.info("WebSocket pool load is imbalanced, rebalancing assets")
+                await self.update_market_subscriptions(self.subscriptions.get("market", []), rebalance=True)
+    
+    async def reconnect_loop(self, asset_ids: List[str], message_handler: Callable, api_creds=None, max_retries: int = 5):
+        """Run one reconnect loop per connection until all of them give up"""
+        self.message_handler = message_handler
+        self.api_creds = api_creds
+        self.max_retries = max_retries
+        self.running = True
+        
+        # Subscriptions may have been updated since the loop was scheduled
+        asset_ids = self.subscriptions.get("market") or asset_ids
+        self.subscriptions["market"] = asset_ids.copy()
+        
+        for index, shard in enumerate(self.partition(asset_ids)):
+            if shard:
+                self._start_client(index, shard)
+        
+        logger.info(f"WebSocket pool started {len(self.client_tasks)} connections for {len(asset_ids)} assets")
+        
+        rebalance_task = None
+        if self.strategy == "rate":
+            rebalance_task = asyncio.create_task(self._rebalance_loop())
+        
+        try:
+            # Connections can be started later by update_market_subscriptions, so re-check the task set
+            while True:
+                pending = [task for task in self.client_tasks.values() if not task.done()]
+                if not pending:
+                    break
+                await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.running = False
+            if rebalance_task:
+                rebalance_task.cancel()
+            for task in self.client_tasks.values():
+                task.cancel()
+            self.client_tasks.clear()
+        
+        logger.error("All WebSocket pool connections stopped")
+    
+    async def start_with_subscriptions(self, asset_ids: List[str], message_handler: Callable, api_creds=None):
+        """Start every connection with its share of the subscriptions"""
+        self.message_handler = message_handler
+        self.api_creds = api_creds
+        self.subscriptions["market"] = asset_ids.copy()
+        
+        starts = [
+            client.start_with_subscriptions(shard, message_handler, api_creds)
+            for client, shard in zip(self.clients, self.partition(asset_ids))
+            if shard
+        ]
+        results = await asyncio.gather(*starts, return_exceptions=True)
+        return bool(results) and all(result is True for result in results)
+    
+    async def update_market_subscriptions(self, new_asset_ids: List[str], rebalance: bool = False) -> bool:
+        """Add new assets and drop removed ones without moving the others, unless rebalancing
+
+        Only the connections whose share changed are touched. A rebalance repartitions every
+        asset, so moved assets are resubscribed on their new connection.
+        """
+        try:
+            if not new_asset_ids:
+                logger.warning("No asset IDs provided for subscription update")
+                return False
+            
+            self.subscriptions["market"] = new_asset_ids.copy()
+            success = True
+            changes = []
+            shards = self.partition(new_asset_ids) if rebalance else self.assign(new_asset_ids)
+            
+            for index, shard in enumerate(shards):
+                client = self.clients[index]
+                current = client.subscriptions.get("market", [])
+                if set(shard) == set(current):
+                    continue
+                
+                task = self.client_tasks.get(index)
+                if not shard:
+                    changes.append((index, shard, current))
+                elif task is None or task.done():
+                    if self.running:
+                        self._start_client(index, shard)
+                    else:
+                        client.subscriptions["market"] = shard.copy()
+                else:
+                    changes.append((index, shard, current))
+            
+            # Make before break across connections: add moved assets everywhere first,
+            # then drop them from the connections that no longer own them
+            for index, shard, current in changes:
+                current_set = set(current)
+                added = [asset_id for asset_id in shard if asset_id not in current_set]
+                if shard and added:
+                    success = await self.clients[index].update_market_subscriptions(current + added) and success
+            
+            for index, shard, current in changes:
+                client = self.clients[index]
+                if shard:
+                    success = await client.update_market_subscriptions(shard) and success
+                else:
+                    # Connection lost all of its assets
+                    task = self.client_tasks.pop(index, None)
+                    if task:
+                        task.cancel()
+                    await client.close()
+                    client.subscriptions["market"] = []
+            
+            return success
+            
+        except Exception as e:
+            logger.error(f"Error updating pooled market subscriptions: {e}")
+            return False
+    
+    async def close(self):
+        """Close all pooled connections"""
+        self.running = False
+        await asyncio.gather(*(client.close() for client in self.clients), return_exceptions=True)
+
+# Create WebSocket client instance (sharded pool when WS_POOL_SIZE > 1)
+if config.WS_POOL_SIZE > 1:
+    websocket_client = WebSocketConnectionPool(config.WS_POOL_SIZE, config.WS_POOL_STRATEGY)
+else:
+    websocket_client = PolymarketWebSocketClient()
@@ -0,0 +1,54 @@
+import asyncio
+from src import book_history as history_module
+from src.book_history import BookHistoryStore
+from src.order_book import OrderBook
+
+class FakeHistoryCollection:
+    """Stands in for the async db client's history methods"""
+
+    def __init__(self):
+        self.documents = []
+
+    async def store_book_history(self, documents):
+        self.documents.extend(documents)
+        return True
+
+    async def get_book_history_segment(self, asset_id, at):
+        matches = [document for document in self.documents if document['asset_id'] == asset_id and document['t'] <= at]
+        return max(matches, key=lambda document: document['t']) if matches else None
+
+def bid(price, size):
+    return {'price': price, 'side': 'BUY', 'size': size}
+
+def bids_at(history, at):
+    ladder = asyncio.run(history.book_at('asset', at))
+    return [(level['price'], level['size']) for level in ladder['bids']]
+
+def test_book_at_across_segment_rotation(monkeypatch):
+    collection = FakeHistoryCollection()
+    monkeypatch.setattr(history_module, 'async_db_client', collection)
+    history = BookHistoryStore(segment_seconds=10, max_deltas=100)
+    history.enabled = True
+
+    book = OrderBook('asset', 'market', '0.01')
+    book.apply_snapshot([{'price': '0.50', 'size': '10'}], [])
+    history.record_snapshot(book, 1000)
+
+    for ts, change in ((2000, bid('0.51', '5')), (3000, bid('0.50', '0')), (12000, bid('0.52', '7'))):
+        book.apply_changes([change])
+        history.record_changes(book, [change], ts)
+
+    # The 12s change rotated the segment: the old one is closed, the new one starts from the live book
+    assert len(history.closed) == 1
+    assert bids_at(history, 1500) == [('0.5', '10')]
+    assert bids_at(history, 2500) == [('0.51', '5'), ('0.5', '10')]
+    # Past the old segment's last delta but before the next one starts
+    assert bids_at(history, 11000) == [('0.51', '5')]
+    assert bids_at(history, 12000) == [('0.52', '7'), ('0.51', '5')]
+
+    # Once flushed, the old segment is read back from the collection
+    assert asyncio.run(history.flush())
+    assert not history.closed
+    assert bids_at(history, 2500) == [('0.51', '5'), ('0.5', '10')]
+    assert bids_at(history, 3500) == [('0.51', '5')]
+    assert asyncio.run(history.book_at('asset', 500)) is None
@@ -0,0 +1,72 @@
+import asyncio
+from src.ingest_queue import ConflatingIngestQueue
+
+async def drain(queue):
+    return [await queue.get() for _ in range(queue.qsize())]
+
+def test_conflated_item_moves_to_the_tail():
+    async def scenario():
+        queue = ConflatingIngestQueue(10)
+        await queue.put('book-a1', key='a')
+        await queue.put('delta-b1')
+        await queue.put('book-a2', key='a')
+        await queue.put('delta-b2')
+        return queue, await drain(queue)
+
+    queue, items = asyncio.run(scenario())
+    # The newer snapshot replaces the older one behind the delta queued in between
+    assert items == ['delta-b1', 'book-a2', 'delta-b2']
+    assert queue.conflated == 1
+
+def test_conflation_keeps_the_deque_bounded():
+    async def scenario():
+        queue = ConflatingIngestQueue(5)
+        for index in range(1000):
+            await queue.put(index, key=index % 2)
+        return queue, await drain(queue)
+
+    queue, items = asyncio.run(scenario())
+    assert items == [998, 999]
+    assert len(queue._entries) == 0
+
+def test_block_waits_for_room():
+    async def scenario():
+        queue = ConflatingIngestQueue(2, 'block')
+        await queue.put(1)
+        await queue.put(2)
+        blocked = asyncio.create_task(queue.put(3))
+        await asyncio.sleep(0)
+        waiting = not blocked.done()
+        first = await queue.get()
+        await blocked
+        return waiting, [first] + await drain(queue), queue.dropped
+
+    waiting, items, dropped = asyncio.run(scenario())
+    assert waiting
+    assert items == [1, 2, 3]
+    assert dropped == 0
+
+def test_drop_oldest_evicts_the_head_and_reports_it():
+    async def scenario():
+        dropped = []
+        queue = ConflatingIngestQueue(2, 'drop_oldest', on_drop=dropped.append)
+        for item in (1, 2, 3):
+            assert await queue.put(item)
+        return dropped, await drain(queue), queue.dropped
+
+    dropped, items, count = asyncio.run(scenario())
+    assert dropped == [1]
+    assert items == [2, 3]
+    assert count == 1
+
+def test_drop_newest_rejects_the_new_item_and_reports_it():
+    async def scenario():
+        dropped = []
+        queue = ConflatingIngestQueue(2, 'drop_newest', on_drop=dropped.append)
+        accepted = [await queue.put(item) for item in (1, 2, 3)]
+        return accepted, dropped, await drain(queue)
+
+    accepted, dropped, items = asyncio.run(scenario())
+    assert accepted == [True, True, False]
+    assert dropped == [3]
+    assert items == [1, 2]
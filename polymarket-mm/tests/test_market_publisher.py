@@ -0,0 +1,29 @@
+import asyncio
+from src import codec
+from src.market_publisher import MarketPublisher
+from src.outbox import NotificationOutbox
+from src.rabbitmq_client import rabbitmq_client
+
+def change(price, size='1'):
+    return {'asset_id': 'asset', 'price': price, 'side': 'BUY', 'size': size}
+
+def test_malformed_notification_does_not_drop_the_batch(monkeypatch):
+    monkeypatch.setattr(rabbitmq_client, 'market_formats', ['json', 'binary'])
+    publisher = MarketPublisher(conflate=False)
+    publisher.outbox = NotificationOutbox(100)
+
+    publisher.submit('asset', 'price_change', {'changes': [change('0.5')], 'timestamp': '1'})
+    publisher.submit('asset', 'price_change', {'changes': [change('0.5x')], 'timestamp': '2'})
+    publisher.submit('asset', 'price_change', {'changes': [change('0.6')], 'timestamp': '3'})
+
+    # Broker unavailable: everything that encoded goes to the outbox
+    assert asyncio.run(publisher.flush()) is False
+    messages = publisher.outbox.take(10)
+    json_bodies = [codec.loads(body) for _, body, content_type, _ in messages if content_type == 'application/json']
+
+    assert publisher.invalid == 1
+    assert not publisher.pending
+    assert len(messages) == 4
+    # The malformed delta used up no sequence number, consumers see no gap
+    assert [body['data']['seq'] for body in json_bodies] == [1, 2]
+    assert [body['data']['timestamp'] for body in json_bodies] == ['1', '3']
@@ -0,0 +1,28 @@
+from src.notification_codec import decode_binary, encode_binary
+from src.order_book import TickSize
+
+def test_binary_round_trip_carries_seq_and_epoch():
+    body = encode_binary({
+        'asset_id': 'asset',
+        'event_type': 'price_change',
+        'data': {
+            'changes': [
+                {'price': '0.955', 'side': 'BUY', 'size': '10.5'},
+                {'price': '0.97', 'side': 'SELL', 'size': '0'}
+            ],
+            'timestamp': '1700000000000',
+            'seq': 42,
+            'epoch': 1699999999000
+        }
+    }, TickSize('0.01'))
+
+    assert decode_binary(body) == {
+        'asset_id': 'asset',
+        'event_type': 'price_change',
+        'tick_decimals': 3,
+        'tick_units': 1,
+        'timestamp': 1700000000000,
+        'seq': 42,
+        'epoch': 1699999999000,
+        'levels': [(0, 955, 10500000), (1, 970, 0)]
+    }
@@ -0,0 +1,62 @@
+import pytest
+from src.order_book import OrderBook, OrderBookManager, TickSize, parse_scaled
+
+def ladder_prices(levels):
+    return [level['price'] for level in levels]
+
+def test_finer_prices_refine_default_tick():
+    book = OrderBook('asset', 'market')
+    book.apply_snapshot(
+        [{'price': '0.955', 'size': '10'}, {'price': '0.95', 'size': '5'}],
+        [{'price': '0.965', 'size': '3'}, {'price': '0.96', 'size': '7'}]
+    )
+
+    assert str(book.tick_size) == '0.001'
+    ladder = book.ladder()
+    assert ladder_prices(ladder['bids']) == ['0.955', '0.95']
+    assert ladder_prices(ladder['asks']) == ['0.96', '0.965']
+    assert book.spread() == pytest.approx(0.005)
+    assert book.mid_price() == pytest.approx(0.9575)
+
+def test_thousandth_tick_keeps_distinct_levels():
+    book = OrderBook('asset', 'market', '0.001')
+    book.apply_snapshot([{'price': '0.501', 'size': '1'}, {'price': '0.502', 'size': '2'}], [])
+    book.apply_change('BUY', '0.503', '4')
+
+    assert book.ladder()['bids'] == [
+        {'price': '0.503', 'size': '4'},
+        {'price': '0.502', 'size': '2'},
+        {'price': '0.501', 'size': '1'}
+    ]
+
+def test_delta_finer_than_tick_rescales_book():
+    book = OrderBook('asset', 'market', '0.01')
+    book.apply_snapshot([{'price': '0.95', 'size': '5'}], [{'price': '0.97', 'size': '1'}])
+    book.apply_change('SELL', '0.965', '2')
+
+    assert str(book.tick_size) == '0.001'
+    assert ladder_prices(book.ladder()['asks']) == ['0.965', '0.97']
+    assert ladder_prices(book.ladder()['bids']) == ['0.95']
+
+def test_coarser_tick_change_does_not_merge_levels():
+    book = OrderBook('asset', 'market', '0.001')
+    book.apply_snapshot([{'price': '0.955', 'size': '1'}, {'price': '0.95', 'size': '2'}], [])
+    book.set_tick_size('0.01')
+
+    assert str(book.tick_size) == '0.001'
+    assert ladder_prices(book.ladder()['bids']) == ['0.955', '0.95']
+
+def test_off_grid_values_are_rejected_not_truncated():
+    with pytest.raises(ValueError):
+        TickSize('0.01').to_ticks('0.955')
+    with pytest.raises(ValueError):
+        parse_scaled('1.0000001', 6)
+    assert TickSize(0.001).to_ticks('0.955') == 955
+
+def test_resync_keeps_tick_size():
+    manager = OrderBookManager()
+    manager.apply_snapshot('asset', 'market', [{'price': '0.955', 'size': '1'}], [])
+    manager.remove('asset', keep_tick_size=True)
+    book = manager.apply_snapshot('asset', 'market', [{'price': '0.95', 'size': '1'}], [])
+
+    assert str(book.tick_size) == '0.001'
@@ -0,0 +1,57 @@
+from src.outbox import RECORD_HEADER, NotificationOutbox
+
+def message(index, asset_id='asset'):
+    return (f'markets.{asset_id}', str(index).encode(), 'application/json', asset_id)
+
+def bodies(messages):
+    return [int(body) for _, body, _, _ in messages]
+
+def test_spill_replays_memory_then_file_in_order(tmp_path):
+    outbox = NotificationOutbox(capacity=2, spill_path=str(tmp_path / 'spill'))
+    for index in range(5):
+        outbox.add(message(index))
+
+    assert outbox.get_stats()['spilled'] == 3
+    assert bodies(outbox.take(3)) == [0, 1, 2]
+    assert bodies(outbox.take(10)) == [3, 4]
+    assert outbox.is_empty()
+
+def test_spill_left_over_from_a_previous_run_is_replayed(tmp_path):
+    path = str(tmp_path / 'spill')
+    first = NotificationOutbox(capacity=1, spill_path=path)
+    for index in range(3):
+        first.add(message(index))
+
+    # Only the spilled messages survive a restart
+    second = NotificationOutbox(capacity=1, spill_path=path)
+    assert bodies(second.take(10)) == [1, 2]
+
+def test_full_spill_drops_new_messages_instead_of_reordering(tmp_path):
+    routing_key, body, content_type, asset_id = message(0)
+    record = RECORD_HEADER.size + len(routing_key) + len(content_type) + len(asset_id) + len(body)
+    outbox = NotificationOutbox(capacity=1, spill_path=str(tmp_path / 'spill'), max_spill_bytes=2 * record)
+    for index in range(5):
+        outbox.add(message(index))
+
+    assert outbox.dropped == 2
+    assert bodies(outbox.take(10)) == [0, 1, 2]
+
+def test_requeue_goes_ahead_of_newer_messages():
+    outbox = NotificationOutbox(capacity=10)
+    for index in range(4):
+        outbox.add(message(index))
+
+    taken = outbox.take(3)
+    outbox.add(message(4))
+    outbox.requeue(taken[1:])
+
+    assert bodies(outbox.take(10)) == [1, 2, 3, 4]
+
+def test_keep_latest_evicts_the_oldest_message_of_the_same_asset():
+    outbox = NotificationOutbox(capacity=3, policy='keep_latest')
+    outbox.add(message(0, 'a'))
+    outbox.add(message(1, 'b'))
+    outbox.add(message(2, 'a'))
+    outbox.add(message(3, 'a'))
+
+    assert [(asset_id, int(body)) for _, body, _, asset_id in outbox.take(10)] == [('b', 1), ('a', 2), ('a', 3)]
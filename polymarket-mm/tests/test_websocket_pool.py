@@ -0,0 +1,38 @@
+import asyncio
+from src.websocket_client import WebSocketConnectionPool
+
+def shards(pool):
+    return [client.subscriptions.get('market', []) for client in pool.clients]
+
+def test_rate_strategy_keeps_assignments_on_market_changes():
+    pool = WebSocketConnectionPool(3, 'rate')
+    assets = [f'asset-{index}' for index in range(9)]
+    asyncio.run(pool.update_market_subscriptions(assets))
+    before = shards(pool)
+
+    asyncio.run(pool.update_market_subscriptions(assets[1:] + ['asset-new']))
+    after = shards(pool)
+
+    # Remaining assets stay put, the new one goes to the connection that lost an asset
+    for old, new in zip(before, after):
+        assert [asset_id for asset_id in old if asset_id != 'asset-0'] == [asset_id for asset_id in new if asset_id != 'asset-new']
+    assert sorted(len(shard) for shard in after) == [3, 3, 3]
+
+def test_rebalance_uses_decayed_rates():
+    pool = WebSocketConnectionPool(2, 'rate')
+    assets = ['hot-1', 'hot-2', 'cold-1', 'cold-2']
+    pool.subscriptions['market'] = assets
+    pool.clients[0].subscriptions['market'] = ['hot-1', 'hot-2']
+    pool.clients[1].subscriptions['market'] = ['cold-1', 'cold-2']
+    pool.clients[0].message_counts = {'hot-1': 100, 'hot-2': 100}
+
+    pool.update_rates(10)
+    assert pool.rates['hot-1'] == 5.0
+    assert pool.is_imbalanced()
+
+    asyncio.run(pool.update_market_subscriptions(assets, rebalance=True))
+    assert not pool.is_imbalanced()
+
+    # Without new messages the rates decay instead of staying at their lifetime level
+    pool.update_rates(10)
+    assert pool.rates['hot-1'] == 2.5